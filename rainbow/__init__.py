@@ -1,14 +1,30 @@
+import numbers
 import os
 import re
 from rainbow.datafile import DataFile
 from rainbow.datadirectory import DataDirectory
-from rainbow import agilent, waters
+from rainbow._archive import load
+from rainbow._parallel import check_workers
 
 
 # Vendor parsers that rainbow can dispatch to.
 VENDORS = ('agilent', 'waters')
 
 
+def __getattr__(name):
+    """
+    Imports the vendor subpackages on first use.
+
+    Importing them (and through them lxml) is deferred so that \
+        ``import rainbow`` stays fast for short-lived processes.
+
+    """
+    if name in VENDORS:
+        import importlib
+        return importlib.import_module(f"rainbow.{name}")
+    raise AttributeError(f"module 'rainbow' has no attribute {name!r}")
+
+
 def _sniff_vendor(path):
     """
     Identifies the vendor of a directory from its contents.
@@ -86,7 +102,9 @@ def _resolve_vendor(path, format):
 
 
 def read(path, precision='auto', hrms=False, requested_files=None,
-         telemetry=False, centroid=False, format=None, bin_width=None):
+         telemetry=False, centroid=False, format=None, bin_width=None,
+         lazy=False, workers=None, cache_dir=None, cache_size=None,
+         sparse=False, rt_range=None, wavelengths=None):
     """
     Reads a chromatogram data directory. Main method of the package.
 
@@ -109,6 +127,44 @@ def read(path, precision='auto', hrms=False, requested_files=None,
         suffix is identified from its contents instead. Pass ``format`` \
         ('agilent' or 'waters') to override detection entirely.
 
+    With the lazy flag, only file headers are read up front. Each DataFile \
+        is decoded the first time its data is accessed, so reading a single \
+        trace out of a large directory only pays for that trace. The scans \
+        of a per-scan Agilent MassHunter profile are decoded as they are \
+        accessed (see \
+        :class:`~rainbow.agilent.masshunter.LazyProfileDataFile`). Other \
+        MassHunter data and .dx data is always decoded up front.
+
+    Set workers to decode the files of a directory on several threads. The \
+        DataFiles are returned in the same order as a serial read. The scans \
+        of an Agilent MassHunter profile (MSProfile.bin) are decoded on the \
+        same number of threads.
+
+    With the sparse flag, MS data is kept in compressed sparse row form \
+        (see :class:`~rainbow.datafile.SparseDataFile`), which is much \
+        smaller for centroided or high-precision spectra. Traces, the TIC, \
+        and single scans are read without building the dense matrix.
+
+    Set rt_range to a (start, end) window in minutes to decode only the \
+        scans of Agilent .uv files inside it. Each .uv scan can be decoded \
+        on its own, so a short window of a long DAD run costs only the \
+        scans inside it. Other files are read whole.
+
+    Set wavelengths to a list of wavelengths to keep from Agilent .uv \
+        files. The whole delta stream is still walked, but only the \
+        selected columns are stored, so keeping two wavelengths of a DAD \
+        run takes a fraction of the memory. The columns are in the order \
+        given. Wavelengths that a file lacks are skipped with a warning, \
+        and reading a file that has none of them raises a ValueError.
+
+    Set cache_dir to keep decoded runs on disk. Reading a run again with \
+        the same arguments memory-maps the cached arrays instead of decoding \
+        the raw files. The cache key includes the size and modification time \
+        of every file in the run, so edited runs are decoded afresh. The \
+        least recently used runs are deleted once the cache outgrows \
+        cache_size. A lazy read uses a cached run but does not store one, \
+        since storing it would decode every file up front.
+
     Args:
         path (str): Path of the directory.
         precision (int or 'auto', optional): Number of decimals to round
@@ -132,6 +188,21 @@ def read(path, precision='auto', hrms=False, requested_files=None,
             the reported m/z labels, never the grid). A ``bin_width`` finer than
             ``10**-precision`` is allowed but warns, since two bins may then round
             to the same m/z label.
+        lazy (bool, optional): Flag for decoding each DataFile on first access
+            instead of up front (see :class:`~rainbow.datafile.LazyDataFile`).
+        workers (int, optional): Number of threads to decode files with. The
+            default (None) decodes them one after another.
+        cache_dir (str, optional): Path of a directory to cache decoded runs
+            in. The default (None) disables the cache.
+        cache_size (int, optional): Size limit of the cache in bytes.
+            Defaults to 1 GiB.
+        sparse (bool, optional): Flag for storing MS data as
+            :class:`~rainbow.datafile.SparseDataFile` objects.
+        rt_range (tuple, optional): Start and end retention times in minutes
+            (inclusive) of the Agilent .uv scans to decode.
+        wavelengths (list, optional): Wavelengths in nm to keep from Agilent
+            .uv files, in the order given. Wavelengths that a file lacks are
+            skipped with a warning.
 
     Returns:
         DataDirectory representing the directory.
@@ -159,6 +230,36 @@ def read(path, precision='auto', hrms=False, requested_files=None,
     if not isinstance(centroid, bool):
         raise Exception(f"The centroid flag must be a boolean.")
 
+    if not isinstance(lazy, bool):
+        raise Exception(f"The lazy flag must be a boolean.")
+
+    if not isinstance(sparse, bool):
+        raise Exception(f"The sparse flag must be a boolean.")
+
+    check_workers(workers)
+
+    if rt_range is not None:
+        if not isinstance(rt_range, (tuple, list)) or len(rt_range) != 2 \
+                or any(isinstance(t, bool) or not isinstance(t, (int, float))
+                       for t in rt_range) \
+                or rt_range[0] > rt_range[1]:
+            raise Exception(
+                f"Invalid rt_range: {rt_range!r}. Use a (start, end) tuple "
+                f"of minutes.")
+        rt_range = tuple(rt_range)
+
+    if wavelengths is not None:
+        if isinstance(wavelengths, (str, bytes)) \
+                or not hasattr(wavelengths, '__iter__') \
+                or not all(isinstance(w, numbers.Real)
+                           and not isinstance(w, bool) for w in wavelengths):
+            raise Exception(
+                f"Invalid wavelengths: {wavelengths!r}. Use a list of "
+                f"numbers.")
+        wavelengths = [float(w) for w in wavelengths]
+        if not wavelengths:
+            raise Exception("Invalid wavelengths: []. Use None to keep all.")
+
     # precision is a label precision (decimals for reported m/z). 'auto' is
     # finalized per file inside each parser, where the data type is actually
     # known: high-resolution data (the HRMS profile, and TOF centroids) resolves
@@ -183,19 +284,238 @@ def read(path, precision='auto', hrms=False, requested_files=None,
     if requested_files:
         requested_files = list(map(str.lower, requested_files))
 
+    # The cache and the vendor parsers are imported on use, which keeps
+    # ``import rainbow`` fast.
+    from rainbow import _cache
+    if cache_size is None:
+        cache_size = _cache.DEFAULT_CACHE_SIZE
+    elif isinstance(cache_size, bool) or not isinstance(cache_size, int) \
+            or cache_size < 0:
+        raise Exception(f"Invalid cache_size: {cache_size}.")
+
+    if cache_dir is not None:
+        # lazy and workers only change how the run is decoded, not the result.
+        key = _cache.cache_key(path, {
+            'vendor': vendor, 'precision': precision, 'hrms': hrms,
+            'requested_files': requested_files, 'telemetry': telemetry,
+            'centroid': centroid, 'bin_width': bin_width, 'sparse': sparse,
+            'rt_range': rt_range, 'wavelengths': wavelengths})
+        datadir = _cache.load(cache_dir, key)
+        if datadir is not None:
+            return datadir
+
     datadir = None
     if vendor == 'agilent':
+        from rainbow import agilent
         datadir = agilent.read(
             path, precision, hrms, requested_files, telemetry, centroid,
-            bin_width)
+            bin_width, lazy=lazy, workers=workers, sparse=sparse,
+            rt_range=rt_range, wavelengths=wavelengths)
     elif vendor == 'waters':
-        datadir = waters.read(path, precision, requested_files)
+        from rainbow import waters
+        datadir = waters.read(
+            path, precision, requested_files, lazy=lazy, workers=workers,
+            sparse=sparse)
 
     if datadir is None:
         raise Exception(f"Rainbow cannot read {path}.")
+    if cache_dir is not None and not lazy:
+        _cache.store(cache_dir, key, datadir, cache_size)
     return datadir
 
 
+def read_many(paths, workers=None, ordered=True, max_in_flight=None,
+              **read_kwargs):
+    """
+    Reads many chromatogram data directories in a process pool.
+
+    Each path is read by :obj:`read` in a worker process, and results are \
+        yielded as ``(path, result)`` tuples while the rest of the batch is \
+        still being read. The result is the DataDirectory, or the exception \
+        raised while reading that path, so one corrupt run does not stop \
+        the batch.
+
+    With lazy=True, MassHunter HRMS profiles are sent back with their \
+        compressed scans in memory (see \
+        :meth:`~rainbow.agilent.masshunter.LazyProfileDataFile.in_memory`), \
+        since the memory map of MSProfile.bin they read from cannot leave \
+        the worker process. Other lazy files are decoded on first access in \
+        the calling process, as with :obj:`read`.
+
+    A worker process that crashes outright fails every run in its pool. \
+        The pool is replaced right away, and the runs it lost are read \
+        again one at a time in a pool of their own. A run is reported with \
+        a BrokenProcessPool error only if it crashes that pool as well.
+
+    At most :obj:`max_in_flight` runs are being read or waiting to be \
+        yielded at any time, which bounds memory use when the consumer is \
+        slower than the pool.
+
+    Args:
+        paths (iterable): Paths of the directories. May be a generator.
+        workers (int, optional): Number of worker processes. Defaults to the
+            number of CPUs.
+        ordered (bool, optional): Flag for yielding results in input order.
+            If False, results are yielded as soon as they are ready.
+        max_in_flight (int, optional): Maximum number of runs held at once.
+            Defaults to twice the number of workers.
+        **read_kwargs: Keyword arguments passed to :obj:`read`.
+
+    Yields:
+        Tuple of the path and its DataDirectory or exception.
+
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    from concurrent.futures.process import BrokenProcessPool
+
+    check_workers(workers)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if max_in_flight is None:
+        max_in_flight = 2 * workers
+    check_workers(max_in_flight)
+
+    paths = iter(enumerate(paths))
+    pending = {}    # future -> (index, path, pool)
+    retries = []    # (index, path) lost to a crashed worker
+    finished = {}   # index -> (path, result), held back for ordering
+    next_index = 0
+    executor = ProcessPoolExecutor(max_workers=workers)
+    retry_executor = None
+    retry_future = None
+    try:
+        while True:
+            # Top up the pool, counting results held back for ordering.
+            while len(pending) + len(retries) + len(finished) < max_in_flight:
+                item = next(paths, None)
+                if item is None:
+                    break
+                try:
+                    future = executor.submit(_read_or_error, item[1], read_kwargs)
+                except BrokenProcessPool:
+                    # A worker crashed; the pool cannot take more work.
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(max_workers=workers)
+                    future = executor.submit(_read_or_error, item[1], read_kwargs)
+                pending[future] = (*item, executor)
+            # Runs lost to a crash are retried one at a time, so a crash of
+            # the retry pool is caused by the run being retried.
+            if retries and retry_future is None:
+                if retry_executor is None:
+                    retry_executor = ProcessPoolExecutor(max_workers=1)
+                index, path = retries.pop(0)
+                retry_future = retry_executor.submit(
+                    _read_or_error, path, read_kwargs)
+                pending[retry_future] = (index, path, retry_executor)
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, path, pool = pending.pop(future)
+                if future is retry_future:
+                    retry_future = None
+                try:
+                    result = future.result()
+                except BrokenProcessPool as err:
+                    if pool is retry_executor:
+                        # The run crashed a second time, on its own.
+                        retry_executor.shutdown(wait=False)
+                        retry_executor = None
+                        result = err
+                    else:
+                        if pool is executor:
+                            executor.shutdown(wait=False)
+                            executor = ProcessPoolExecutor(max_workers=workers)
+                        retries.append((index, path))
+                        continue
+                except Exception as err:
+                    result = err
+                if ordered:
+                    finished[index] = (path, result)
+                else:
+                    yield path, result
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+    finally:
+        # The consumer may stop early; drop the work it will never see.
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+        if retry_executor is not None:
+            retry_executor.shutdown(wait=True)
+
+
+def _read_or_error(path, read_kwargs):
+    """
+    Reads a directory in a worker process, returning any exception raised.
+
+    Files that read from a memory map are copied into memory, so that the \
+        result can be sent back to the calling process.
+
+    """
+    try:
+        datadir = read(path, **read_kwargs)
+    except Exception as err:
+        return err
+    datafiles = list(datadir.by_name.values())
+    if not any(hasattr(df, 'in_memory') for df in datafiles):
+        return datadir
+    return DataDirectory(
+        path, [df.in_memory() if hasattr(df, 'in_memory') else df
+               for df in datafiles], datadir.metadata)
+
+
+def inspect(path, format=None):
+    """
+    Reads the shape of each file in a chromatogram data directory without \
+        decoding any data.
+
+    Only file headers and index files are read: the Agilent .uv, .ch, and \
+        .ms headers, the MassHunter MSScan.bin records, the Waters _FUNC \
+        .IDX files, and the .dx manifest. This is much faster than \
+        :obj:`read`, and is meant for sizing memory and workers up front.
+
+    Each file is described by a dictionary with the following keys:
+        - ``name``: Name of the file, as used by :obj:`read`.
+        - ``detector``: Detector of the file (None for analog data).
+        - ``num_times``: Number of retention times.
+        - ``rt_range``: Tuple of the first and last retention times in \
+            minutes.
+        - ``ylabel_range``: Tuple of the smallest and largest ylabels, or \
+            None if they are not stored in a header.
+        - ``num_ylabels``: Number of ylabels. For MS data, this is an \
+            estimate from the m/z range or the largest scan.
+        - ``decoded_bytes``: Estimated size of the decoded data array.
+
+    Args:
+        path (str): Path of the directory.
+        format (str, optional): Force the vendor parser ('agilent' or
+            'waters'), bypassing extension/content detection.
+
+    Returns:
+        List with a dictionary describing each file.
+
+    """
+    vendor = _resolve_vendor(path, format)
+
+    ext = os.path.splitext(path)[1].lower() if isinstance(path, str) else ''
+    if ext == '.dx':
+        if not isinstance(path, str) or not os.path.isfile(path):
+            raise Exception(f"{path} is not a file.")
+    elif not isinstance(path, str) or not os.path.isdir(path):
+        raise Exception(f"{path} is not a directory.")
+
+    if vendor == 'agilent':
+        from rainbow import agilent
+        return agilent.inspect(path)
+    if vendor == 'waters':
+        from rainbow import waters
+        return waters.inspect(path)
+    raise Exception(f"Rainbow cannot read {path}.")
+
+
 def read_metadata(path, format=None):
     """
     Reads the metadata for a chromatogram data directory. Main method of the package.
@@ -213,8 +533,10 @@ def read_metadata(path, format=None):
 
     metadata = None
     if vendor == 'agilent':
+        from rainbow import agilent
         metadata = agilent.read_metadata(path)
     elif vendor == 'waters':
+        from rainbow import waters
         metadata = waters.read_metadata(path)
 
     if metadata is None:
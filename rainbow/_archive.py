@@ -0,0 +1,141 @@
+"""
+Native archive format for parsed DataDirectories.
+
+An archive is a directory holding a JSON manifest plus one ``.npy`` file per
+array of each DataFile. The manifest records the directory and file metadata,
+the class of each DataFile, and which ``.npy`` files hold its arrays. Since
+``.npy`` is a raw array with a small header, :obj:`load` can memory-map the
+arrays, so reopening a large run costs a few file opens and no decoding.
+
+Per-scan HRMS profiles (:class:`~rainbow.agilent.masshunter.ProfileDataFile`)
+are stored with their flight-time axis, calibration rows and calibration
+flags, so they reload with the same per-scan m/z axes. Sparse DataFiles are
+stored as their CSR arrays.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from rainbow.datafile import DataFile, LazyDataFile, SparseDataFile
+from rainbow.datadirectory import DataDirectory
+
+# Version of the archive layout, bumped on incompatible changes.
+ARCHIVE_VERSION = 1
+
+MANIFEST = "manifest.json"
+
+# Array attributes stored for each kind of DataFile.
+_ARRAYS = {
+    'DataFile': ('xlabels', 'ylabels', 'data'),
+    'ProfileDataFile': ('xlabels', 'tof', 'data', '_calib'),
+    'SparseDataFile': ('xlabels', 'ylabels', 'indptr', 'indices', 'values'),
+}
+
+
+def save(datadir, path):
+    """
+    Saves a DataDirectory as an archive directory.
+
+    Lazily decoded DataFiles are decoded first.
+
+    Args:
+        datadir (DataDirectory): DataDirectory to save.
+        path (str): Path of the archive directory. It is created if needed.
+
+    """
+    try:
+        from rainbow.agilent.masshunter import ProfileDataFile
+    except ImportError:
+        # Without lxml no ProfileDataFile can have been parsed.
+        ProfileDataFile = ()
+
+    os.makedirs(path, exist_ok=True)
+    manifest = {
+        'version': ARCHIVE_VERSION,
+        'name': datadir.name,
+        'metadata': datadir.metadata,
+        'datafiles': []
+    }
+    for i, datafile in enumerate(datadir.by_name.values()):
+        if isinstance(datafile, LazyDataFile):
+            datafile = datafile.load()
+        if isinstance(datafile, ProfileDataFile):
+            kind = 'ProfileDataFile'
+        elif isinstance(datafile, SparseDataFile):
+            kind = 'SparseDataFile'
+        else:
+            kind = 'DataFile'
+        file_info = {
+            'kind': kind,
+            'name': datafile.name,
+            'detector': datafile.detector,
+            'metadata': datafile.metadata,
+            'arrays': {}
+        }
+        for attr in _ARRAYS[kind]:
+            filename = f"{i}.{attr.lstrip('_')}.npy"
+            np.save(os.path.join(path, filename), getattr(datafile, attr),
+                    allow_pickle=False)
+            file_info['arrays'][attr] = filename
+        if kind == 'ProfileDataFile':
+            file_info['use_flags'] = datafile._use_flags
+            file_info['mz_decimals'] = datafile.mz_decimals
+        manifest['datafiles'].append(file_info)
+
+    with open(os.path.join(path, MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+
+
+def load(path, mmap=True):
+    """
+    Loads a DataDirectory saved by :meth:`DataDirectory.save`.
+
+    With the mmap flag, the arrays are memory-mapped copy-on-write: they \
+        are paged in from disk as they are used, and modifying them does \
+        not change the archive.
+
+    Args:
+        path (str): Path of the archive directory.
+        mmap (bool, optional): Flag for memory-mapping the arrays instead of
+            reading them into memory.
+
+    Returns:
+        DataDirectory representing the saved directory.
+
+    """
+    manifest_path = os.path.join(path, MANIFEST)
+    if not os.path.isfile(manifest_path):
+        raise Exception(f"{path} is not a rainbow archive.")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != ARCHIVE_VERSION:
+        raise Exception(
+            f"Unsupported archive version: {manifest.get('version')}.")
+
+    mmap_mode = 'c' if mmap else None
+    datafiles = []
+    for file_info in manifest['datafiles']:
+        arrays = {
+            attr: np.load(os.path.join(path, filename), mmap_mode=mmap_mode,
+                          allow_pickle=False)
+            for attr, filename in file_info['arrays'].items()
+        }
+        if file_info['kind'] == 'ProfileDataFile':
+            from rainbow.agilent.masshunter import ProfileDataFile
+            datafiles.append(ProfileDataFile(
+                file_info['name'], arrays['xlabels'], arrays['tof'],
+                arrays['data'], arrays['_calib'], file_info['use_flags'],
+                file_info['metadata'], file_info['mz_decimals']))
+        elif file_info['kind'] == 'SparseDataFile':
+            datafiles.append(SparseDataFile(
+                file_info['name'], file_info['detector'], arrays['xlabels'],
+                arrays['ylabels'], arrays['indptr'], arrays['indices'],
+                arrays['values'], file_info['metadata']))
+        else:
+            datafiles.append(DataFile(
+                file_info['name'], file_info['detector'], arrays['xlabels'],
+                arrays['ylabels'], arrays['data'], file_info['metadata']))
+
+    return DataDirectory(manifest['name'], datafiles, manifest['metadata'])
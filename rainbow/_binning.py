@@ -5,13 +5,16 @@ Several vendor parsers store a scan's spectrum as a flat list of
 ``(ylabel, value)`` pairs - Waters ``_FUNC.DAT`` (m/z or wavelength) and
 Agilent ``.ms`` (m/z) - and need to lay those pairs out as a
 ``(retention time x ylabel)`` matrix, summing pairs that share a ylabel within
-a scan. This module provides one vectorized implementation of that step.
+a scan. This module provides one vectorized implementation of that step, and
+the compressed sparse row (CSR) layout used instead of the matrix when most of
+its cells would be zero.
 """
 
 import numpy as np
 
 
-def bin_datapairs(keys, values, pair_counts, precision, data_dtype=np.int64):
+def bin_datapairs(keys, values, pair_counts, precision, data_dtype=np.int64,
+                  sparse=False):
     """
     Bins (key, value) data pairs into a (retention time x ylabel) matrix.
 
@@ -26,22 +29,32 @@ def bin_datapairs(keys, values, pair_counts, precision, data_dtype=np.int64):
     a ``data_dtype`` matrix (matching whatever dtype - and overflow/truncation
     behavior - the caller's prior per-scan ``np.add.at`` loop used).
 
+    With :obj:`sparse` set, the matrix is never allocated. The summed nonzero
+    cells are returned as CSR arrays instead (see :obj:`csr_from_pairs`).
+
     Args:
         keys (np.ndarray): Flat ylabels, rounded to :obj:`precision`, non-negative.
         values (np.ndarray): Flat values paired with :obj:`keys`.
         pair_counts (np.ndarray): Number of pairs at each retention time.
         precision (int): Number of decimals the keys were rounded to.
         data_dtype (np.dtype, optional): dtype of the output matrix.
+        sparse (bool, optional): Flag for returning CSR arrays instead of the
+            matrix.
 
     Returns:
         1D numpy array with ylabels (in the keys' dtype). 2D ``data_dtype``
             numpy array with data values (rows are retention times, columns are
-            ylabels).
+            ylabels), or its ``(indptr, indices, values)`` CSR arrays.
 
     """
     num_times = pair_counts.size
 
     if keys.size == 0:
+        if sparse:
+            return (np.empty(0, dtype=keys.dtype),
+                    (np.zeros(num_times + 1, dtype=np.int64),
+                     np.empty(0, dtype=np.int32),
+                     np.empty(0, dtype=data_dtype)))
         return (np.empty(0, dtype=keys.dtype),
                 np.zeros((num_times, 0), dtype=data_dtype))
 
@@ -64,9 +77,75 @@ def bin_datapairs(keys, values, pair_counts, precision, data_dtype=np.int64):
     ylabels[columns] = keys
 
     rows = np.repeat(np.arange(num_times), pair_counts)
+    if sparse:
+        return ylabels, csr_from_pairs(
+            rows, columns, values, num_times, num_ylabels, data_dtype)
+
     flat_indices = rows * num_ylabels + columns
 
     data = np.zeros(num_times * num_ylabels, dtype=data_dtype)
     np.add.at(data, flat_indices, values)
 
     return ylabels, data.reshape(num_times, num_ylabels)
+
+
+def csr_from_pairs(rows, columns, values, num_rows, num_columns,
+                   data_dtype=np.int64):
+    """
+    Builds compressed sparse row (CSR) arrays from (row, column, value) cells.
+
+    Values at the same cell are summed in ``data_dtype``, and cells that sum to
+    zero are dropped. Row ``i`` holds the columns ``indices[indptr[i]:
+    indptr[i + 1]]`` (ascending) with the values ``values[indptr[i]:
+    indptr[i + 1]]``.
+
+    Args:
+        rows (np.ndarray): Row of each cell.
+        columns (np.ndarray): Column of each cell.
+        values (np.ndarray): Value of each cell.
+        num_rows (int): Number of rows.
+        num_columns (int): Number of columns.
+        data_dtype (np.dtype, optional): dtype of the summed values.
+
+    Returns:
+        Tuple ``(indptr, indices, values)`` of CSR arrays.
+
+    """
+    flat = rows.astype(np.int64) * num_columns + columns
+    values = values.astype(data_dtype, copy=False)
+    # The pairs of each scan usually arrive in key order already.
+    if flat.size > 1 and not np.all(flat[1:] > flat[:-1]):
+        order = np.argsort(flat, kind='stable')
+        flat = flat[order]
+        values = values[order]
+        starts = np.flatnonzero(np.r_[True, flat[1:] != flat[:-1]])
+        flat = flat[starts]
+        values = np.add.reduceat(values, starts, dtype=data_dtype)
+
+    nonzero = values != 0
+    flat = flat[nonzero]
+    values = values[nonzero]
+    cell_rows = flat // num_columns
+    indices = flat - cell_rows * num_columns
+    if num_columns <= np.iinfo(np.int32).max:
+        indices = indices.astype(np.int32)
+    indptr = np.zeros(num_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cell_rows, minlength=num_rows), out=indptr[1:])
+    return indptr, indices, values
+
+
+def csr_from_dense(data):
+    """
+    Builds compressed sparse row (CSR) arrays from a 2D matrix.
+
+    Args:
+        data (np.ndarray): 2D matrix.
+
+    Returns:
+        Tuple ``(indptr, indices, values)`` of CSR arrays.
+
+    """
+    rows, columns = np.nonzero(data)
+    return csr_from_pairs(
+        rows, columns, data[rows, columns], data.shape[0], data.shape[1],
+        data.dtype)
@@ -0,0 +1,151 @@
+"""
+Persistent on-disk cache of decoded data directories.
+
+Decoding raw vendor files is the expensive part of :obj:`rainbow.read`, and the
+same runs tend to be read over and over. With a ``cache_dir``, each decoded
+DataDirectory is written to the cache in the archive format of
+:meth:`DataDirectory.save`. A later read of the same run with the same
+arguments memory-maps those arrays instead of decoding the raw files again.
+
+Each cache entry is a directory named by a key that hashes the run's path, the
+size and modification time of every file in it, and the read arguments that
+change the decoded output (``precision``, ``hrms``, ``centroid``,
+``bin_width``, ...). Editing or replacing any raw file therefore changes the
+key, so stale entries are never returned. The cache is bounded in size: when a
+new entry pushes it over the limit, the least recently used entries are
+deleted. An entry's manifest modification time records when it was last used.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+from rainbow import _archive
+
+# Default size limit of a cache directory, in bytes.
+DEFAULT_CACHE_SIZE = 2 ** 30
+
+# Bumped whenever the decoders or the entry layout change in a way that makes
+# existing entries wrong, so that old entries are never read back.
+_CACHE_VERSION = 2
+
+
+def cache_key(path, read_args):
+    """
+    Computes the cache key of a run.
+
+    Args:
+        path (str): Path of the directory (or .dx file).
+        read_args (dict): Read arguments that change the decoded output.
+
+    Returns:
+        Hexadecimal string key.
+
+    """
+    path = os.path.abspath(path)
+    fingerprint = []
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                stat = os.stat(os.path.join(root, name))
+                fingerprint.append((
+                    os.path.relpath(os.path.join(root, name), path),
+                    stat.st_size, stat.st_mtime_ns))
+    else:
+        stat = os.stat(path)
+        fingerprint.append(('', stat.st_size, stat.st_mtime_ns))
+
+    key = json.dumps(
+        [_CACHE_VERSION, path, fingerprint, read_args],
+        sort_keys=True, default=str)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def load(cache_dir, key):
+    """
+    Loads a cached DataDirectory, with its arrays memory-mapped.
+
+    Args:
+        cache_dir (str): Path of the cache directory.
+        key (str): Cache key of the run (see :obj:`cache_key`).
+
+    Returns:
+        DataDirectory, or None if the run is not cached.
+
+    """
+    entry = os.path.join(cache_dir, key)
+    try:
+        datadir = _archive.load(entry, mmap=True)
+        # Mark the entry as recently used for the LRU eviction.
+        os.utime(os.path.join(entry, _archive.MANIFEST))
+    except Exception:
+        # Missing, or evicted by another process while being read.
+        return None
+    return datadir
+
+
+def store(cache_dir, key, datadir, max_size=DEFAULT_CACHE_SIZE):
+    """
+    Stores a DataDirectory in the cache, then evicts old entries.
+
+    Args:
+        cache_dir (str): Path of the cache directory.
+        key (str): Cache key of the run (see :obj:`cache_key`).
+        datadir (DataDirectory): Decoded directory to store.
+        max_size (int, optional): Size limit of the cache in bytes.
+
+    Returns:
+        True if the entry was stored, otherwise False.
+
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write into a private directory and rename it into place, so concurrent
+    # readers never see a partial entry.
+    tmp = os.path.join(cache_dir, f".{key}.{uuid.uuid4().hex}.tmp")
+    try:
+        _archive.save(datadir, tmp)
+        os.rename(tmp, os.path.join(cache_dir, key))
+    except (OSError, ValueError, TypeError):
+        # Another process stored the same entry first, or the data cannot be
+        # written as plain arrays. Either way the read itself succeeded.
+        shutil.rmtree(tmp, ignore_errors=True)
+        return False
+
+    evict(cache_dir, max_size)
+    return True
+
+
+def evict(cache_dir, max_size):
+    """
+    Deletes the least recently used entries until the cache fits the limit.
+
+    Args:
+        cache_dir (str): Path of the cache directory.
+        max_size (int): Size limit of the cache in bytes.
+
+    """
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, name)
+        manifest_path = os.path.join(entry, _archive.MANIFEST)
+        if name.startswith('.') or not os.path.isfile(manifest_path):
+            continue
+        try:
+            size = sum(os.path.getsize(os.path.join(entry, fn))
+                       for fn in os.listdir(entry))
+            last_used = os.path.getmtime(manifest_path)
+        except OSError:
+            continue
+        entries.append((last_used, size, entry))
+        total += size
+
+    for _, size, entry in sorted(entries):
+        if total <= max_size:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+
@@ -0,0 +1,49 @@
+"""
+Shared helper for decoding independent files in parallel.
+
+A data directory holds many files that decode independently of one another
+(Agilent ``.ch``/``.uv``/``.ms`` files, Waters ``_FUNC``/``_CHRO`` files). The
+vendor parsers hand their per-file decoder and file list to :obj:`map_ordered`,
+which fans the calls out over a thread pool and returns the results in input
+order, so the DataFile order (and the directory metadata derived from it) is
+the same as a serial parse.
+
+Threads rather than processes are used because the decoded arrays are large:
+a thread pool hands them back without pickling, and the heavy lifting happens
+in NumPy and the compiled accelerators rather than in interpreted Python.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+def map_ordered(func, items, workers=None):
+    """
+    Applies :obj:`func` to each item, using up to :obj:`workers` threads.
+
+    Args:
+        func (callable): Function of one argument.
+        items (iterable): Arguments to apply :obj:`func` to.
+        workers (int, optional): Maximum number of threads. None or 1 \
+            applies :obj:`func` serially in the calling thread.
+
+    Returns:
+        List of the results, in the same order as :obj:`items`.
+
+    """
+    items = list(items)
+    if not workers or workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+def check_workers(workers):
+    """
+    Raises an exception unless :obj:`workers` is None or a positive integer.
+
+    """
+    if workers is not None and (
+            isinstance(workers, bool) or not isinstance(workers, int)
+            or workers < 1):
+        raise Exception(
+            f"Invalid workers: {workers!r}. Use None or a positive integer.")
@@ -5,7 +5,8 @@ from rainbow.datadirectory import DataDirectory
 
 
 def read(path, precision='auto', hrms=False, requested_files=None,
-         telemetry=False, centroid=False, bin_width=None):
+         telemetry=False, centroid=False, bin_width=None, lazy=False,
+         workers=None, sparse=False, rt_range=None, wavelengths=None):
     """
     Reads an Agilent .D directory or .dx archive.
 
@@ -24,6 +25,21 @@ def read(path, precision='auto', hrms=False, requested_files=None,
             representation (one
             :class:`~rainbow.agilent.masshunter.ProfileDataFile` per flight-time
             grid); pass a width to project onto the shared m/z grid.
+        lazy (bool, optional): Flag for deferring the decoding of Chemstation
+            files and per-scan MassHunter profile scans until their data is
+            first accessed. Other MassHunter data and .dx data is always
+            decoded up front.
+        workers (int, optional): Number of threads to decode Chemstation
+            files and MassHunter profile scans with.
+        sparse (bool, optional): Flag for storing .ms data, MassHunter
+            centroids, and the shared-grid HRMS profile as
+            :class:`~rainbow.datafile.SparseDataFile` objects. .dx data is
+            always dense.
+        rt_range (tuple, optional): Start and end retention times in minutes
+            of the Chemstation .uv scans to decode. Other files are read
+            whole.
+        wavelengths (list, optional): Wavelengths to keep from Chemstation
+            .uv files. Other files are read whole.
 
     Returns:
         DataDirectory representing the Agilent data.
@@ -34,12 +50,15 @@ def read(path, precision='auto', hrms=False, requested_files=None,
         return openlab.read(path, precision, requested_files, telemetry)
 
     datafiles = []
-    datafiles.extend(chemstation.parse_allfiles(path, precision, requested_files))
+    datafiles.extend(chemstation.parse_allfiles(
+        path, precision, requested_files, lazy=lazy, workers=workers,
+        sparse=sparse, rt_range=rt_range, wavelengths=wavelengths))
     if hrms or centroid:
         try:
             from rainbow.agilent import masshunter
             datafiles.extend(masshunter.parse_allfiles(
-                path, precision, hrms, centroid, bin_width))
+                path, precision, hrms, centroid, bin_width, sparse, workers,
+                lazy))
         except ModuleNotFoundError:
             raise ModuleNotFoundError("You must install python-lzf to parse masshunter files.")
 
@@ -55,10 +74,46 @@ def read(path, precision='auto', hrms=False, requested_files=None,
     return DataDirectory(path, datafiles, metadata)
 
 
+def inspect(path):
+    """
+    Reads the shape of each file in an Agilent .D directory or .dx archive \
+        without decoding any data.
+
+    Args:
+        path (str): Path of the directory or .dx file.
+
+    Returns:
+        List with a dictionary describing each file.
+
+    """
+    if os.path.splitext(path)[1].lower() == '.dx':
+        from rainbow.agilent import openlab
+        return openlab.inspect(path)
+
+    infos = []
+    for name in sorted(os.listdir(path)):
+        file_path = os.path.join(path, name)
+        if os.path.isfile(file_path):
+            info = chemstation.inspect_file(file_path)
+            if info is not None:
+                infos.append(info)
+    if os.path.isdir(os.path.join(path, "AcqData")):
+        try:
+            from rainbow.agilent import masshunter
+            infos.extend(masshunter.inspect_allfiles(path))
+        except ModuleNotFoundError:
+            raise ModuleNotFoundError("You must install python-lzf to parse masshunter files.")
+    return infos
+
+
 def read_metadata(path):
     """
     Reads metadata from an Agilent .D directory.
 
+    If the directory files hold no metadata, the date and vial position are \
+        read from the headers of the data files, which become \
+        :class:`~rainbow.datafile.LazyDataFile` stubs. No data is decoded.
+
     Args:
         path (str): Path of the directory.
 
@@ -73,7 +128,7 @@ def read_metadata(path):
     datafiles = []
     metadata = chemstation.parse_metadata(path, datafiles)
     if len(metadata) == 1:
-        datadir = read(path)
+        datadir = read(path, lazy=True)
         if datadir:
             return {'datafiles': datadir.datafiles + datadir.analog, 'metadata': datadir.metadata}
         return None
@@ -24,6 +24,9 @@ accumulator, *unless* it equals ``-0x8000`` (the sentinel), in which case the
 following big-endian 32-bit integer is the new absolute accumulator value. The
 ``.ch`` fields are big-endian, so the multi-byte values are assembled from
 individual bytes rather than copied.
+
+The loop runs without the GIL, so threads decoding different files run in
+parallel.
 """
 
 import numpy as np
@@ -68,29 +71,30 @@ def decode_delta(const unsigned char[::1] buf, Py_ssize_t offset):
     cdef short delta
     cdef int absolute
 
-    while off < n:
-        if buf[off] != _SEGMENT:
-            break
-        off += 1
-        if off >= n:
-            break
-        count = buf[off]
-        off += 1
-        for j in range(count):
-            if off + 2 > n:
+    with nogil:
+        while off < n:
+            if buf[off] != _SEGMENT:
+                break
+            off += 1
+            if off >= n:
                 break
-            delta = <short>((buf[off] << 8) | buf[off + 1])
-            off += 2
-            if delta == _SENTINEL:
-                if off + 4 > n:
+            count = buf[off]
+            off += 1
+            for j in range(count):
+                if off + 2 > n:
                     break
-                absolute = <int>((buf[off] << 24) | (buf[off + 1] << 16)
-                                 | (buf[off + 2] << 8) | buf[off + 3])
-                off += 4
-                acc = absolute
-            else:
-                acc += delta
-            out[k] = acc
-            k += 1
+                delta = <short>((buf[off] << 8) | buf[off + 1])
+                off += 2
+                if delta == _SENTINEL:
+                    if off + 4 > n:
+                        break
+                    absolute = <int>((buf[off] << 24) | (buf[off + 1] << 16)
+                                     | (buf[off + 2] << 8) | buf[off + 3])
+                    off += 4
+                    acc = absolute
+                else:
+                    acc += delta
+                out[k] = acc
+                k += 1
 
     return out_arr[:k]
@@ -17,17 +17,21 @@ built (no compiler or no Cython at install time), the package falls back to the
 pure-Python implementation transparently. The ``MSProfile.bin`` fields are
 little-endian, which matches every platform NumPy ships wheels for, so values
 are read with a native ``memcpy``.
+
+The token loop runs without the GIL, so threads decoding different scans run
+in parallel. A malformed stream is reported by a status code and raised as
+``ValueError`` once the GIL is held again.
 """
 
 import numpy as np
 from libc.string cimport memcpy
 
 
-cdef inline int _width_size(int flag) except -1:
-    """Bytes for an RLE width flag (1/2/3/4 -> 1/2/4/8); raise on anything else.
+cdef inline int _width_size(int flag) noexcept nogil:
+    """Bytes for an RLE width flag (1/2/3/4 -> 1/2/4/8); -1 for anything else.
 
-    A zero or out-of-range flag means a corrupt stream; raising here mirrors
-    the ValueError the pure-Python reference reports rather than reading at a
+    A zero or out-of-range flag means a corrupt stream; the caller raises the
+    ValueError the pure-Python reference reports rather than reading at a
     bogus width (this module disables Cython's automatic bounds checks).
     """
     if flag == 1:
@@ -38,10 +42,11 @@ cdef inline int _width_size(int flag) except -1:
         return 4
     elif flag == 4:
         return 8
-    raise ValueError("Malformed MSProfile.bin RLE segment.")
+    return -1
 
 
-def decompress_inten_list(const unsigned char[::1] comp_view, int num_mz):
+def decompress_inten_list(const unsigned char[::1] comp_view, int num_mz,
+                          out=None):
     """Decode one run-length-encoded intensity stream.
 
     Args:
@@ -50,9 +55,12 @@ def decompress_inten_list(const unsigned char[::1] comp_view, int num_mz):
             leading-zero count, and the token stream (which opens at 4-byte
             width).
         num_mz: The number of mz-intensity pairs (output length).
+        out: Optional contiguous ``num_mz``-length ``uint32`` array to decode
+            into, e.g. a row of a preallocated intensity matrix.
 
     Returns:
-        A ``num_mz``-length ``uint32`` NumPy array of intensities.
+        A ``num_mz``-length ``uint32`` NumPy array of intensities (``out``, if
+        it was given).
 
     Raises:
         ValueError: If the stream is malformed (bad width flag, runs past the
@@ -76,8 +84,15 @@ def decompress_inten_list(const unsigned char[::1] comp_view, int num_mz):
         raise ValueError(
             "Malformed MSProfile.bin RLE segment: negative initial index.")
 
-    data_arr = np.zeros(num_mz, dtype=np.uint32)
+    if out is None:
+        data_arr = np.zeros(num_mz, dtype=np.uint32)
+    else:
+        data_arr = out
     cdef unsigned int[::1] inten = data_arr
+    if inten.shape[0] != num_mz:
+        raise ValueError("out must hold num_mz intensities.")
+    if out is not None:
+        inten[:] = 0
 
     # The token stream opens at an initial width of 4 bytes (width flag 3); a
     # control value switches it thereafter.
@@ -90,32 +105,42 @@ def decompress_inten_list(const unsigned char[::1] comp_view, int num_mz):
     cdef int v4
     cdef long long v8
 
-    while off < n:
-        if off + cur_size > n:
-            raise ValueError("Malformed MSProfile.bin RLE segment.")
-        if cur_size == 1:
-            memcpy(&v1, &comp_view[off], 1)
-            value = v1
-        elif cur_size == 2:
-            memcpy(&v2, &comp_view[off], 2)
-            value = v2
-        elif cur_size == 4:
-            memcpy(&v4, &comp_view[off], 4)
-            value = v4
-        else:
-            memcpy(&v8, &comp_view[off], 8)
-            value = v8
-        off += cur_size
-
-        if value >= 0:
-            if cur_idx >= num_mz:
-                raise ValueError("Malformed MSProfile.bin RLE segment.")
-            inten[cur_idx] = <unsigned int>value
-            cur_idx += 1
-        else:
-            value = -value
-            num_zeros = <Py_ssize_t>(value // 4)
-            width_flag = <int>(value % 4)
-            cur_idx += num_zeros
-            cur_size = _width_size(width_flag)
+    cdef bint malformed = False
+
+    with nogil:
+        while off < n:
+            if off + cur_size > n:
+                malformed = True
+                break
+            if cur_size == 1:
+                memcpy(&v1, &comp_view[off], 1)
+                value = v1
+            elif cur_size == 2:
+                memcpy(&v2, &comp_view[off], 2)
+                value = v2
+            elif cur_size == 4:
+                memcpy(&v4, &comp_view[off], 4)
+                value = v4
+            else:
+                memcpy(&v8, &comp_view[off], 8)
+                value = v8
+            off += cur_size
+
+            if value >= 0:
+                if cur_idx >= num_mz:
+                    malformed = True
+                    break
+                inten[cur_idx] = <unsigned int>value
+                cur_idx += 1
+            else:
+                value = -value
+                num_zeros = <Py_ssize_t>(value // 4)
+                width_flag = <int>(value % 4)
+                cur_idx += num_zeros
+                cur_size = _width_size(width_flag)
+                if cur_size < 0:
+                    malformed = True
+                    break
+    if malformed:
+        raise ValueError("Malformed MSProfile.bin RLE segment.")
     return data_arr
@@ -23,6 +23,14 @@ added to a running accumulator, *unless* it equals ``-0x8000`` (the sentinel),
 in which case the following 32-bit little-endian integer is the new absolute
 accumulator value. The ``.uv`` fields are little-endian, which matches every
 platform NumPy ships wheels for, so values are read with a native ``memcpy``.
+
+Both decoders take an optional selection of wavelength columns. Every sample is
+still walked (the accumulator runs across the whole row), but only the selected
+columns are stored, so the output is ``(num_times, len(columns))``.
+
+The loops run without the GIL, so threads decoding different files run in
+parallel. A truncated stream is reported by a status code and raised as
+``ValueError`` once the GIL is held again.
 """
 
 import numpy as np
@@ -36,13 +44,17 @@ cdef Py_ssize_t _HEADER = 22
 
 cdef inline Py_ssize_t _decode_row(const unsigned char[::1] buf, Py_ssize_t off,
                                    Py_ssize_t n, int nwl,
+                                   const Py_ssize_t[::1] slots,
                                    long long[:, ::1] data,
-                                   Py_ssize_t row) except -1:
+                                   Py_ssize_t row) noexcept nogil:
     """Decode one row of ``nwl`` samples into ``data[row]``; return new offset.
 
-    Raises ``ValueError`` if the buffer ends mid-row -- mirroring the exception
-    the pure-Python path would raise on a short read, rather than reading out of
-    bounds (this module disables Cython's automatic bounds checks for speed).
+    Sample ``j`` is stored in column ``slots[j]``, or dropped if that is -1.
+
+    Returns -1 if the buffer ends mid-row, which the callers raise as
+    ``ValueError`` -- mirroring the exception the pure-Python path would raise
+    on a short read, rather than reading out of bounds (this module disables
+    Cython's automatic bounds checks for speed).
     """
     cdef int j
     cdef long long acc = 0
@@ -50,23 +62,24 @@ cdef inline Py_ssize_t _decode_row(const unsigned char[::1] buf, Py_ssize_t off,
     cdef int v
     for j in range(nwl):
         if off + 2 > n:
-            raise ValueError("truncated Agilent .uv delta stream")
+            return -1
         memcpy(&ci, &buf[off], 2)
         off += 2
         if ci == _SENTINEL:
             if off + 4 > n:
-                raise ValueError("truncated Agilent .uv delta stream")
+                return -1
             memcpy(&v, &buf[off], 4)
             off += 4
             acc = v
         else:
             acc += ci
-        data[row, j] = acc
+        if slots[j] >= 0:
+            data[row, slots[j]] = acc
     return off
 
 
 cdef inline Py_ssize_t _scan_row(const unsigned char[::1] buf, Py_ssize_t off,
-                                 Py_ssize_t n, int nwl):
+                                 Py_ssize_t n, int nwl) noexcept nogil:
     """Return the offset just past a complete row, or -1 if it would overrun.
 
     Used to count rows in a variable-length (partial) stream without decoding.
@@ -85,8 +98,20 @@ cdef inline Py_ssize_t _scan_row(const unsigned char[::1] buf, Py_ssize_t off,
     return off
 
 
+def _column_slots(int nwl, columns):
+    """Map each sample of a row to its output column (-1 drops it)."""
+    if columns is None:
+        return np.arange(nwl, dtype=np.intp), nwl
+    columns = np.asarray(columns, dtype=np.intp)
+    if columns.size and (columns.min() < 0 or columns.max() >= nwl):
+        raise ValueError("wavelength column out of range")
+    slots = np.full(nwl, -1, dtype=np.intp)
+    slots[columns] = np.arange(columns.size, dtype=np.intp)
+    return slots, columns.size
+
+
 def decode_uv_delta(const unsigned char[::1] buf, Py_ssize_t data_start,
-                    int num_times, int nwl):
+                    int num_times, int nwl, columns=None):
     """Decode a fixed-length ``.uv`` delta stream with a known row count.
 
     Args:
@@ -94,13 +119,17 @@ def decode_uv_delta(const unsigned char[::1] buf, Py_ssize_t data_start,
         data_start: Offset of the first record.
         num_times: Number of retention times (rows) to decode.
         nwl: Number of wavelengths (samples) per row.
+        columns: Optional sorted indices of the wavelengths to keep.
 
     Returns:
         ``(times, data)`` where ``times`` is a ``uint32`` array of raw times and
-        ``data`` is an ``(num_times, nwl)`` ``int64`` array of accumulated values.
+        ``data`` is an ``(num_times, ncols)`` ``int64`` array of accumulated
+        values, ``ncols`` being ``nwl`` or the number of selected columns.
     """
+    slots_arr, ncols = _column_slots(nwl, columns)
+    cdef const Py_ssize_t[::1] slots = slots_arr
     times_arr = np.empty(num_times, dtype=np.uint32)
-    data_arr = np.empty((num_times, nwl), dtype=np.int64)
+    data_arr = np.empty((num_times, ncols), dtype=np.int64)
     cdef unsigned int[::1] times = times_arr
     cdef long long[:, ::1] data = data_arr
 
@@ -109,17 +138,23 @@ def decode_uv_delta(const unsigned char[::1] buf, Py_ssize_t data_start,
     cdef Py_ssize_t i
     cdef unsigned int t
 
-    for i in range(num_times):
-        if off + _HEADER > n:
-            raise ValueError("truncated Agilent .uv delta stream")
-        memcpy(&t, &buf[off + 4], 4)
-        times[i] = t
-        off = _decode_row(buf, off + _HEADER, n, nwl, data, i)
+    with nogil:
+        for i in range(num_times):
+            if off + _HEADER > n:
+                off = -1
+                break
+            memcpy(&t, &buf[off + 4], 4)
+            times[i] = t
+            off = _decode_row(buf, off + _HEADER, n, nwl, slots, data, i)
+            if off < 0:
+                break
+    if off < 0:
+        raise ValueError("truncated Agilent .uv delta stream")
     return times_arr, data_arr
 
 
 def decode_uv_delta_stream(const unsigned char[::1] buf, Py_ssize_t data_start,
-                           int nwl):
+                           int nwl, columns=None):
     """Decode a partial ``.uv`` delta stream of unknown length (read to EOF).
 
     Partial files do not record the number of retention times, so this makes two
@@ -132,25 +167,29 @@ def decode_uv_delta_stream(const unsigned char[::1] buf, Py_ssize_t data_start,
         buf: The whole file as a bytes-like buffer.
         data_start: Offset of the first record.
         nwl: Number of wavelengths (samples) per row.
+        columns: Optional sorted indices of the wavelengths to keep.
 
     Returns:
         ``(times, data)`` as in :func:`decode_uv_delta`.
     """
+    slots_arr, ncols = _column_slots(nwl, columns)
+    cdef const Py_ssize_t[::1] slots = slots_arr
     cdef Py_ssize_t n = buf.shape[0]
     cdef Py_ssize_t off = data_start
     cdef Py_ssize_t probe
     cdef int rows = 0
 
     # Pass 1: count complete rows.
-    while off + _HEADER <= n:
-        probe = _scan_row(buf, off + _HEADER, n, nwl)
-        if probe < 0:
-            break
-        rows += 1
-        off = probe
+    with nogil:
+        while off + _HEADER <= n:
+            probe = _scan_row(buf, off + _HEADER, n, nwl)
+            if probe < 0:
+                break
+            rows += 1
+            off = probe
 
     times_arr = np.empty(rows, dtype=np.uint32)
-    data_arr = np.empty((rows, nwl), dtype=np.int64)
+    data_arr = np.empty((rows, ncols), dtype=np.int64)
     cdef unsigned int[::1] times = times_arr
     cdef long long[:, ::1] data = data_arr
 
@@ -159,8 +198,9 @@ def decode_uv_delta_stream(const unsigned char[::1] buf, Py_ssize_t data_start,
 
     # Pass 2: decode the rows counted above (none will overrun).
     off = data_start
-    for i in range(rows):
-        memcpy(&t, &buf[off + 4], 4)
-        times[i] = t
-        off = _decode_row(buf, off + _HEADER, n, nwl, data, i)
+    with nogil:
+        for i in range(rows):
+            memcpy(&t, &buf[off + 4], 4)
+            times[i] = t
+            off = _decode_row(buf, off + _HEADER, n, nwl, slots, data, i)
     return times_arr, data_arr
@@ -3,13 +3,17 @@ Methods for parsing Agilent Chemstation files.
  
 """
 
+import mmap
 import os
 import struct
+import warnings
+from bisect import bisect_left
 from collections import Counter
+from functools import partial
 import numpy as np
-from lxml import etree
-from rainbow.datafile import DataFile
+from rainbow.datafile import DataFile, LazyDataFile, SparseDataFile
 from rainbow._binning import bin_datapairs
+from rainbow._parallel import map_ordered
 
 # Optional compiled accelerators for the delta decode loops.
 # Falls back to the pure-Python implementations below if not built.
@@ -23,25 +27,105 @@ try:
 except ImportError:
     _chdelta_fast = None
 
+try:
+    from rainbow.agilent import _chdoubledelta as _chdoubledelta_fast
+except ImportError:
+    _chdoubledelta_fast = None
+
 # Lookup table for the .ms intensity scale 8 ** (int_enc >> 14); the 2-bit
 # head field is 0..3, so indexing this beats np.power over every pair.
 _MS_INT_POW8 = np.array([1, 8, 64, 512], dtype=np.uint32)
 
+# Number of values per block when the NumPy .uv decoder rebuilds the
+# accumulator, which bounds its temporary arrays.
+_UV_BLOCK_VALUES = 1 << 20
+
+# Header offsets of the metadata strings, keyed by the version string at the
+# start of each file. Shared by the parsers and by parse_file_header, which
+# reads only these fields.
+_CH_METADATA_OFFSETS = {
+    '181': {
+        'notebook': 0x35A,
+        'date': 0x957,
+        'method': 0xA0E,
+        'instrument': 0xC11,
+        'unit': 0x104C,
+    },
+    '179': {
+        'notebook': 0x35A,
+        'date': 0x957,
+        'method': 0xA0E,
+        'instrument': 0xC11,
+        'unit': 0x104C,
+        'signal': 0x1075
+    },
+    '130': {
+        'notebook': 0x35A,
+        'date': 0x957,
+        'method': 0xA0E,
+        'instrument': 0xC11,
+        'unit': 0x104C,
+        'signal': 0x1075
+    },
+    '30': {
+        'notebook': 0x18,
+        'date': 0xB2,
+        'method': 0xE4,
+        'instrument': 0xDA,
+        'unit': 0x244,
+        'signal': 0x254
+    }
+}
+_UV_METADATA_OFFSETS = {
+    '131': {
+        "notebook": 0x35A,
+        "date": 0x957,
+        "method": 0xA0E,
+        "unit": 0xC15,
+        "signal": 0xC40,
+        "vialpos": 0xFD7
+    },
+    '31': {
+        "notebook": 0x18,
+        "date": 0xB2,
+        "method": 0xE4,
+        "unit": 0x146
+    }
+}
+_MS_METADATA_OFFSETS = {
+    'date': 0xB2,
+    'method': 0xE4
+}
+
 """
 MAIN PARSING METHODS
 
 """
 
 
-def parse_allfiles(path, precision='auto', requested_files=None):
+def parse_allfiles(path, precision='auto', requested_files=None, lazy=False,
+                   workers=None, sparse=False, rt_range=None,
+                   wavelengths=None):
     """
     Finds and parses Agilent Chemstation data files \
         with a .ch, .uv, or .ms extension from a .D directory.
+
+    With :obj:`lazy` set, only the file headers are read here. Each file \
+        becomes a :class:`~rainbow.datafile.LazyDataFile` that is decoded \
+        the first time its data is accessed.
     
     Args:
         path (str): Path to the .D directory.
         precision (int, optional): Number of decimals to round mz values.
         requested_files (list, optional): List of filenames to parse.
+        lazy (bool, optional): Flag for deferring decoding until first access.
+        workers (int, optional): Number of threads to decode files with. \
+            None decodes them one after another.
+        sparse (bool, optional): Flag for storing .ms data as a \
+            :class:`~rainbow.datafile.SparseDataFile`.
+        rt_range (tuple, optional): Start and end retention times in \
+            minutes of the .uv scans to decode. Other files are read whole.
+        wavelengths (list, optional): Wavelengths to keep from .uv files.
 
     Returns:
         List with a DataFile for each parsed data file.
@@ -51,22 +135,24 @@ def parse_allfiles(path, precision='auto', requested_files=None):
     # precision means whole numbers.
     if precision == 'auto':
         precision = 0
-    datafiles = []
     # Sort for a deterministic parse order across platforms: os.listdir returns
     # entries in filesystem order, which differs between macOS and Linux. The
     # directory-level date/vialpos is chosen by Counter.most_common, whose tie
     # break depends on insertion order, so an unsorted listing makes the
-    # resulting metadata platform-dependent.
-    for name in sorted(os.listdir(path)):
-        if requested_files and name.lower() not in requested_files:
-            continue
-        datafile = parse_file(os.path.join(path, name), precision)
-        if datafile:
-            datafiles.append(datafile)
-    return datafiles
-
-
-def parse_file(path, precision=0):
+    # resulting metadata platform-dependent. map_ordered keeps this order when
+    # the files are decoded in parallel.
+    paths = [os.path.join(path, name) for name in sorted(os.listdir(path))
+             if not requested_files or name.lower() in requested_files]
+    parse = parse_file_lazy if lazy else parse_file
+    datafiles = map_ordered(
+        lambda file_path: parse(
+            file_path, precision, sparse, rt_range, wavelengths),
+        paths, workers)
+    return [datafile for datafile in datafiles if datafile]
+
+
+def parse_file(path, precision=0, sparse=False, rt_range=None,
+               wavelengths=None):
     """
     Parses an Agilent Chemstation data file. 
     
@@ -75,21 +161,416 @@ def parse_file(path, precision=0):
     Args:
         path (str): Path to the data file.
         precision (int, optional): Number of decimals to round mz values.
+        sparse (bool, optional): Flag for storing .ms data as a \
+            :class:`~rainbow.datafile.SparseDataFile`.
+        rt_range (tuple, optional): Start and end retention times in \
+            minutes of the .uv scans to decode.
+        wavelengths (list, optional): Wavelengths to keep from .uv files.
     
     Returns:
         DataFile representing the file, if it can be parsed. Otherwise, None.
 
     """
     ext = os.path.splitext(path)[1].lower()
+    if ext not in ('.ch', '.uv', '.ms'):
+        return None
+    with open(path, 'rb') as f:
+        if not has_data(f, ext, os.path.getsize(path)):
+            return None
     if ext == '.ch':
         return parse_ch(path)
     elif ext == '.uv':
-        return parse_uv(path)
+        return parse_uv(path, rt_range, wavelengths)
     elif ext == '.ms':
-        return parse_ms(path, precision)
+        return parse_ms(path, precision, sparse)
     return None
 
 
+def parse_file_lazy(path, precision=0, sparse=False, rt_range=None,
+                    wavelengths=None):
+    """
+    Reads the header of an Agilent Chemstation data file and defers decoding.
+
+    The detector and metadata are taken from the header (see \
+        :obj:`parse_file_header`). The data is decoded by :obj:`parse_file` \
+        the first time it is accessed.
+
+    Args:
+        path (str): Path to the data file.
+        precision (int, optional): Number of decimals to round mz values.
+        sparse (bool, optional): Flag for storing .ms data as a \
+            :class:`~rainbow.datafile.SparseDataFile`.
+        rt_range (tuple, optional): Start and end retention times in \
+            minutes of the .uv scans to decode.
+        wavelengths (list, optional): Wavelengths to keep from .uv files.
+
+    Returns:
+        LazyDataFile representing the file, if the header is recognized. \
+            Otherwise, None.
+
+    """
+    header = parse_file_header(path)
+    if header is None:
+        return None
+    detector, metadata = header
+    return LazyDataFile(
+        path, detector,
+        partial(parse_file, path, precision, sparse, rt_range, wavelengths),
+        metadata)
+
+
+def parse_file_header(path):
+    """
+    Reads the detector and metadata of an Agilent Chemstation data file \
+        from its header, without decoding any data.
+
+    The metadata matches what :obj:`parse_file` would return for the file.
+
+    Args:
+        path (str): Path to the data file.
+
+    Files without a complete data record are not recognized, like in \
+        :obj:`parse_file` (see :obj:`has_data`).
+
+    Returns:
+        Tuple of the detector and a metadata dictionary, if the header is \
+            recognized. Otherwise, None.
+
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in ('.ch', '.uv', '.ms'):
+        return None
+
+    with open(path, 'rb') as f:
+        if not has_data(f, ext, os.path.getsize(path)):
+            return None
+        if ext == '.ch':
+            head = read_string(f, 0, gap=1)
+            if head in ('179', '181'):
+                return 'FID', read_header(f, _CH_METADATA_OFFSETS[head])
+            if head in ('130', '30'):
+                gap = 2 if head == '130' else 1
+                metadata = read_header(f, _CH_METADATA_OFFSETS[head], gap=gap)
+                detector, _ = ch_signal_info(metadata.get('signal', ''))
+                return detector, metadata
+            return None
+
+        if ext == '.uv':
+            head = read_string(f, 0, gap=1)
+            if head == '131':
+                # Partial files share the 131 header layout.
+                file_type = read_string(f, 347, gap=2)
+                if not file_type.startswith(('LC', 'OL')):
+                    return None
+                return 'UV', read_header(f, _UV_METADATA_OFFSETS[head])
+            if head == '31':
+                return 'UV', read_header(f, _UV_METADATA_OFFSETS[head], gap=1)
+            return None
+
+        # A complete .ms file starts with a fixed magic number. Partial files
+        # do not, but leave the data start offset null instead.
+        f.seek(0)
+        head = struct.unpack('>I', f.read(4))[0]
+        if head != 0x01320000:
+            f.seek(0x10A)
+            if struct.unpack('>H', f.read(2))[0] != 0:
+                return None
+        return 'MS', read_header(f, _MS_METADATA_OFFSETS, 1)
+
+
+def has_data(f, ext, file_size):
+    """
+    Checks that an Agilent Chemstation data file holds at least one \
+        complete data record, by reading the header of the first one.
+
+    A file cut off at or shortly after its header is skipped by both \
+        :obj:`parse_file` and :obj:`parse_file_header`, so a lazy read \
+        lists the same files as an eager one.
+
+    Args:
+        f (file): Seekable binary file object of the data file.
+        ext (str): Lowercase extension of the data file.
+        file_size (int): Size of the data file in bytes.
+
+    Returns:
+        True if the first record is complete. False otherwise, including \
+            for unrecognized headers.
+
+    """
+    def read(offset, fmt):
+        size = struct.calcsize(fmt)
+        if offset + size > file_size:
+            return None
+        f.seek(offset)
+        return struct.unpack(fmt, f.read(size))
+
+    if file_size < 4:
+        return False
+    f.seek(0)
+    if ext == '.ms':
+        # The data start offset is null in partial files. See parse_ms.
+        offset = read(0x10A, '>H')
+        if offset is None:
+            return False
+        if read(0, '>I')[0] == 0x01320000:
+            offset = offset[0] * 2 - 2
+        elif offset[0] == 0:
+            offset = 0x2F2
+        else:
+            return False
+        # Each record holds 18 header bytes and 4 bytes per pair. See
+        # index_ms.
+        pair_count = read(offset + 16, '>H')
+        return pair_count is not None \
+            and offset + 18 + 4 * pair_count[0] <= file_size
+
+    head = read_string(f, 0, gap=1)
+    if ext == '.ch':
+        if head == '179':
+            return file_size >= 0x1800 + 8
+        if head == '181':
+            # The sentinel 0x7FFF is followed by a 6-byte absolute value.
+            first = read(0x1800, '>h')
+            return first is not None and (
+                first[0] != 0x7FFF or file_size >= 0x1800 + 8)
+        if head in ('130', '30'):
+            # A segment header (0x10 and a sample count), then a delta, or
+            # -0x8000 and a 4-byte absolute value.
+            data_start = 0x1800 if head == '130' else 0x400
+            first = read(data_start, '>BBh')
+            return first is not None and first[0] == 0x10 and first[1] > 0 \
+                and (first[2] != -0x8000 or file_size >= data_start + 8)
+        return False
+
+    if head not in ('131', '31'):
+        return False
+    data_start = 0x1000 if head == '131' else 0x200
+    if file_size < data_start + 22:
+        return False
+    if head == '131' and read_string(f, 347, gap=2).startswith('OL'):
+        # The doubles follow a 22-byte header. See decode_uv_array.
+        wavelengths = read(data_start + 8, '<HHH')
+        if wavelengths is None or wavelengths[2] < 20:
+            return False
+        start_wlen, end_wlen, delta_wlen = (num // 20 for num in wavelengths)
+        num_wavelengths = np.arange(start_wlen, end_wlen + 1, delta_wlen).size
+        return file_size >= data_start + 22 + 8 * num_wavelengths
+    # Each segment starts with its length. See index_uv.
+    seg_len = read(data_start + 2, '<H')
+    return seg_len[0] > 0 and data_start + seg_len[0] <= file_size
+
+
+def inspect_file(path):
+    """
+    Reads the shape of an Agilent Chemstation data file without decoding \
+        its data.
+
+    See :obj:`inspect_header` for the returned fields.
+
+    Args:
+        path (str): Path to the data file.
+
+    Returns:
+        Dictionary describing the file, if the header is recognized. \
+            Otherwise, None.
+
+    """
+    header = parse_file_header(path)
+    if header is None:
+        return None
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, 'rb') as f:
+        shape = inspect_header(f, ext, os.path.getsize(path))
+    if shape is None:
+        return None
+    return {'name': os.path.basename(path), 'detector': header[0], **shape}
+
+
+def inspect_header(f, ext, file_size):
+    """
+    Reads the number of retention times, retention time range, and ylabel \
+        range of an Agilent Chemstation data file from its header and the \
+        headers of its data segments.
+
+    The .uv and .ms scan counts are stored in the file header, and each \
+        data segment starts with its own length, so only the segment \
+        headers are visited. The .ch delta streams have no stored count, \
+        so their segment headers and escapes are walked to count the \
+        values, without decoding them.
+
+    For .ms files, the m/z range is taken from the first and last pair of \
+        each scan, which are stored in descending order. The number of \
+        ylabels is then an upper bound for whole-number precision.
+
+    Args:
+        f (file): Seekable binary file object of the data file.
+        ext (str): Lowercase extension of the data file.
+        file_size (int): Size of the data file in bytes.
+
+    Returns:
+        Dictionary with the number of retention times, the retention time \
+            range in minutes, the ylabel range (None for single channels), \
+            the number of ylabels, and the estimated size in bytes of the \
+            decoded data array. None if the file is not recognized.
+
+    """
+    if ext == '.ch':
+        return _inspect_ch(f, file_size)
+    if ext == '.uv':
+        return _inspect_uv(f, file_size)
+    if ext == '.ms':
+        return _inspect_ms(f, file_size)
+    return None
+
+
+def _shape(num_times, rt_range, ylabel_range, num_ylabels, itemsize):
+    """Builds the dictionary returned by :obj:`inspect_header`."""
+    return {
+        'num_times': num_times,
+        'rt_range': rt_range,
+        'ylabel_range': ylabel_range,
+        'num_ylabels': num_ylabels,
+        'decoded_bytes': num_times * num_ylabels * itemsize
+    }
+
+
+def _inspect_ch(f, file_size):
+    """Inspects a .ch file. See :obj:`inspect_header`."""
+    head = read_string(f, 0, gap=1)
+    if head in ('179', '181'):
+        data_start = 0x1800
+        if head == '179':
+            num_times = (file_size - data_start) // 8
+        else:
+            num_times = count_double_delta(f, data_start)
+        f.seek(0x11A)
+        start_time, end_time = struct.unpack('>ff', f.read(8))
+    elif head in ('130', '30'):
+        data_start = 0x1800 if head == '130' else 0x400
+        num_times = count_delta(f, data_start)
+        f.seek(0x11A)
+        start_time, end_time = struct.unpack('>ii', f.read(8))
+    else:
+        return None
+    if num_times == 0:
+        return None
+    return _shape(
+        num_times, (start_time / 60000, end_time / 60000), None, 1, 8)
+
+
+def _inspect_uv(f, file_size):
+    """Inspects a .uv file. See :obj:`inspect_header`."""
+    head = read_string(f, 0, gap=1)
+    if head == '131':
+        data_start = 0x1000
+    elif head == '31':
+        data_start = 0x200
+    else:
+        return None
+
+    f.seek(0x116)
+    num_times = struct.unpack('>I', f.read(4))[0]
+    f.seek(data_start + 0x8)
+    start_wlen, end_wlen, delta_wlen = \
+        tuple(num // 20 for num in struct.unpack('<HHH', f.read(6)))
+    if delta_wlen == 0:
+        return None
+    num_wavelengths = np.arange(start_wlen, end_wlen + 1, delta_wlen).size
+
+    _, times = index_uv(f, data_start, num_times, file_size)
+    if not times.size:
+        return None
+    return _shape(
+        len(times), (times[0] / 60000, times[-1] / 60000),
+        (start_wlen, end_wlen), num_wavelengths, 8)
+
+
+def _inspect_ms(f, file_size):
+    """Inspects a .ms file. See :obj:`inspect_header`."""
+    head = struct.unpack('>I', f.read(4))[0]
+    if head == 0x01320000:
+        if read_string(f, 0x4, 1) == "MSD Spectral File":
+            f.seek(0x116)
+            num_times = struct.unpack('>I', f.read(4))[0]
+        else:
+            f.seek(0x142)
+            num_times = struct.unpack('<H', f.read(2))[0]
+        f.seek(0x10A)
+        offset = struct.unpack('>H', f.read(2))[0] * 2 - 2
+    else:
+        # Partial files store neither the count nor the data start offset.
+        # See parse_ms_partial.
+        f.seek(0x10A)
+        if struct.unpack('>H', f.read(2))[0] != 0:
+            return None
+        num_times = 0
+        offset = 0x2F2
+
+    # Each segment starts with its length in 2-byte words and its time. The
+    # pair count follows, and the pairs are sorted by descending m/z.
+    times = []
+    min_mz = max_mz = None
+    while (num_times == 0 or len(times) < num_times) \
+            and offset + 18 <= file_size:
+        f.seek(offset)
+        seg_words, time = struct.unpack('>HI', f.read(6))
+        f.seek(offset + 12)
+        pair_count = struct.unpack('>H', f.read(2))[0]
+        seg_len = seg_words * 2
+        if seg_len == 0 or offset + seg_len > file_size:
+            break
+        if pair_count > 0:
+            f.seek(offset + 18)
+            high = struct.unpack('>H', f.read(2))[0]
+            f.seek(offset + 18 + 4 * (pair_count - 1))
+            low = struct.unpack('>H', f.read(2))[0]
+            max_mz = high if max_mz is None else max(max_mz, high)
+            min_mz = low if min_mz is None else min(min_mz, low)
+        times.append(time)
+        offset += seg_len
+    if not times:
+        return None
+
+    if min_mz is None:
+        ylabel_range = None
+        num_ylabels = 0
+    else:
+        ylabel_range = (min_mz / 20, max_mz / 20)
+        num_ylabels = int(round(max_mz / 20) - round(min_mz / 20)) + 1
+    return _shape(
+        len(times), (times[0] / 60000, times[-1] / 60000), ylabel_range,
+        num_ylabels, 4)
+
+
+def map_file(f):
+    """
+    Maps the contents of a file into memory read-only.
+
+    The decoders read the file through the mapping, so the pages already \
+        in the page cache are not copied into a new bytes object. Files \
+        that cannot be mapped, like empty files or in-memory streams, are \
+        read instead.
+
+    The mapping keeps the file open (and locked on Windows) until it is \
+        closed, so callers use it as a context manager, \
+        :code:`with map_file(f) as buf:`, and copy out what they keep. \
+        Closing it raises BufferError while an array view of it is alive.
+
+    Args:
+        f (_io.BufferedReader): File opened in 'rb' mode.
+
+    Returns:
+        Read-only bytes-like object with the contents of the file: an mmap, \
+            or a memoryview of the bytes read.
+
+    """
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        f.seek(0)
+        return memoryview(f.read())
+
+
 """
 .ch PARSING METHODS
 
@@ -137,37 +618,15 @@ def parse_ch_fid(path, head):
         DataFile with FID data, if the file can be parsed. Otherwise, None.
 
     """
-    if head == '181':
-        data_offsets = {
-            'num_times': 0x116,
-            'scaling_factor': 0x127C,
-            'data_start': 0x1800
-        }
-        metadata_offsets = {
-            'notebook': 0x35A,
-            'date': 0x957,
-            'method': 0xA0E,
-            'instrument': 0xC11,
-            'unit': 0x104C,
-        }
-        gap = 2
-    elif head == '179':
-        data_offsets = {
-            'num_times': 0x116,
-            'scaling_factor': 0x127C,
-            'data_start': 0x1800
-        }
-        metadata_offsets = {
-            'notebook': 0x35A,
-            'date': 0x957,
-            'method': 0xA0E,
-            'instrument': 0xC11,
-            'unit': 0x104C,
-            'signal': 0x1075
-        }
+    data_offsets = {
+        'num_times': 0x116,
+        'scaling_factor': 0x127C,
+        'data_start': 0x1800
+    }
+    metadata_offsets = _CH_METADATA_OFFSETS[head]
 
     f = open(path, 'rb')
-    raw_bytes = f.read()
+    f.seek(0, os.SEEK_END)
     file_size = f.tell()
 
     # Extract the number of retention times.
@@ -184,8 +643,10 @@ def parse_ch_fid(path, head):
     if head == '181':
         data = np.array(decode_double_delta(f, data_offsets['data_start']), dtype=np.float64)
     else:
-        data = np.ndarray(num_times, '<d', raw_bytes, data_offsets['data_start'], 8)
-    data = data.copy().reshape(-1, 1)
+        with map_file(f) as raw_bytes:
+            data = np.ndarray(num_times, '<d', raw_bytes, data_offsets['data_start'], 8)
+            data = data.copy()
+    data = data.reshape(-1, 1)
 
     # Convert times into minutes.
     times /= 60000
@@ -228,14 +689,6 @@ def parse_ch_other(path, head):
             'scaling_factor': 0x127C,
             'data_start': 0x1800
         }
-        metadata_offsets = {
-            'notebook': 0x35A,
-            'date': 0x957,
-            'method': 0xA0E,
-            'instrument': 0xC11,
-            'unit': 0x104C,
-            'signal': 0x1075
-        }
         gap = 2
     elif head == '30':
         data_offsets = {
@@ -243,17 +696,10 @@ def parse_ch_other(path, head):
             'scaling_factor': 0x284,
             'data_start': 0x400
         }
-        metadata_offsets = {
-            'notebook': 0x18,
-            'date': 0xB2,
-            'method': 0xE4,
-            'instrument': 0xDA,
-            'unit': 0x244,
-            'signal': 0x254
-        }
         gap = 1
     else:
         return None
+    metadata_offsets = _CH_METADATA_OFFSETS[head]
 
     f = open(path, 'rb')
     byte_unpack = struct.Struct('>B').unpack
@@ -289,25 +735,65 @@ def parse_ch_other(path, head):
     f.close()
 
     # Determine the detector and ylabels using metadata. 
+    detector, ylabel = ch_signal_info(metadata['signal'])
+    ylabels = np.array([ylabel])
+
+    return DataFile(path, detector, times, ylabels, data, metadata)
+
+
+def ch_signal_info(signal):
+    """
+    Determines the detector and ylabel of a .ch channel from its signal name.
+
+    Args:
+        signal (str): Signal metadata string from the .ch header.
+
+    Returns:
+        Tuple of the detector (None for miscellaneous analog data) and \
+            the string ylabel.
+
+    """
     detector = None
     ylabel = ''
-    signal = metadata['signal']
     if '=' in signal:
         ylabel = signal.split('=')[1].split(',')[0]
         detector = 'UV'
     elif 'ADC' in signal:
         detector = 'ELSD' if 'CHANNEL' in signal else 'CAD'
-    ylabels = np.array([ylabel])
-
-    return DataFile(path, detector, times, ylabels, data, metadata)
+    return detector, ylabel
 
 def decode_delta(f, offset):
-    # Use the compiled accelerator if it was built (mirrors the loop below).
-    if _chdelta_fast is not None:
-        f.seek(0)
-        buf = f.read()
-        return _chdelta_fast.decode_delta(buf, offset)
+    """Decode the delta-encoded signal of an Agilent .ch file.
+
+    The signal is a sequence of segments, each a 0x10 byte and a sample \
+    count followed by that many samples. Each sample is a 16-bit delta \
+    against a running accumulator, unless it is ``-0x8000``, which signals \
+    that the next 32-bit integer is a new absolute value.
+
+    The compiled accelerator (:mod:`rainbow.agilent._chdelta`) is used if it \
+    was built. Otherwise the NumPy decoder is used, which produces \
+    identical values. See :obj:`parse_ch_other`.
+
+    Args:
+        f (_io.BufferedReader): File opened in 'rb' mode.
+        offset (int): Offset of the first segment.
 
+    Returns:
+        Sequence of the decoded integer values.
+
+    """
+    with map_file(f) as buf:
+        if _chdelta_fast is not None:
+            return _chdelta_fast.decode_delta(buf, offset)
+        return _decode_delta_numpy(buf, offset)
+
+
+def _decode_delta_loop(f, offset):
+    """
+    Reference implementation of :obj:`decode_delta` that decodes one value \
+        at a time. Used to test the faster decoders.
+
+    """
     byte_unpack = struct.Struct('>B').unpack
     short_unpack = struct.Struct('>h').unpack
     int_unpack = struct.Struct('>i').unpack
@@ -336,26 +822,304 @@ def decode_delta(f, offset):
 
     return absorbances
 
+
+def _decode_delta_numpy(buf, offset):
+    """
+    Decodes a .ch delta stream with NumPy. See :obj:`decode_delta`.
+
+    Every field of the stream is 2-byte aligned, so it is read as an array \
+        of 16-bit words. Only the segment headers and the ``-0x8000`` \
+        escapes are visited one at a time (see :obj:`_mark_samples`); the \
+        accumulator is rebuilt with a cumulative sum (see \
+        :obj:`_accumulate_deltas`). A stream that ends mid-record returns \
+        the values decoded so far, like the compiled accelerator.
+
+    """
+    return _decode_delta_segments(buf, offset)[0]
+
+
+def _decode_delta_segments(buf, offset, initial=0, complete=False):
+    """
+    Decodes the segments of a .ch delta stream with NumPy. See \
+        :obj:`_decode_delta_numpy`.
+
+    Args:
+        buf (bytes): Buffer holding the stream.
+        offset (int): Offset of the first segment.
+        initial (int, optional): Accumulator value before the first segment.
+        complete (bool, optional): Flag for dropping the samples of a \
+            segment that the buffer cuts off.
+
+    Returns:
+        Tuple of an int64 array of the decoded values and the offset after \
+            the last segment read.
+
+    """
+    num_words = max(len(buf) - offset, 0) // 2
+    words = np.ndarray(num_words, '>i2', buf, offset)
+    escapes = np.flatnonzero(words == -0x8000).tolist()
+    kinds = np.zeros(num_words, dtype=np.int8)
+    absolutes = []
+    pos = 0
+    while pos < num_words:
+        # The segment header is the byte 0x10 followed by the sample count.
+        header = int(words[pos]) & 0xFFFF
+        if header >> 8 != 0x10:
+            break
+        next_pos = _mark_samples(
+            kinds, escapes, pos + 1, header & 0xFF, absolutes)
+        if next_pos < 0:
+            if complete:
+                kinds[pos:] = 0
+                del absolutes[bisect_left(absolutes, pos):]
+            else:
+                pos = num_words
+            break
+        pos = next_pos
+    values = _accumulate_deltas(words, kinds, absolutes, '>i4', initial=initial)
+    return values, offset + 2 * pos
+
+
+def _mark_samples(kinds, escapes, pos, count, absolutes):
+    """
+    Marks the words holding ``count`` delta samples that start at word \
+        ``pos``.
+
+    The words are marked 1, and the index of each escape is appended to \
+        ``absolutes`` (see :obj:`_find_samples`). The two words after each \
+        escape (its absolute value) are unmarked later by \
+        :obj:`_accumulate_deltas`.
+
+    Args:
+        kinds (np.ndarray): int8 array with one entry per word.
+        escapes (list): Sorted indices of the words equal to ``-0x8000``. \
+            Some may be inside absolute values, and are skipped.
+        pos (int): Index of the word holding the first sample.
+        count (int): Number of samples.
+        absolutes (list): List to append the escape indices to.
+
+    Returns:
+        Index of the word after the last sample, or -1 if the words end \
+            first. In that case, the complete samples are still marked.
+
+    """
+    end, complete = _find_samples(escapes, pos, count, kinds.size, absolutes)
+    kinds[pos:end] = 1
+    return end if complete else -1
+
+
+def _find_samples(escapes, pos, count, num_words, absolutes):
+    """
+    Finds the words holding ``count`` delta samples that start at word \
+        ``pos``.
+
+    Only the escapes are visited one at a time: each escape and its \
+        absolute value take three words instead of one. The index of each \
+        escape is appended to ``absolutes``.
+
+    Args:
+        escapes (list): Sorted indices of the words equal to ``-0x8000``. \
+            Some may be inside absolute values, and are skipped.
+        pos (int): Index of the word holding the first sample.
+        count (int): Number of samples.
+        num_words (int): Number of words in the stream.
+        absolutes (list): List to append the escape indices to.
+
+    Returns:
+        Tuple of the index of the word after the last complete sample and \
+            whether all ``count`` samples are complete.
+
+    """
+    num_escapes = len(escapes)
+    end = pos + count
+    i = bisect_left(escapes, pos)
+    while i < num_escapes and escapes[i] < end:
+        escape = escapes[i]
+        if escape + 3 > num_words:
+            return escape, False
+        absolutes.append(escape)
+        # The escape and its absolute value count as one sample.
+        end += 2
+        i += 1
+        while i < num_escapes and escapes[i] <= escape + 2:
+            i += 1
+    return min(end, num_words), end <= num_words
+
+
+def count_delta(f, offset):
+    """
+    Counts the values of the delta-encoded signal of an Agilent .ch file \
+        without decoding them.
+
+    The segment headers and escapes are walked like in \
+        :obj:`decode_delta`, but no value is accumulated or stored.
+
+    Args:
+        f (_io.BufferedReader): File opened in 'rb' mode.
+        offset (int): Offset of the first segment.
+
+    Returns:
+        Number of values :obj:`decode_delta` returns.
+
+    """
+    with map_file(f) as buf:
+        num_words = max(len(buf) - offset, 0) // 2
+        words = np.ndarray(num_words, '>u2', buf, offset)
+        escapes = np.flatnonzero(words == 0x8000).tolist()
+        absolutes = []
+        num_samples = 0
+        pos = 0
+        while pos < num_words:
+            # The segment header is the byte 0x10 followed by the sample
+            # count.
+            header = int(words[pos])
+            if header >> 8 != 0x10:
+                break
+            end, complete = _find_samples(
+                escapes, pos + 1, header & 0xFF, num_words, absolutes)
+            num_samples += end - pos - 1
+            if not complete:
+                break
+            pos = end
+        del words
+    return num_samples - 2 * len(absolutes)
+
+
+def _accumulate_deltas(words, kinds, absolutes, int_dtype, row_length=None,
+                       initial=0):
+    """
+    Rebuilds the running accumulator of a delta stream marked by \
+        :obj:`_mark_samples`.
+
+    Each value is the last absolute value (or zero at the start of the \
+        stream and of each row) plus the deltas since, which is computed \
+        with one cumulative sum instead of one addition per value.
+
+    Args:
+        words (np.ndarray): int16 words of the stream.
+        kinds (np.ndarray): int8 array marked by :obj:`_mark_samples`.
+        absolutes (list): Escape indices collected by \
+            :obj:`_mark_samples`.
+        int_dtype (str): Dtype of the absolute values, e.g. '>i4'.
+        row_length (int, optional): Number of values after which the \
+            accumulator restarts at zero.
+        initial (int, optional): Accumulator value before the first value, \
+            when there are no rows.
+
+    Returns:
+        int64 array of the decoded values.
+
+    """
+    absolutes = np.array(absolutes, dtype=np.int64)
+    kinds[absolutes + 1] = 0
+    kinds[absolutes + 2] = 0
+    kinds[absolutes] = 2
+    positions = np.flatnonzero(kinds)
+    is_absolute = kinds[positions] == 2
+    increments = words[positions].astype(np.int64)
+    increments[is_absolute] = 0
+
+    # The absolute values span the two words after each escape.
+    absolute_pos = positions[is_absolute] + 1
+    raw = np.empty((absolute_pos.size, 2), dtype=words.dtype)
+    raw[:, 0] = words[absolute_pos]
+    raw[:, 1] = words[absolute_pos + 1]
+    absolutes = raw.view(int_dtype).reshape(-1)
+
+    restarts = is_absolute.copy()
+    if row_length:
+        restarts[::row_length] = True
+    elif restarts.size:
+        restarts[0] = True
+    starts = increments.copy()
+    starts[is_absolute] = absolutes
+    if initial and starts.size and not row_length and not is_absolute[0]:
+        starts[0] += initial
+
+    totals = np.cumsum(increments)
+    last = np.maximum.accumulate(
+        np.where(restarts, np.arange(restarts.size), 0))
+    return starts[last] + totals - totals[last]
+
+
+def count_double_delta(f, offset):
+    """
+    Counts the values of the double-delta encoded signal of an Agilent FID \
+        .ch file without decoding them.
+
+    Every value is one 16-bit word, except the ``0x7FFF`` sentinel and its \
+        6-byte absolute value, so only the sentinels are visited one at a \
+        time. A sentinel cut off by the end of the file is not counted, \
+        like in the compiled accelerator.
+
+    Args:
+        f (_io.BufferedReader): File opened in 'rb' mode.
+        offset (int): Offset of the first value.
+
+    Returns:
+        Number of values :obj:`decode_double_delta` returns.
+
+    """
+    with map_file(f) as buf:
+        num_words = max(len(buf) - offset, 0) // 2
+        sentinels = np.flatnonzero(
+            np.ndarray(num_words, '>i2', buf, offset) == 0x7FFF).tolist()
+    num_absolutes = 0
+    next_word = 0
+    for sentinel in sentinels:
+        # Sentinels inside an absolute value are data.
+        if sentinel < next_word:
+            continue
+        if sentinel + 4 > num_words:
+            return sentinel - 3 * num_absolutes
+        num_absolutes += 1
+        next_word = sentinel + 4
+    return num_words - 3 * num_absolutes
+
+
 def decode_double_delta(f, offset):
-    byte_unpack = struct.Struct('>B').unpack
-    short_unpack = struct.Struct('>h').unpack
-    int_unpack = struct.Struct('>i').unpack
-    f.seek(0, 2)
-    file_size = f.tell()
-    f.seek(offset)
-    signals = []
-    count = 1
-    buffer = [0, 0, 0]
-
-    while f.tell() < file_size:
-        buffer[2] = short_unpack(f.read(2))[0]
-        if buffer[2] == 0x7fff:
-            buffer[0] = short_unpack(f.read(2))[0] << 32 | int_unpack(f.read(4))[0]
-            buffer[1] = 0
-        else:
-            buffer[1] += buffer[2]
-            buffer[0] += buffer[1]
-        signals.append(buffer[0])
+    """Decode the double-delta encoded signal of an Agilent FID .ch file.
+
+    Each value is stored as a 16-bit second difference that is added to a \
+    running first difference, which is added to the running value. The \
+    sentinel ``0x7FFF`` instead signals that the next 6 bytes hold a new \
+    absolute value, and resets the first difference.
+
+    If the compiled accelerator (:mod:`rainbow.agilent._chdoubledelta`) was \
+    built it is used; otherwise this falls back to the pure-Python loop \
+    below, which produces identical values. See :obj:`parse_ch_fid`.
+
+    Args:
+        f (_io.BufferedReader): File opened in 'rb' mode.
+        offset (int): Offset of the first value.
+
+    Returns:
+        Sequence of the decoded integer values.
+
+    """
+    with map_file(f) as buf:
+        if _chdoubledelta_fast is not None:
+            return _chdoubledelta_fast.decode_double_delta(buf, offset)
+
+        short_unpack = struct.Struct('>h').unpack_from
+        long_unpack = struct.Struct('>hi').unpack_from
+        file_size = len(buf)
+        pos = offset
+        signals = []
+        value = 0
+        delta = 0
+        while pos < file_size:
+            second = short_unpack(buf, pos)[0]
+            pos += 2
+            if second == 0x7fff:
+                high, low = long_unpack(buf, pos)
+                pos += 6
+                value = high << 32 | low
+                delta = 0
+            else:
+                delta += second
+                value += delta
+            signals.append(value)
 
     return signals
 
@@ -365,7 +1129,121 @@ def decode_double_delta(f, offset):
 """
 
 
-def decode_uv_delta(f, data_offsets, num_times, num_wavelengths):
+def index_uv(f, data_start, num_times, file_size):
+    """
+    Builds an index of the data segments of an Agilent .uv file.
+
+    Each segment starts with a 2-byte pad, its length in bytes, and its \
+        time, so only the segment headers are read. Each segment also \
+        restarts the delta accumulator at zero, so a segment can be decoded \
+        on its own from its offset.
+
+    Args:
+        f (_io.BufferedReader): File opened in 'rb' mode.
+        data_start (int): Offset of the first segment.
+        num_times (int): Number of retention times. Partial files store \
+            none, so 0 follows the segments to the end of the file.
+        file_size (int): Size of the file in bytes.
+
+    Returns:
+        Tuple of an int64 array with the offset of each complete segment \
+            and a uint32 array with its raw time.
+
+    """
+    header_unpack = struct.Struct('<HI').unpack_from
+    offsets = []
+    times = []
+    offset = data_start
+    with map_file(f) as buf:
+        file_size = min(file_size, len(buf))
+        while (num_times == 0 or len(times) < num_times) \
+                and offset + 22 <= file_size:
+            seg_len, time = header_unpack(buf, offset + 2)
+            if seg_len == 0 or offset + seg_len > file_size:
+                break
+            offsets.append(offset)
+            times.append(time)
+            offset += seg_len
+    return np.array(offsets, dtype=np.int64), np.array(times, dtype=np.uint32)
+
+
+def uv_window(f, data_start, num_times, rt_range):
+    """
+    Finds the data segments of an Agilent .uv file whose retention times \
+        are inside a window. See :obj:`index_uv`.
+
+    Args:
+        f (_io.BufferedReader): File opened in 'rb' mode.
+        data_start (int): Offset of the first segment.
+        num_times (int): Number of retention times, or 0 for partial files.
+        rt_range (tuple): Start and end of the window in minutes, inclusive.
+
+    Returns:
+        Tuple of the offset of the first segment inside the window and the \
+            number of segments inside it.
+
+    """
+    file_size = os.fstat(f.fileno()).st_size
+    offsets, times = index_uv(f, data_start, num_times, file_size)
+    minutes = times / 60000
+    first = int(np.searchsorted(minutes, rt_range[0], 'left'))
+    last = int(np.searchsorted(minutes, rt_range[1], 'right'))
+    if first >= last:
+        return data_start, 0
+    return int(offsets[first]), last - first
+
+
+def uv_columns(all_wavelengths, wavelengths):
+    """
+    Finds the columns of an Agilent .uv file that hold the requested \
+        wavelengths.
+
+    The decoders store the columns in file order, so the order of the \
+        request is returned separately. Requested wavelengths that the \
+        file does not have are skipped with a warning, and repeated ones \
+        are kept once.
+
+    Args:
+        all_wavelengths (np.ndarray): Wavelengths of the file.
+        wavelengths (list): Wavelengths to keep, or None for all of them.
+
+    Returns:
+        Tuple of a sorted int64 array of column indices (None to keep every \
+            column) and an array that puts the decoded columns in the \
+            requested order (None if they already are).
+
+    Raises:
+        ValueError: If the file has none of the requested wavelengths.
+
+    """
+    if wavelengths is None:
+        return None, None
+    index = {wavelength: i for i, wavelength
+             in enumerate(all_wavelengths.tolist())}
+    requested = []
+    missing = []
+    for wavelength in wavelengths:
+        i = index.get(wavelength)
+        if i is None:
+            missing.append(wavelength)
+        elif i not in requested:
+            requested.append(i)
+    if not requested:
+        raise ValueError(
+            f"None of the wavelengths {list(wavelengths)} are in the file. "
+            f"Its wavelengths are {all_wavelengths.tolist()}.")
+    if missing:
+        warnings.warn(
+            f"Wavelengths {missing} are not in the file and are skipped.")
+    columns = np.array(sorted(requested), dtype=np.int64)
+    order = np.searchsorted(columns, requested)
+    if (np.diff(order) > 0).all():
+        order = None
+    return columns, order
+
+
+def decode_uv_delta(f, data_offsets, num_times, num_wavelengths,
+                    columns=None):
     """Decode the delta-encoded absorbances of an Agilent .uv file.
 
     Each retention time holds ``num_wavelengths`` absorbances stored as 16-bit
@@ -373,27 +1251,71 @@ def decode_uv_delta(f, data_offsets, num_times, num_wavelengths):
     signals that the next 32-bit integer is a new absolute value.
 
     If the compiled accelerator (:mod:`rainbow.agilent._uvdelta`) was built it is
-    used for the inner loop; otherwise this falls back to the pure-Python loop
-    below, which produces identical output. See :obj:`parse_uv`.
+    used for the inner loop; otherwise this falls back to a NumPy decoder, which
+    produces identical output. See :obj:`parse_uv`.
+
+    Every sample is walked, since the accumulator runs across the whole
+    row, but only the ``columns`` selected are stored.
 
     Args:
         f (_io.BufferedReader): File opened in 'rb' mode.
         data_offsets (dict): Offsets for this file format.
         num_times (int): Number of retention times.
         num_wavelengths (int): Number of wavelengths per time.
+        columns (np.ndarray, optional): Sorted indices of the wavelengths
+            to keep. None keeps all of them.
 
     Returns:
         Tuple of ``(times, data)``: a uint32 array of raw times and an
-        ``(num_times, num_wavelengths)`` int64 array of absorbances.
+        ``(num_times, num_columns)`` int64 array of absorbances.
 
     """
-    # Use the compiled accelerator if it was built (mirrors the loop below).
-    if _uvdelta_fast is not None:
-        f.seek(0)
-        buf = f.read()
-        return _uvdelta_fast.decode_uv_delta(
-            buf, data_offsets["data_start"], num_times, num_wavelengths)
+    with map_file(f) as buf:
+        if _uvdelta_fast is not None:
+            return _uvdelta_fast.decode_uv_delta(
+                buf, data_offsets["data_start"], num_times, num_wavelengths,
+                columns)
+        return _decode_uv_delta_numpy(
+            buf, data_offsets["data_start"], num_times, num_wavelengths,
+            columns)
+
+
+def decode_uv_delta_stream(f, data_offsets, num_wavelengths, columns=None):
+    """
+    Decodes the delta-encoded absorbances of a partial Agilent .uv file.
+
+    Partial files do not store the number of retention times, so every \
+        complete segment up to the end of the file is decoded. A segment \
+        cut off by the end of the file is dropped. See \
+        :obj:`decode_uv_delta`.
+
+    Args:
+        f (_io.BufferedReader): File opened in 'rb' mode.
+        data_offsets (dict): Offsets for this file format.
+        num_wavelengths (int): Number of wavelengths per time.
+        columns (np.ndarray, optional): Sorted indices of the wavelengths \
+            to keep. None keeps all of them.
+
+    Returns:
+        Tuple of a uint32 array of raw times and a 2D int64 array of \
+            absorbances.
+
+    """
+    with map_file(f) as buf:
+        if _uvdelta_fast is not None:
+            return _uvdelta_fast.decode_uv_delta_stream(
+                buf, data_offsets['data_start'], num_wavelengths, columns)
+        return _decode_uv_delta_numpy(
+            buf, data_offsets['data_start'], None, num_wavelengths, columns)
+
+
+def _decode_uv_delta_loop(f, data_offsets, num_times, num_wavelengths,
+                          columns=None):
+    """
+    Reference implementation of :obj:`decode_uv_delta` that decodes one \
+        value at a time. Used to test the faster decoders.
 
+    """
     uint_unpack = struct.Struct('<I').unpack
     int_unpack = struct.Struct('<i').unpack
     short_unpack = struct.Struct('<h').unpack
@@ -417,10 +1339,81 @@ def decode_uv_delta(f, data_offsets, num_times, num_wavelengths):
                 absorb_accum += check_int
             data[i, j] = absorb_accum
 
+    if columns is not None:
+        data = data[:, columns]
     return times, data
 
 
-def decode_uv_array(f, data_offsets, num_times, num_wavelengths):
+def _decode_uv_delta_numpy(buf, data_start, num_times, num_wavelengths,
+                           columns=None):
+    """
+    Decodes a .uv delta stream with NumPy. See :obj:`decode_uv_delta`.
+
+    Each retention time is an 11-word header followed by its samples, so \
+        the stream is read as 16-bit words like in \
+        :obj:`_decode_delta_numpy`. Only the headers and escapes are visited \
+        one at a time. The accumulator restarts at every retention time, so \
+        it is rebuilt in blocks of rows, and only the selected columns of \
+        each block are kept.
+
+    With :obj:`num_times` set to None, the complete rows up to the end of \
+        the buffer are decoded, as for partial files.
+
+    Raises:
+        ValueError: If the stream ends before :obj:`num_times` rows, like \
+            the compiled accelerator.
+
+    """
+    num_words = max(len(buf) - data_start, 0) // 2
+    words = np.ndarray(num_words, '<i2', buf, data_start)
+    escapes = np.flatnonzero(words == -0x8000).tolist()
+    kinds = np.zeros(num_words, dtype=np.int8)
+    absolutes = []
+    row_starts = []
+    pos = 0
+    while num_times is None or len(row_starts) < num_times:
+        next_pos = -1
+        if pos + 11 <= num_words:
+            next_pos = _mark_samples(
+                kinds, escapes, pos + 11, num_wavelengths, absolutes)
+        if next_pos < 0:
+            if num_times is None:
+                break
+            raise ValueError("truncated Agilent .uv delta stream")
+        row_starts.append(pos)
+        pos = next_pos
+    num_times = len(row_starts)
+    row_starts.append(pos)
+
+    # The time is the little-endian uint32 4 bytes into each header.
+    header_starts = np.array(row_starts[:-1], dtype=np.int64)
+    raw_times = np.empty((num_times, 2), dtype=words.dtype)
+    raw_times[:, 0] = words[header_starts + 2]
+    raw_times[:, 1] = words[header_starts + 3]
+    times = raw_times.view('<u4').reshape(-1).astype(np.uint32)
+
+    if columns is None:
+        columns = slice(None)
+        num_columns = num_wavelengths
+    else:
+        num_columns = len(columns)
+    data = np.empty((num_times, num_columns), dtype=np.int64)
+    block_rows = max(1, _UV_BLOCK_VALUES // max(num_wavelengths, 1))
+    for first in range(0, num_times, block_rows):
+        last = min(first + block_rows, num_times)
+        start, stop = row_starts[first], row_starts[last]
+        block_absolutes = absolutes[
+            bisect_left(absolutes, start):bisect_left(absolutes, stop)]
+        values = _accumulate_deltas(
+            words[start:stop], kinds[start:stop],
+            [escape - start for escape in block_absolutes], '<i4',
+            num_wavelengths)
+        data[first:last] = values.reshape(-1, num_wavelengths)[:, columns]
+    return times, data
+
+
+def decode_uv_array(f, data_offsets, num_times, num_wavelengths,
+                    columns=None):
     """Decode the absorbances of an Agilent .uv file stored as raw doubles.
 
     Used by the ``OL`` format variant, where each absorbance is a little-endian
@@ -431,40 +1424,54 @@ def decode_uv_array(f, data_offsets, num_times, num_wavelengths):
         data_offsets (dict): Offsets for this file format.
         num_times (int): Number of retention times.
         num_wavelengths (int): Number of wavelengths per time.
+        columns (np.ndarray, optional): Sorted indices of the wavelengths
+            to keep. None keeps all of them.
 
     Returns:
         Tuple of ``(times, data)``: a uint32 array of raw times and an
-        ``(num_times, num_wavelengths)`` float64 array of absorbances.
+        ``(num_times, num_columns)`` float64 array of absorbances.
 
     """
     # Each segment is a 22-byte header (4 pad, 4 little-endian uint32 time,
     # 14 pad) followed by ``num_wavelengths`` little-endian float64 values.
-    # The doubles are not delta-encoded, so the whole block can be read at
-    # once with strided views instead of looping value-by-value.
+    # The doubles are not delta-encoded, so the whole block is gathered at
+    # once from strided views of the mapped file instead of value-by-value.
+    # Each array is copied out of the mapping exactly once.
     segment_size = 22 + num_wavelengths * 8
-
-    f.seek(data_offsets["data_start"])
-    raw = f.read(segment_size * num_times)
-
-    times = np.ndarray(
-        num_times, '<u4', raw, 4, (segment_size,)).astype(np.uint32)
-    data = np.ndarray(
-        (num_times, num_wavelengths), '<f8', raw, 22,
-        (segment_size, 8)).astype(np.float64)
+    data_start = data_offsets["data_start"]
+
+    with map_file(f) as raw:
+        times = np.ndarray(
+            num_times, '<u4', raw, data_start + 4, (segment_size,))
+        times = times.astype(np.uint32)
+        data = np.ndarray(
+            (num_times, num_wavelengths), '<f8', raw, data_start + 22,
+            (segment_size, 8))
+        if columns is not None:
+            data = data[:, columns]
+        data = data.astype(np.float64, copy=columns is None)
 
     return times, data
 
 
-def parse_uv(path):
+def parse_uv(path, rt_range=None, wavelengths=None):
     """
     Parses an Agilent .uv file.
 
     These files contain UV spectra. 
 
+    With :obj:`rt_range` set, only the segments inside the window are \
+        decoded (see :obj:`uv_window`). With :obj:`wavelengths` set, only \
+        those wavelengths are stored, in the order given (see \
+        :obj:`uv_columns`).
+
     Learn more about this file format :ref:`here <uv>`.
 
     Args:
         path (str): Path to the Agilent .uv file. 
+        rt_range (tuple, optional): Start and end retention times in \
+            minutes of the scans to decode.
+        wavelengths (list, optional): Wavelengths to keep.
     
     Returns:
         DataFile with UV data, if the file can be parsed. Otherwise, None.
@@ -485,14 +1492,7 @@ def parse_uv(path):
             'scaling_factor': 0xC0D,
             'data_start': 0x1000
         }
-        metadata_offsets = {
-            "notebook": 0x35A,
-            "date": 0x957,
-            "method": 0xA0E,
-            "unit": 0xC15,
-            "signal": 0xC40,
-            "vialpos": 0xFD7
-        }
+        metadata_offsets = _UV_METADATA_OFFSETS[head]
         file_type = read_string(f, 347, gap=2)
         if file_type.startswith('LC'):
             decode = decode_uv_delta
@@ -507,12 +1507,7 @@ def parse_uv(path):
             'scaling_factor': 0x13E,
             'data_start': 0x200
         }
-        metadata_offsets = {
-            "notebook": 0x18,
-            "date": 0xB2,
-            "method": 0xE4,
-            "unit": 0x146
-        }
+        metadata_offsets = _UV_METADATA_OFFSETS[head]
         decode = decode_uv_delta
         gap = 1
     else:
@@ -525,36 +1520,51 @@ def parse_uv(path):
     # If there are none, the file may be a partial. 
     if num_times == 0:
         f.close()
-        return parse_uv_partial(path)
+        return parse_uv_partial(path, rt_range, wavelengths)
 
     # Compute the wavelengths by taking the range from 
     #     the header of the first data segment
     f.seek(data_offsets["data_start"] + 0x8)
     start_wlen, end_wlen, delta_wlen = \
         tuple(num // 20 for num in struct.unpack("<HHH", f.read(6)))
-    wavelengths = np.arange(start_wlen, end_wlen + 1, delta_wlen)
-    num_wavelengths = wavelengths.size
+    all_wavelengths = np.arange(start_wlen, end_wlen + 1, delta_wlen)
+    num_wavelengths = all_wavelengths.size
+    columns, order = uv_columns(all_wavelengths, wavelengths)
+    if columns is not None:
+        all_wavelengths = all_wavelengths[columns]
+
+    # Skip to the segments inside the window, if requested.
+    if rt_range is not None:
+        window_start, num_times = uv_window(
+            f, data_offsets['data_start'], num_times, rt_range)
+        data_offsets = dict(data_offsets, data_start=window_start)
 
     # Extract the retention times and absorbances from each data segment.
-    times, data = decode(f, data_offsets, num_times, num_wavelengths)
+    times, data = decode(f, data_offsets, num_times, num_wavelengths, columns)
 
     # Covert times to minutes. 
     times = times / 60000
 
-    # Scale the absorbances.
+    # Scale the absorbances. The doubles of OL files are scaled in place.
     f.seek(data_offsets['scaling_factor'])
     scaling_factor = struct.unpack('>d', f.read(8))[0]
-    data = data * scaling_factor
+    if data.dtype == np.float64:
+        data *= scaling_factor
+    else:
+        data = data * scaling_factor
+    if order is not None:
+        all_wavelengths = all_wavelengths[order]
+        data = data[:, order]
 
     # Read file metadata.
 
     metadata = read_header(f, metadata_offsets, gap=gap)
     f.close()
 
-    return DataFile(path, 'UV', times, wavelengths, data, metadata)
+    return DataFile(path, 'UV', times, all_wavelengths, data, metadata)
 
 
-def parse_uv_partial(path):
+def parse_uv_partial(path, rt_range=None, wavelengths=None):
     """
     Parses a partial Agilent .uv file. 
 
@@ -562,6 +1572,9 @@ def parse_uv_partial(path):
 
     Args:
         path (str): Path to the partial .uv file. 
+        rt_range (tuple, optional): Start and end retention times in \
+            minutes of the scans to decode.
+        wavelengths (list, optional): Wavelengths to keep.
     
     Returns:
         DataFile with UV data, if the file can be parsed. Otherwise, None.
@@ -574,9 +1587,6 @@ def parse_uv_partial(path):
     }
 
     f = open(path, 'rb')
-    uint_unpack = struct.Struct('<I').unpack
-    int_unpack = struct.Struct('<i').unpack
-    short_unpack = struct.Struct('<h').unpack
 
     # Compute the wavelengths by taking the range from 
     #     the header of the first data segment.
@@ -585,64 +1595,41 @@ def parse_uv_partial(path):
     try:
         start_wlen, end_wlen, delta_wlen = \
             tuple(num // 20 for num in struct.unpack("<HHH", f.read(6)))
-        wavelengths = np.arange(start_wlen, end_wlen + 1, delta_wlen)
+        all_wavelengths = np.arange(start_wlen, end_wlen + 1, delta_wlen)
     except Exception:
         return None
+    num_wavelengths = all_wavelengths.size
+    columns, order = uv_columns(all_wavelengths, wavelengths)
+    if columns is not None:
+        all_wavelengths = all_wavelengths[columns]
 
     # Extract the retention times and absorbances from each data segment.
-    if _uvdelta_fast is not None:
-        # Compiled path: scan the variable-length stream to EOF.
-        f.seek(0)
-        buf = f.read()
-        times, data = _uvdelta_fast.decode_uv_delta_stream(
-            buf, data_offsets['data_start'], wavelengths.size)
-        times = times / 60000
+    # The window is found from the segment headers, so its segments are
+    # decoded like those of a complete file.
+    if rt_range is not None:
+        window_start, num_times = uv_window(
+            f, data_offsets['data_start'], 0, rt_range)
+        times, data = decode_uv_delta(
+            f, dict(data_offsets, data_start=window_start), num_times,
+            num_wavelengths, columns)
     else:
-        f.seek(data_offsets['data_start'])
-        times = []
-        absorbances = []
-        while True:
-            try:
-                f.read(4)
-                time = uint_unpack(f.read(4))[0]
-                times.append(time)
-                f.read(14)
-                # If the next short is equal to -0x8000
-                #     then the next absorbance value is the next integer.
-                # Otherwise, the short is a delta from the last absorbance value.
-                absorb_accum = 0
-                for _ in range(wavelengths.size):
-                    check_int = short_unpack(f.read(2))[0]
-                    if check_int == -0x8000:
-                        absorb_accum = int_unpack(f.read(4))[0]
-                    else:
-                        absorb_accum += check_int
-                    absorbances.append(absorb_accum)
-            except Exception:
-                break
-
-        # Process the extracted values.
-        times = np.array(times) / 60000
-        data = np.array(absorbances).reshape((times.size, wavelengths.size))
+        times, data = decode_uv_delta_stream(
+            f, data_offsets, num_wavelengths, columns)
+    times = times / 60000
 
     # Scale the absorbances. 
     f.seek(data_offsets['scaling_factor'])
     scaling_factor = struct.unpack('>d', f.read(8))[0]
     data = data * scaling_factor
+    if order is not None:
+        all_wavelengths = all_wavelengths[order]
+        data = data[:, order]
 
     # Read file metadata.
-    metadata_offsets = {
-        "notebook": 0x35A,
-        "date": 0x957,
-        "method": 0xA0E,
-        "unit": 0xC15,
-        "signal": 0xC40,
-        "vialpos": 0xFD7
-    }
-    metadata = read_header(f, metadata_offsets)
+    metadata = read_header(f, _UV_METADATA_OFFSETS['131'])
     f.close()
 
-    return DataFile(path, 'UV', times, wavelengths, data, metadata)
+    return DataFile(path, 'UV', times, all_wavelengths, data, metadata)
 
 
 """
@@ -651,7 +1638,81 @@ def parse_uv_partial(path):
 """
 
 
-def parse_ms(path, precision=0):
+def index_ms(buf, offset, num_times=None):
+    """
+    Finds the retention time and pair count of each scan record of an \
+        Agilent .ms file.
+
+    Each record is a 2-byte length, the 4-byte time, 6 bytes, the 2-byte \
+        pair count, 4 bytes, the 4-byte mz-intensity pairs, and a 10-byte \
+        trailer. The records are back to back, so only the header of each \
+        record is read to find the next one. Where a record starts depends \
+        on the pair counts of all records before it, so the headers are \
+        followed one at a time rather than located with array operations.
+
+    Args:
+        buf (bytes): Contents of the file.
+        offset (int): Offset of the first record.
+        num_times (int, optional): Number of records. None follows the \
+            records to the end of the buffer.
+
+    Returns:
+        Tuple of a uint32 array with the raw time of each record whose \
+            pairs are complete and an int64 array with its pair count.
+
+    """
+    header_unpack = struct.Struct('>2xI6xH').unpack_from
+    end = len(buf)
+    times = []
+    pair_counts = []
+    while (num_times is None or len(times) < num_times) \
+            and offset + 18 <= end:
+        time, pair_count = header_unpack(buf, offset)
+        if offset + 18 + 4 * pair_count > end:
+            break
+        times.append(time)
+        pair_counts.append(pair_count)
+        offset += 28 + 4 * pair_count
+    return np.array(times, dtype=np.uint32), \
+        np.array(pair_counts, dtype=np.int64)
+
+
+def ms_pairs(buf, offset, pair_counts):
+    """
+    Reads the mz-intensity pairs of the scan records of an Agilent .ms file.
+
+    The 28 bytes between the pairs of two records are a whole number of \
+        4-byte pairs, so the records are viewed in place as one array of \
+        big-endian uint32 slots. The 7 slots between records are masked \
+        out, which copies the pairs once, and the copy is split into its \
+        uint16 mz and intensity fields. See :obj:`index_ms`.
+
+    Args:
+        buf (bytes): Contents of the file.
+        offset (int): Offset of the first record.
+        pair_counts (np.ndarray): Pair count of each record.
+
+    Returns:
+        Tuple of two uint16 arrays with the encoded mz and intensity of \
+            every pair, in file order. Both are strided views of the copy.
+
+    """
+    num_times = pair_counts.size
+    total_paircount = int(pair_counts.sum())
+    if total_paircount == 0:
+        return np.empty(0, dtype=np.uint16), np.empty(0, dtype=np.uint16)
+    # The first pair is 18 bytes into the first record. Each later record
+    # adds the 7 slots of the trailer and header before it.
+    num_slots = total_paircount + 7 * (num_times - 1)
+    slots = np.ndarray(num_slots, '>u4', buf, offset + 18)
+    ends = np.cumsum(pair_counts[:-1]) + 7 * np.arange(num_times - 1)
+    is_pair = np.ones(num_slots, dtype=bool)
+    is_pair[(ends[:, None] + np.arange(7)).ravel()] = False
+    pairs = slots[is_pair].view('>u2').reshape(-1, 2).astype(np.uint16)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def parse_ms(path, precision=0, sparse=False):
     """
     Parses an Agilent .ms file.
 
@@ -662,6 +1723,8 @@ def parse_ms(path, precision=0):
     Args:
         path (str): Path to Agilent .ms file.
         precision (int, optional): Number of decimals to round mz values. 
+        sparse (bool, optional): Flag for returning a \
+            :class:`~rainbow.datafile.SparseDataFile`.
     
     Returns:
         DataFile with MS data, if the file can be parsed. Otherwise, None.
@@ -683,7 +1746,7 @@ def parse_ms(path, precision=0):
     head = int_unpack(f.read(4))[0]
     if head != 0x01320000:
         f.close()
-        return parse_ms_partial(path, precision)
+        return parse_ms_partial(path, precision, sparse)
 
     # Determine the type of .ms file based on header.
     # Read the number of retention times from different offsets by type.
@@ -697,56 +1760,40 @@ def parse_ms(path, precision=0):
 
     # Go to the data start offset.
     f.seek(data_offsets['data_start'])
-    f.seek(short_unpack(f.read(2))[0] * 2 - 2)
+    offset = short_unpack(f.read(2))[0] * 2 - 2
 
-    # Extract retention times and data pair counts for each time. 
-    # Store the bytes holding mz-intensity pairs.
-    times = np.empty(num_times, dtype=np.uint32)
-    pair_counts = np.zeros(num_times, dtype=np.uint16)
-    pair_bytearr = bytearray()
-    for i in range(num_times):
-        f.read(2)
-        times[i] = int_unpack(f.read(4))[0]
-        f.read(6)
-        pair_counts[i] = short_unpack(f.read(2))[0]
-        f.read(4)
-        pair_bytes = f.read(pair_counts[i] * 4)
-        pair_bytearr.extend(pair_bytes)
-        f.read(10)
-
-    # Minor processing on the extracted data.
-    raw_bytes = bytes(pair_bytearr)
+    # Find the retention time and pair count of each scan record with one
+    # pass over the file, then take the pairs straight from the file buffer.
+    with map_file(f) as buf:
+        times, pair_counts = index_ms(buf, offset, num_times)
+        mzs, int_encs = ms_pairs(buf, offset, pair_counts)
     times = times / 60000
-    total_paircount = np.sum(pair_counts)
 
     # Calculate the mz values. 
-    mzs = np.ndarray(total_paircount, '>H', raw_bytes, 0, 4)
     mzs = np.round(mzs / 20, precision)
 
     # Calculate the intensity values. 
-    int_encs = np.ndarray(total_paircount, '>H', raw_bytes, 2, 4)
     int_heads = int_encs >> 14
     int_tails = int_encs & 0x3fff
     int_values = np.multiply(_MS_INT_POW8[int_heads], int_tails, dtype=np.uint32)
-    del int_encs, int_heads, int_tails, raw_bytes
+    del int_encs, int_heads, int_tails
 
     # Bin the mz-intensity pairs into a (retention time x mz) matrix.
     ylabels, data = bin_datapairs(
-        mzs, int_values, pair_counts, precision, data_dtype=np.uint32)
+        mzs, int_values, pair_counts, precision, data_dtype=np.uint32,
+        sparse=sparse)
     del mzs, int_values, pair_counts
 
     # Read file metadata.
-    metadata_offsets = {
-        'date': 0xB2,
-        'method': 0xE4
-    }
-    metadata = read_header(f, metadata_offsets, 1)
+    metadata = read_header(f, _MS_METADATA_OFFSETS, 1)
     f.close()
 
+    if sparse:
+        return SparseDataFile(path, 'MS', times, ylabels, *data, metadata)
     return DataFile(path, 'MS', times, ylabels, data, metadata)
 
 
-def parse_ms_partial(path, precision=0):
+def parse_ms_partial(path, precision=0, sparse=False):
     """
     Parses a partial Agilent .ms file. 
 
@@ -757,19 +1804,19 @@ def parse_ms_partial(path, precision=0):
     Args:
         path (str): Path to the partial .ms file.
         precision (int, optional): Number of decimal to round mz values.
+        sparse (bool, optional): Flag for returning a \
+            :class:`~rainbow.datafile.SparseDataFile`.
 
     Returns:
         DataFile with MS data, if the file can be parsed. Otherwise, None.
 
     """
     f = open(path, 'rb')
-    short_unpack = struct.Struct('>H').unpack
-    int_unpack = struct.Struct('>I').unpack
 
     # Partial .ms files do not store the start offset.
     # Shallow validation of filetype by checking that offset is null.
     f.seek(0x10A)
-    if short_unpack(f.read(2))[0] != 0:
+    if struct.unpack('>H', f.read(2))[0] != 0:
         f.close()
         return None
 
@@ -777,62 +1824,194 @@ def parse_ms_partial(path, precision=0):
     #     but it has been constant for every .ms file we have tested. 
     # Since the start offset is not stored in partials, this code uses that
     #     "constant" common starting offset. It may not work in all cases. 
-    f.seek(0x2F2)
+    offset = 0x2F2
 
-    # Extract retention times and data pair counts for each time. 
-    # Store the bytes holding mz-intensity pairs.
-    times = []
-    pair_counts = []
-    pair_bytearr = bytearray()
-    while True:
-        try:
-            f.read(2)
-            time = int_unpack(f.read(4))[0]
-            f.read(6)
-            pair_count = short_unpack(f.read(2))[0]
-            f.read(4)
-            pair_bytes = f.read(pair_count * 4)
-            f.read(10)
-            times.append(time)
-            pair_counts.append(pair_count)
-            pair_bytearr.extend(pair_bytes)
-        except Exception:
-            break
-
-    # Minor processing on the extracted data.
-    raw_bytes = bytes(pair_bytearr)
-    times = np.array(times) / 60000
-    pair_counts = np.array(pair_counts)
-    num_times = times.size
-    total_paircount = np.sum(pair_counts)
+    # Find the scan records up to the end of the file, like parse_ms.
+    # A record cut off by the end of the file is dropped.
+    with map_file(f) as buf:
+        times, pair_counts = index_ms(buf, offset)
+        mzs, int_encs = ms_pairs(buf, offset, pair_counts)
+    times = times / 60000
 
     # Calculate the mz values. 
-    mzs = np.ndarray(total_paircount, '>H', raw_bytes, 0, 4)
     mzs = np.round(mzs / 20, precision)
 
     # Calculate the intensity values.
-    int_encs = np.ndarray(total_paircount, '>H', raw_bytes, 2, 4)
     int_heads = int_encs >> 14
     int_tails = int_encs & 0x3fff
     int_values = np.multiply(_MS_INT_POW8[int_heads], int_tails, dtype=np.uint32)
-    del int_encs, int_heads, int_tails, raw_bytes
+    del int_encs, int_heads, int_tails
 
     # Bin the mz-intensity pairs into a (retention time x mz) matrix.
     ylabels, data = bin_datapairs(
-        mzs, int_values, pair_counts, precision, data_dtype=np.uint32)
+        mzs, int_values, pair_counts, precision, data_dtype=np.uint32,
+        sparse=sparse)
     del mzs, int_values, pair_counts
 
     # Read file metadata.
-    metadata_offsets = {
-        'date': 0xB2,
-        'method': 0xE4
-    }
-    metadata = read_header(f, metadata_offsets, 1)
+    metadata = read_header(f, _MS_METADATA_OFFSETS, 1)
     f.close()
 
+    if sparse:
+        return SparseDataFile(path, 'MS', times, ylabels, *data, metadata)
     return DataFile(path, 'MS', times, ylabels, data, metadata)
 
 
+"""
+INCREMENTAL READING METHODS
+
+"""
+
+
+class Follower:
+    """
+    Reads an Agilent .uv or .ch file incrementally while it is being \
+        acquired.
+
+    Each call to :meth:`poll` decodes only the segments appended since the \
+        last call. The decoder state after the last complete segment (its \
+        offset, the running accumulator of a .ch signal, and the number of \
+        values so far) is kept between calls, and a segment that is still \
+        being written is left for the next call.
+
+    Supports .uv files with delta-encoded spectra and .ch files with CAD, \
+        ELSD, or UV data.
+
+    A .ch file stores no time per value, only the time range of the whole \
+        run in its header, which is not final until the acquisition ends. \
+        :meth:`poll` therefore returns the sample index of each new .ch \
+        value, and :meth:`retention_times` converts the indices to times.
+
+    Attributes:
+        path (str): Path to the file.
+        detector (str): Detector of the file.
+        ylabels (np.ndarray): Wavelengths of a .uv file, or the ylabel of a \
+            .ch file. None until the first .uv segment is read.
+        num_times (int): Number of retention times read so far.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self.ylabels = None
+        self.num_times = 0
+        self._accumulator = 0
+
+        ext = os.path.splitext(path)[1].lower()
+        with open(path, 'rb') as f:
+            head = read_string(f, 0, gap=1)
+            if ext == '.uv' and head == '131' \
+                    and read_string(f, 347, gap=2).startswith('LC'):
+                self._offset, self._scaling_offset = 0x1000, 0xC0D
+            elif ext == '.uv' and head == '31':
+                self._offset, self._scaling_offset = 0x200, 0x13E
+            elif ext == '.ch' and head in ('130', '30'):
+                self._offset, self._scaling_offset = \
+                    (0x1800, 0x127C) if head == '130' else (0x400, 0x284)
+                gap = 2 if head == '130' else 1
+                metadata = read_header(f, _CH_METADATA_OFFSETS[head], gap=gap)
+                self.detector, ylabel = \
+                    ch_signal_info(metadata.get('signal', ''))
+                self.ylabels = np.array([ylabel])
+            else:
+                raise Exception(
+                    f"{path} is not a delta-encoded Agilent .uv or .ch file.")
+        self._is_uv = ext == '.uv'
+        if self._is_uv:
+            self.detector = 'UV'
+
+    def poll(self):
+        """
+        Decodes the segments appended since the last call.
+
+        Returns:
+            Tuple of a 1D array of the new retention times in minutes (the \
+                new sample indices for a .ch file) and a 2D array of the \
+                new values, which are empty if nothing new is complete.
+
+        """
+        with open(self.path, 'rb') as f:
+            f.seek(self._scaling_offset)
+            scaling_factor = struct.unpack('>d', f.read(8))[0]
+            f.seek(self._offset)
+            chunk = f.read()
+
+        if self._is_uv:
+            times, values, consumed = self._decode_uv(chunk)
+        else:
+            times, values, consumed = self._decode_ch(chunk)
+        self._offset += consumed
+        self.num_times += times.size
+        return times, values * scaling_factor
+
+    def retention_times(self, indices):
+        """
+        Converts sample indices of a .ch file to retention times.
+
+        The times are computed from the time range in the file header and \
+            the number of values read so far, like in \
+            :obj:`parse_ch_other`. They match the complete file once the \
+            acquisition has ended and every value has been polled.
+
+        Args:
+            indices (np.ndarray): Sample indices returned by :meth:`poll`.
+
+        Returns:
+            1D array of the retention times in minutes.
+
+        """
+        if self._is_uv:
+            raise Exception(".uv scans are returned with their times.")
+        with open(self.path, 'rb') as f:
+            f.seek(0x11A)
+            start_time, end_time = struct.unpack('>ii', f.read(8))
+        delta_time = (end_time - start_time) / (self.num_times - 1) \
+            if self.num_times > 1 else 0
+        return (start_time + delta_time * np.asarray(indices)) / 60000
+
+    def _decode_uv(self, chunk):
+        """Decodes the complete .uv segments at the start of a chunk."""
+        if self.ylabels is None:
+            if len(chunk) < 14:
+                return np.empty(0), np.empty((0, 0)), 0
+            self._wavelength_range = struct.unpack_from('<HHH', chunk, 8)
+            start_wlen, end_wlen, delta_wlen = \
+                tuple(num // 20 for num in self._wavelength_range)
+            self.ylabels = np.arange(start_wlen, end_wlen + 1, delta_wlen)
+        num_wavelengths = self.ylabels.size
+
+        # Each segment starts with a 2-byte pad and its length in bytes.
+        # The record written after the last segment of a finished run has
+        #     a different wavelength range, so it ends the walk as well.
+        num_times = 0
+        consumed = 0
+        while consumed + 22 <= len(chunk):
+            seg_len = struct.unpack_from('<H', chunk, consumed + 2)[0]
+            if seg_len == 0 or consumed + seg_len > len(chunk):
+                break
+            wavelength_range = struct.unpack_from('<HHH', chunk, consumed + 8)
+            if wavelength_range != self._wavelength_range:
+                break
+            num_times += 1
+            consumed += seg_len
+
+        if _uvdelta_fast is not None:
+            times, data = _uvdelta_fast.decode_uv_delta(
+                chunk, 0, num_times, num_wavelengths)
+        else:
+            times, data = _decode_uv_delta_numpy(
+                chunk, 0, num_times, num_wavelengths)
+        return times / 60000, data, consumed
+
+    def _decode_ch(self, chunk):
+        """Decodes the complete .ch segments at the start of a chunk."""
+        values, consumed = _decode_delta_segments(
+            chunk, 0, self._accumulator, complete=True)
+        if values.size:
+            self._accumulator = int(values[-1])
+        indices = np.arange(self.num_times, self.num_times + values.size)
+        return indices, values.reshape(-1, 1), consumed
+
+
 """ 
 FILE METADATA PARSING METHODS
 
@@ -945,6 +2124,7 @@ def parse_metadata(path, datafiles):
     if "AcqData" in dircontents:
         acqdata_path = os.path.join(path, "AcqData")
         if "sample_info.xml" in os.listdir(acqdata_path):
+            from lxml import etree
             tree = etree.parse(os.path.join(acqdata_path, "sample_info.xml"))
             root = tree.getroot()
             for samplefield in root.xpath('//Field[Name="Sample Position"]'):
@@ -1001,6 +2181,8 @@ def get_xml_vialnum(path):
         path (str): Path to the XML document. 
 
     """
+    # lxml is only needed for a few metadata files, so it is imported here.
+    from lxml import etree
     tree = etree.parse(path)
     root = tree.getroot()
     for vialnum in root.xpath("//*[local-name()='VialNumber']"):
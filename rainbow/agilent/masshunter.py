@@ -5,9 +5,15 @@ Methods for parsing Agilent Masshunter files.
 import os
 import struct
 import warnings
+from bisect import bisect_left
+from collections import OrderedDict
 import numpy as np
 from lxml import etree
 from rainbow import DataFile
+from rainbow.datafile import SparseDataFile
+from rainbow._binning import csr_from_pairs
+from rainbow._parallel import map_ordered
+from rainbow.agilent.chemstation import map_file
 
 # NOTE: `lzf` (python-lzf) is imported lazily inside parse_msdata, and only
 # when an LZF-compressed MSProfile.bin segment is actually encountered. The
@@ -15,13 +21,19 @@ from rainbow import DataFile
 # run-length-encoded (Q-TOF) MSProfile.bin path - works without it installed.
 
 # Optional compiled accelerator for the run-length MSProfile.bin decode. If it
-# was not built (no compiler or no Cython at install time), decompress_inten_list
-# falls back to the pure-Python loop transparently.
+# was not built (no compiler or no Cython at install time), parse_msdata falls
+# back to the NumPy decoder (_decompress_inten_list_numpy) transparently.
 try:
     from rainbow.agilent import _msprofile as _msprofile_fast
 except ImportError:
     _msprofile_fast = None
 
+# Number of points calibrated per block (see calibrate_mz_batch).
+_CALIBRATION_BATCH = 1 << 16
+
+# Number of m/z axes each ProfileDataFile keeps for reuse (see mass_labels).
+_MZ_CACHE_SIZE = 64
+
 # Pointer for the per-scan profile error messages (see ProfileDataFile).
 _PROFILE_DOC_URL = (
     "https://rainbow-api.readthedocs.io/en/latest/agilent/hrms_data_model.html")
@@ -60,6 +72,7 @@ class ProfileDataFile(DataFile):
         self._use_flags = use_flags
         self.mz_decimals = mz_decimals
         self.metadata = metadata
+        self._mz_cache = OrderedDict()
         warnings.filterwarnings("ignore", category=FutureWarning)
 
     def _no_shared_axis(self, what):
@@ -77,21 +90,39 @@ class ProfileDataFile(DataFile):
     def extract_traces(self, labels=None):
         raise self._no_shared_axis("extract_traces")
 
-    def export_csv(self, filename, labels=None, delim=','):
+    def export_csv(self, filename, labels=None, delim=',', fmt=None):
         raise self._no_shared_axis("export_csv")
 
-    def to_csvstr(self, labels=None, delim=','):
+    def to_csvstr(self, labels=None, delim=',', fmt=None):
         raise self._no_shared_axis("to_csvstr")
 
+    def write_csv(self, f, labels=None, delim=',', fmt=None):
+        raise self._no_shared_axis("write_csv")
+
     def plot(self, label, **kwargs):
         raise self._no_shared_axis("plot")
 
     def mass_labels(self, i):
         """ The calibrated m/z values for scan ``i`` (rounded to
-        :attr:`mz_decimals`). """
-        mz = calibrate_mz(self.tof, self._calib[i], self._use_flags[i])
+        :attr:`mz_decimals`), as a new array the caller may modify. """
+        return self._mass_labels(i).copy()
+
+    def _mass_labels(self, i):
+        """ Like :meth:`mass_labels`, but scans with the same calibration share
+        one read-only array, kept for the most recently used calibrations. """
+        calib_row = np.asarray(self._calib[i], dtype=np.float64)
+        key = (calib_row.tobytes(), self._use_flags[i], self.mz_decimals)
+        mz = self._mz_cache.get(key)
+        if mz is not None:
+            self._mz_cache.move_to_end(key)
+            return mz
+        mz = calibrate_mz(self.tof, calib_row, self._use_flags[i])
         if self.mz_decimals is not None:
             mz = np.round(mz, self.mz_decimals)
+        mz.flags.writeable = False
+        self._mz_cache[key] = mz
+        if len(self._mz_cache) > _MZ_CACHE_SIZE:
+            self._mz_cache.popitem(last=False)
         return mz
 
     def scan(self, i):
@@ -114,13 +145,189 @@ class ProfileDataFile(DataFile):
                f"Metadata: {self.metadata}\n"
 
 
+class ProfileRows:
+    """
+    The intensities of profile scans, decoded from their MSProfile.bin \
+        segments on demand.
+
+    Indexing works like a ``(num_scans, num_points)`` uint32 array. A single \
+        scan (``rows[i]``) is decoded on first access and kept, read-only, in \
+        a cache of the :attr:`cache_size` most recently used scans. A slice or \
+        a list of scans is decoded in one pass into a new matrix, reusing any \
+        cached rows. ``numpy.asarray(rows)`` decodes every scan.
+
+    Args:
+        source (bytes-like): Buffer holding the segments, e.g. a memory map of
+            MSProfile.bin.
+        segments (numpy.ndarray): ``(num_scans, 3)`` offset, length, and LZF
+            decompressed length of the segment of each scan in ``source``.
+        num_mz (int): Number of points of every scan.
+        cache_size (int, optional): Number of decoded scans to keep.
+        workers (int, optional): Number of threads to decode a block of scans
+            with. None decodes them one after another.
+
+    Attributes:
+        shape (tuple): ``(num_scans, num_points)``.
+        dtype (numpy.dtype): Data type of the decoded intensities (uint32).
+        cache_size (int): Number of decoded scans to keep.
+
+    """
+    ndim = 2
+    dtype = np.dtype(np.uint32)
+
+    def __init__(self, source, segments, num_mz, cache_size=256, workers=None):
+        self._source = source
+        self._segments = np.asarray(segments, dtype=np.int64).reshape(-1, 3)
+        self.shape = (len(self._segments), num_mz)
+        self.cache_size = cache_size
+        self.workers = workers
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return f"<ProfileRows: {self.shape[0]} scans x {self.shape[1]} " \
+               f"points, {len(self._cache)} decoded>"
+
+    def __array__(self, dtype=None, copy=None):
+        data = self._decode(range(len(self)))
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            rows = self[key[0]]
+            if rows.ndim == 1:
+                return rows[key[1:]]
+            return rows[(slice(None),) + key[1:]]
+        if isinstance(key, (int, np.integer)) and not isinstance(key, bool):
+            i = int(key) + len(self) if key < 0 else int(key)
+            if not 0 <= i < len(self):
+                raise IndexError(
+                    f"Scan {key} is out of range for {len(self)} scans.")
+            return self._row(i)
+        indices = np.arange(len(self))[key]
+        if indices.ndim == 0:
+            return self._row(int(indices))
+        return self._decode(indices.tolist())
+
+    def in_memory(self):
+        """
+        Copies the segments of the scans into one buffer in memory.
+
+        Returns:
+            A :class:`ProfileRows` that decodes from the copy instead of
+            :obj:`source`.
+
+        """
+        offsets, lengths, decomp_lengths = self._segments.T
+        source = memoryview(self._source)
+        buffer = b''.join(source[offset:offset + length] for offset, length
+                          in zip(offsets.tolist(), lengths.tolist()))
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        return ProfileRows(
+            buffer, np.column_stack((starts, lengths, decomp_lengths)),
+            self.shape[1], self.cache_size, self.workers)
+
+    def _row(self, i):
+        """ Returns scan ``i``, decoding it unless it is cached. """
+        row = self._cache.get(i)
+        if row is not None:
+            self._cache.move_to_end(i)
+            return row
+        row = self._decode([i])[0]
+        row.flags.writeable = False
+        self._cache[i] = row
+        while len(self._cache) > max(self.cache_size, 0):
+            self._cache.popitem(last=False)
+        return row
+
+    def _decode(self, indices):
+        """ Decodes the given scans into the rows of a new matrix. """
+        num_mz = self.shape[1]
+        data = np.empty((len(indices), num_mz), dtype=np.uint32)
+
+        def decode_shard(shard):
+            for row in shard:
+                cached = self._cache.get(indices[row])
+                if cached is not None:
+                    data[row] = cached
+                    continue
+                segment = _read_segment(
+                    self._source, num_mz,
+                    *self._segments[indices[row]].tolist())
+                _decode_segment(*segment[2:], num_mz, data[row])
+
+        map_ordered(decode_shard, _shards(len(indices), self.workers),
+                    self.workers)
+        return data
+
+
+class LazyProfileDataFile(ProfileDataFile):
+    """
+    A :class:`ProfileDataFile` whose scans are decoded on demand.
+
+    The retention times, flight-time axis, and calibration are read up \
+        front, but :attr:`data` is a :class:`ProfileRows` over a memory map \
+        of MSProfile.bin. ``scan(i)`` and ``data[i]`` decode only scan ``i`` \
+        (and cache it); ``data[start:stop]`` decodes that block of scans. \
+        Looking at a few hundred scans of a large run therefore takes a few \
+        hundred rows of memory instead of the whole intensity matrix.
+
+    Attributes:
+        data (ProfileRows): The intensities, decoded on access.
+        cache_size (int): Number of decoded scans kept in memory.
+
+    """
+    @property
+    def cache_size(self):
+        return self.data.cache_size
+
+    @cache_size.setter
+    def cache_size(self, cache_size):
+        self.data.cache_size = cache_size
+
+    def in_memory(self):
+        """
+        Copies the compressed MSProfile.bin segments of the scans into memory.
+
+        The scans are still decoded on access, from one buffer holding their \
+            run-length-encoded or LZF segments as stored, so MSProfile.bin is \
+            not read again. The buffer is usually several times smaller \
+            than the decoded intensities.
+
+        Returns:
+            A :class:`LazyProfileDataFile` that decodes from the copy.
+
+        """
+        return LazyProfileDataFile(
+            self.name, self.xlabels, self.tof, self.data.in_memory(),
+            self._calib, self._use_flags, self.metadata, self.mz_decimals)
+
+    def load(self):
+        """
+        Decodes every scan.
+
+        Returns:
+            A :class:`ProfileDataFile` holding the decoded intensities.
+
+        """
+        return ProfileDataFile(
+            self.name, self.xlabels, self.tof, np.asarray(self.data),
+            self._calib, self._use_flags, self.metadata, self.mz_decimals)
+
+
 """
 MAIN PARSING METHOD
 
 """
 
 def parse_allfiles(path, precision='auto', hrms=False, centroid=False,
-                   bin_width=None):
+                   bin_width=None, sparse=False, workers=None, lazy=False):
     """
     Finds and parses Agilent Masshunter MS data files.
 
@@ -141,6 +348,12 @@ def parse_allfiles(path, precision='auto', hrms=False, centroid=False,
             the per-scan representation (:class:`ProfileDataFile`); pass a width
             in daltons to project onto the shared m/z grid; see
             :obj:`parse_msdata`.
+        sparse (bool, optional): Store the centroids and the shared-grid
+            profile as :class:`~rainbow.datafile.SparseDataFile` objects.
+        workers (int, optional): Number of threads to decode the profile
+            scans with; see :obj:`parse_msdata`.
+        lazy (bool, optional): Decode the per-scan profile scans when they
+            are accessed (:class:`LazyProfileDataFile`).
 
     Returns:
         List containing a DataFile for each parsed file.
@@ -167,9 +380,11 @@ def parse_allfiles(path, precision='auto', hrms=False, centroid=False,
                 datafiles.append(parse_icpmsdata(acqdata_path, precision))
         else:
             if centroid and "MSPeak.bin" in acqdata_files:
-                datafiles.append(parse_mspeakdata(acqdata_path, precision))
+                datafiles.append(
+                    parse_mspeakdata(acqdata_path, precision, sparse))
             if hrms and "MSProfile.bin" in acqdata_files:
-                profile = parse_msdata(acqdata_path, precision, bin_width)
+                profile = parse_msdata(
+                    acqdata_path, precision, bin_width, sparse, workers, lazy)
                 if bin_width is not None:
                     datafiles.append(profile)         # single shared-grid file
                 else:
@@ -179,12 +394,110 @@ def parse_allfiles(path, precision='auto', hrms=False, centroid=False,
     return datafiles
 
 
+def inspect_allfiles(path):
+    """
+    Reads the shape of the Agilent Masshunter MS data in a .D directory \
+        from the MSScan.bin records, without decoding any spectra.
+
+    The profile (MSProfile.bin) is described in its per-scan form: the \
+        number of ylabels is the largest number of points in a scan, and \
+        the ylabel range is the m/z range recorded in the scan records. \
+        The centroid (MSPeak.bin) ylabel range is not recorded reliably, so \
+        only the largest number of peaks in a scan is given.
+
+    Args:
+        path (str): Path to the Agilent .D directory.
+
+    Returns:
+        List with a dictionary describing each MS data file.
+
+    """
+    infos = []
+    acqdata_path = os.path.join(path, "AcqData")
+    if not os.path.isdir(acqdata_path):
+        return infos
+    acqdata_files = set(os.listdir(acqdata_path))
+    if not {"MSScan.xsd", "MSScan.bin"} <= acqdata_files:
+        return infos
+
+    complextypes_dict = parse_scan_xsd(
+        os.path.join(acqdata_path, "MSScan.xsd"))
+    scan_table = read_scan_table(
+        os.path.join(acqdata_path, "MSScan.bin"), complextypes_dict,
+        count_scans(acqdata_path))
+    icpms = "MSScan_XSpecific.bin" in acqdata_files
+
+    if "MSProfile.bin" in acqdata_files:
+        # Stop at the first scan whose segment was never written, like
+        # parse_msdata does.
+        profile_size = os.path.getsize(
+            os.path.join(acqdata_path, "MSProfile.bin"))
+        blocks = scan_table['SpectrumParamValues']
+        num_times = blocks.size
+        if not icpms:
+            num_times = _count_complete(
+                blocks['SpectrumOffset'], blocks['ByteCount'], profile_size)
+        blocks = blocks[:num_times]
+        times = scan_table['ScanTime'][:num_times].tolist()
+        if times:
+            num_ylabels = int(blocks['PointCount'].max())
+            ylabel_range = None
+            # ICP-MS records do not store an m/z range (see parse_icpmsdata).
+            if not icpms:
+                ylabel_range = (float(blocks['MinX'].min()),
+                                float(blocks['MaxX'].max()))
+            infos.append(_scan_info(
+                "MSProfile.bin", times, ylabel_range, num_ylabels,
+                8 if icpms else 4))
+
+    if "MSPeak.bin" in acqdata_files and not icpms:
+        blocks, has_peaks = _select_centroid_blocks(
+            spectrum_blocks(scan_table))
+        times = scan_table['ScanTime'].tolist()
+        if times:
+            peak_counts = np.where(has_peaks, blocks['PointCount'], 0)
+            infos.append(_scan_info(
+                "MSPeak.bin", times, None, int(peak_counts.max()), 8))
+
+    return infos
+
+
+def _count_complete(offsets, byte_counts, file_size):
+    """
+    Returns the number of scans before the first one whose segment ends past
+    the end of its data file.
+    """
+    past_end = offsets.astype(np.int64) + byte_counts > file_size
+    return int(past_end.argmax()) if past_end.any() else past_end.size
+
+
+def _calibration_ids(scan_table):
+    """Returns the CalibrationID of each scan record, or None for each."""
+    if 'CalibrationID' in scan_table.dtype.names:
+        return scan_table['CalibrationID'].tolist()
+    return [None] * scan_table.size
+
+
+def _scan_info(name, times, ylabel_range, num_ylabels, itemsize):
+    """Builds the dictionary returned by :obj:`inspect_allfiles`."""
+    return {
+        'name': name,
+        'detector': 'MS',
+        'num_times': len(times),
+        'rt_range': (times[0], times[-1]),
+        'ylabel_range': ylabel_range,
+        'num_ylabels': num_ylabels,
+        'decoded_bytes': len(times) * num_ylabels * itemsize
+    }
+
+
 """
 MS PARSING METHODS 
 
 """
 
-def parse_msdata(path, precision='auto', bin_width=None):
+def parse_msdata(path, precision='auto', bin_width=None, sparse=False,
+                 workers=None, lazy=False):
     """
     Parses Masshunter MS data.
 
@@ -221,6 +534,13 @@ def parse_msdata(path, precision='auto', bin_width=None):
             representation (a list of :class:`ProfileDataFile`, one per
             flight-time grid); pass a width in daltons to project onto the shared
             grid.
+        sparse (bool, optional): With a ``bin_width``, return the shared grid
+            as a :class:`~rainbow.datafile.SparseDataFile`.
+        workers (int, optional): Number of threads to decode the scans with.
+            None decodes them one after another.
+        lazy (bool, optional): Without a ``bin_width``, return
+            :class:`LazyProfileDataFile` objects that decode each scan when it
+            is accessed.
 
     Returns:
         A list of :class:`ProfileDataFile` (one per grid), or, when a
@@ -255,23 +575,20 @@ def parse_msdata(path, precision='auto', bin_width=None):
     #   - the compressed length in bytes
     #   - the uncompressed length in bytes
     #   - the calibration id (selects a polynomial calibration; see below)
-    scan_records = read_scan_records(
+    scan_table = read_scan_table(
         os.path.join(path, "MSScan.bin"), complextypes_dict, count_scans(path))
-    num_times = len(scan_records)
-    data_info = [
-        (rec['ScanTime'],
-         rec['SpectrumParamValues']['PointCount'],
-         rec['SpectrumParamValues']['SpectrumOffset'],
-         rec['SpectrumParamValues']['ByteCount'],
-         rec['SpectrumParamValues']['UncompressedByteCount'],
-         rec.get('CalibrationID'))
-        for rec in scan_records]
+    num_times = scan_table.size
+    blocks = scan_table['SpectrumParamValues']
+    calibration_ids = _calibration_ids(scan_table)
+    data_info = list(zip(
+        scan_table['ScanTime'].tolist(), blocks['PointCount'].tolist(),
+        blocks['SpectrumOffset'].tolist(), blocks['ByteCount'].tolist(),
+        blocks['UncompressedByteCount'].tolist(), calibration_ids))
 
     # Mass calibration (see _load_calibration and calibrate_mz): the per-scan
     # 10 doubles and polynomial flags. A profile m/z axis is stored as raw
     # time-of-flight, so MSProfile.bin always needs the calibration.
-    calib_vals, calib_flags = _load_calibration(
-        path, [cid for *_, cid in data_info])
+    calib_vals, calib_flags = _load_calibration(path, calibration_ids)
     if calib_vals is None:
         raise FileNotFoundError(
             "Cannot calibrate MSProfile.bin: neither MSMassCal.bin nor a "
@@ -291,93 +608,238 @@ def parse_msdata(path, precision='auto', bin_width=None):
     #     UncompressedByteCount does not reliably distinguish the two (it is
     #     sometimes set, sometimes zero, for the RLE case), so we detect the
     #     RLE format from the segment's own header (see segment_is_rle).
+    #     Every segment decodes independently, so with ``workers`` the scans
+    #     are decoded in shards on a thread pool. The segments are read
+    #     from a memory map of MSProfile.bin and decoded straight into
+    #     preallocated intensity arrays.
     profile_path = os.path.join(path, "MSProfile.bin")
-    profile_size = os.path.getsize(profile_path)
-    f = open(profile_path, 'rb')
-    twodoubles_unpack = struct.Struct('<dd').unpack
-    times = np.empty(num_times)
-    num_mz_per_time = np.empty(num_times)
-    mz_arrs = []
-    inten_arrs = []
-    grid_keys = []        # (num_mz, start_mz, delta) per scan, per-scan mode
-    scan_calib_ids = []   # CalibrationID per scan, per-scan mode
-    for i in range(num_times):
-        time, num_mz, offset, comp_len, decomp_len, calib_id = data_info[i]
-
-        # An interrupted acquisition leaves MSScan.bin describing scans whose
-        # MSProfile.bin segment was never (fully) written. Stop at the first
-        # such scan and keep the complete prefix instead of failing the parse.
-        if offset + comp_len > profile_size:
-            num_times = i
-            times = times[:num_times]
-            num_mz_per_time = num_mz_per_time[:num_times]
-            break
-
-        times[i] = time
-        num_mz_per_time[i] = num_mz
-
-        # Read and decompress the segment for the current retention time.
-        f.seek(offset)
-        comp_bytes = f.read(comp_len)
-        if segment_is_rle(comp_bytes, num_mz):
-            start_mz, delta_mz = twodoubles_unpack(comp_bytes[:16])
-            body = memoryview(comp_bytes)[16:]
-            # Use the compiled accelerator if it was built (identical output).
-            if _msprofile_fast is not None:
-                inten = _msprofile_fast.decompress_inten_list(body, num_mz)
-            else:
-                inten = decompress_inten_list(body, num_mz)
-        else:
-            # Only LZF-compressed segments need python-lzf; import it lazily so
-            # RLE-only data (and the rest of this module) works without it.
-            try:
-                import lzf
-            except ModuleNotFoundError:
-                raise ModuleNotFoundError(
-                    "You must install python-lzf to parse LZF-compressed "
-                    "MSProfile.bin (HRMS) data.")
-            decomp_view = memoryview(lzf.decompress(comp_bytes, decomp_len))
-            start_mz, delta_mz = twodoubles_unpack(decomp_view[:16])
-            inten = np.ndarray(num_mz, '<I', bytes(decomp_view[16:]))
-
-        if bin_width is None:
-            # The per-scan path keeps the raw intensities and recovers m/z per
-            # scan on demand, so it skips the calibration here.
-            grid_keys.append((num_mz, start_mz, delta_mz))
-            scan_calib_ids.append(calib_id)
-        else:
-            # Calculate the calibrated mz values from the raw flight-time axis.
-            tof = np.arange(
-                start_mz, start_mz + delta_mz * (num_mz - 1) + 1e-3, delta_mz)
-            tof = tof[:num_mz]
-            mzs = calibrate_mz(tof, calib_vals[i], calib_flags.get(calib_id))
-            mz_arrs.append(mzs)
-        inten_arrs.append(inten)
-
-    f.close()
-
+    with open(profile_path, 'rb') as f:
+        profile = map_file(f)
+
+    # An interrupted acquisition leaves MSScan.bin describing scans whose
+    # MSProfile.bin segment was never (fully) written. Stop at the first
+    # such scan and keep the complete prefix instead of failing the parse.
+    num_times = _count_complete(
+        blocks['SpectrumOffset'], blocks['ByteCount'], len(profile))
     if num_times == 0:
         raise ValueError(
             f"MSProfile.bin in {path} contains no complete scans.")
+    data_info = data_info[:num_times]
+    times = scan_table['ScanTime'][:num_times].astype(np.float64)
+    num_mz_per_time = blocks['PointCount'][:num_times].astype(np.int64)
+
+    # Read the flight-time grid header of each segment. LZF segments are
+    # decompressed here, since their header is compressed as well. A lazy
+    # read keeps only the grid and decodes the intensities on access, so it
+    # decompresses no further than the header.
+    def read_shard(shard):
+        if lazy:
+            return [_read_grid(profile, *data_info[i][1:4]) for i in shard]
+        return [_read_segment(profile, *data_info[i][1:5]) for i in shard]
+
+    shards = _shards(num_times, workers)
+    segments = [segment for shard in map_ordered(read_shard, shards, workers)
+                for segment in shard]
+    scan_calib_ids = [cid for *_, cid in data_info]
+
+    # Group the scans by flight-time grid (point count, start, and delta).
+    grid_keys = [(num_mz, start_mz, delta_mz) for num_mz, (
+        start_mz, delta_mz, *_) in zip(num_mz_per_time.tolist(), segments)]
+    groups = {}
+    for idx, key in enumerate(grid_keys):
+        groups.setdefault(key, []).append(idx)
+
+    if bin_width is None:
+        # The per-scan path keeps the raw intensities and recovers m/z per
+        # scan on demand, so it skips the calibration here. Scans on the same
+        # grid are decoded into the rows of one intensity matrix.
+        if lazy:
+            locations = np.column_stack((
+                blocks['SpectrumOffset'], blocks['ByteCount'],
+                blocks['UncompressedByteCount']))[:num_times]
+            grid_data = {key: ProfileRows(
+                profile, locations[idxs], key[0], workers=workers)
+                for key, idxs in groups.items()}
+            return _build_per_scan_profiles(
+                times, grid_data, groups, calib_vals[:num_times],
+                scan_calib_ids, calib_flags, mz_decimals=precision)
+        grid_data = {key: np.empty((len(idxs), key[0]), dtype=np.uint32)
+                     for key, idxs in groups.items()}
+        rows = [None] * num_times
+        for key, idxs in groups.items():
+            for row, idx in enumerate(idxs):
+                rows[idx] = grid_data[key][row]
+    else:
+        # The shared grid path concatenates the intensities of every scan.
+        intensities = np.empty(int(num_mz_per_time.sum()), dtype=np.uint32)
+        bounds = np.concatenate(([0], np.cumsum(num_mz_per_time))).tolist()
+        rows = [intensities[bounds[i]:bounds[i + 1]] for i in range(num_times)]
+
+    def decode_shard(shard):
+        for i in shard:
+            _decode_segment(*segments[i][2:], data_info[i][1], rows[i])
+
+    # The scans are decoded into their own arrays, so MSProfile.bin is
+    # unmapped afterwards. (A lazy read keeps it mapped for ProfileRows.)
+    with profile:
+        map_ordered(decode_shard, shards, workers)
+        del segments, rows
 
     if bin_width is None:
         return _build_per_scan_profiles(
-            times, inten_arrs, grid_keys, calib_vals[:num_times],
+            times, grid_data, groups, calib_vals[:num_times],
             scan_calib_ids, calib_flags, mz_decimals=precision)
 
-    # Concatenating the per-scan arrays avoids materializing a ~100M-element
-    # Python list (and the numpy round-trip through it), which otherwise
-    # dominates parsing of large profile files.
-    mz_arr = np.concatenate(mz_arrs)
-    intensities = np.concatenate(inten_arrs).astype(np.uint64)
-    rows = np.repeat(np.arange(num_times), num_mz_per_time.astype(np.int64))
+    # Calculate the calibrated mz values from the raw flight-time axis. The
+    # scans of a grid share it, so they are calibrated in batches of rows
+    # and written straight into one array, rather than building a
+    # ~100M-element Python list (or one array per scan) for large files.
+    mz_arr = np.empty(len(intensities), dtype=np.float64)
+    for (num_mz, start_mz, delta_mz), idxs in groups.items():
+        tof = _tof_axis(num_mz, start_mz, delta_mz)
+        step = max(1, _CALIBRATION_BATCH // num_mz)
+        for first in range(0, len(idxs), step):
+            batch = idxs[first:first + step]
+            mzs = calibrate_mz_batch(tof, calib_vals[batch], [
+                calib_flags.get(scan_calib_ids[i]) for i in batch])
+            for row, i in enumerate(batch):
+                mz_arr[bounds[i]:bounds[i + 1]] = mzs[row]
+    intensities = intensities.astype(np.uint64)
+    rows = np.repeat(np.arange(num_times), num_mz_per_time)
     mz_ylabels, data = bin_to_grid(
-        mz_arr, intensities, rows, num_times, precision, bin_width)
+        mz_arr, intensities, rows, num_times, precision, bin_width, sparse)
 
+    if sparse:
+        return SparseDataFile(
+            "MSProfile.bin", 'MS', times, mz_ylabels, *data, {})
     return DataFile("MSProfile.bin", 'MS', times, mz_ylabels, data, {})
 
 
-def _build_per_scan_profiles(times, inten_arrs, grid_keys, calib_vals,
+def _shards(num_items, workers):
+    """
+    Splits ``range(num_items)`` into contiguous ranges, a few per worker, so
+    that a thread pool is not handed one small task per scan.
+    """
+    num_shards = min(num_items, 4 * workers) if workers and workers > 1 else 1
+    bounds = np.linspace(0, num_items, num_shards + 1).astype(int).tolist()
+    return [range(bounds[i], bounds[i + 1]) for i in range(num_shards)]
+
+
+def _read_segment(profile, num_mz, offset, comp_len, decomp_len):
+    """
+    Reads the flight-time grid header of one MSProfile.bin segment.
+
+    Args:
+        profile (bytes-like): Contents of MSProfile.bin.
+        num_mz (int): Number of mz-intensity pairs of the scan.
+        offset (int): Offset of the segment.
+        comp_len (int): Length of the segment.
+        decomp_len (int): Length of the segment after LZF decompression.
+
+    Returns:
+        Tuple of the smallest mz and the mz delta (before calibration), a
+        flag for run-length encoding, and the intensity payload: a
+        memoryview of the run-length-encoded stream (see
+        :obj:`decompress_inten_list`), or the decompressed intensity bytes
+        of an LZF segment.
+    """
+    comp_view = memoryview(profile)[offset:offset + comp_len]
+    if segment_is_rle(comp_view, num_mz):
+        start_mz, delta_mz = struct.unpack_from('<dd', comp_view)
+        return start_mz, delta_mz, True, comp_view[16:]
+    # Only LZF-compressed segments need python-lzf; import it lazily so
+    # RLE-only data (and the rest of this module) works without it.
+    try:
+        import lzf
+    except ModuleNotFoundError:
+        raise ModuleNotFoundError(
+            "You must install python-lzf to parse LZF-compressed "
+            "MSProfile.bin (HRMS) data.")
+    decomp_view = memoryview(lzf.decompress(bytes(comp_view), decomp_len))
+    start_mz, delta_mz = struct.unpack_from('<dd', decomp_view)
+    return start_mz, delta_mz, False, decomp_view[16:]
+
+
+def _read_grid(profile, num_mz, offset, comp_len):
+    """
+    Reads only the flight-time grid header of one MSProfile.bin segment,
+    without decompressing the intensities. See :obj:`_read_segment`.
+
+    Returns:
+        Tuple of the smallest mz and the mz delta (before calibration).
+    """
+    comp_view = memoryview(profile)[offset:offset + comp_len]
+    if not segment_is_rle(comp_view, num_mz):
+        comp_view = _lzf_head(comp_view, 16)
+    return struct.unpack_from('<dd', comp_view)
+
+
+def _lzf_head(comp_bytes, size):
+    """
+    Decompresses the first :obj:`size` bytes of an LZF stream.
+
+    LZF output is written strictly in order, so the start of a segment can
+    be recovered without decompressing the rest of it. Each control byte
+    below 32 is followed by that many plus one literal bytes; otherwise its
+    top 3 bits (plus an extra byte if they are all set) give the length
+    minus 2 of a back-reference, whose distance minus 1 is held by its low 5
+    bits and the next byte.
+
+    Args:
+        comp_bytes (bytes-like): LZF-compressed data.
+        size (int): Number of decompressed bytes to return.
+
+    Returns:
+        Bytearray of the first :obj:`size` decompressed bytes.
+    """
+    out = bytearray()
+    pos = 0
+    try:
+        while len(out) < size:
+            ctrl = comp_bytes[pos]
+            pos += 1
+            if ctrl < 32:
+                out += comp_bytes[pos:pos + ctrl + 1]
+                pos += ctrl + 1
+                continue
+            length = ctrl >> 5
+            if length == 7:
+                length += comp_bytes[pos]
+                pos += 1
+            ref = len(out) - ((ctrl & 0x1f) << 8) - comp_bytes[pos] - 1
+            pos += 1
+            if ref < 0:
+                raise ValueError
+            # A back-reference may overlap the bytes it produces.
+            for i in range(ref, ref + length + 2):
+                out.append(out[i])
+    except (IndexError, ValueError):
+        raise ValueError("error in compressed data")
+    return out[:size]
+
+
+def _decode_segment(is_rle, payload, num_mz, out):
+    """
+    Decodes the intensities of one MSProfile.bin segment into :obj:`out`.
+    See :obj:`_read_segment`.
+    """
+    if not is_rle:
+        out[:] = np.frombuffer(payload, '<u4', num_mz)
+    # Use the compiled accelerator if it was built (identical output).
+    elif _msprofile_fast is not None:
+        _msprofile_fast.decompress_inten_list(payload, num_mz, out)
+    else:
+        out[:] = _decompress_inten_list_numpy(payload, num_mz)
+
+
+def _tof_axis(num_mz, start_mz, delta_mz):
+    """ The raw flight-time axis of a MSProfile.bin segment. """
+    tof = np.arange(
+        start_mz, start_mz + delta_mz * (num_mz - 1) + 1e-3, delta_mz)
+    return tof[:num_mz]
+
+
+def _build_per_scan_profiles(times, grid_data, groups, calib_vals,
                              scan_calib_ids, calib_flags, mz_decimals=4):
     """
     Builds the per-scan profile representation (see :obj:`parse_msdata` with no
@@ -392,35 +854,32 @@ def _build_per_scan_profiles(times, inten_arrs, grid_keys, calib_vals,
 
     Args:
         times (np.ndarray): Retention time of each (kept) scan.
-        inten_arrs (list): Per-scan uint32 intensity arrays.
-        grid_keys (list): ``(num_mz, start_mz, delta)`` flight-time grid of each
-            scan.
+        grid_data (dict): Maps each ``(num_mz, start_mz, delta)`` flight-time
+            grid to the uint32 intensity matrix of its scans, or to a
+            :class:`ProfileRows` that decodes them on access.
+        groups (dict): Maps each flight-time grid to the indices of its scans.
         calib_vals (np.ndarray): ``(num_scans, 10)`` calibration rows.
         scan_calib_ids (list): CalibrationID of each scan.
         calib_flags (dict): Maps CalibrationID to polynomial ValueUseFlags.
 
     Returns:
-        A list of :class:`ProfileDataFile`, largest grid first.
+        A list of :class:`ProfileDataFile` (:class:`LazyProfileDataFile` for
+        :class:`ProfileRows`), largest grid first.
 
     """
-    groups = {}
-    for idx, key in enumerate(grid_keys):
-        groups.setdefault(key, []).append(idx)
-
     profiles = []
     for seg, (key, idxs) in enumerate(
             sorted(groups.items(), key=lambda kv: -len(kv[1]))):
-        num_mz, start_mz, delta_mz = key
-        tof = np.arange(
-            start_mz, start_mz + delta_mz * (num_mz - 1) + 1e-3, delta_mz)
-        tof = tof[:num_mz]
-        data = np.stack([inten_arrs[i] for i in idxs]).astype(np.uint32)
+        tof = _tof_axis(*key)
+        data = grid_data[key]
+        profile_class = LazyProfileDataFile \
+            if isinstance(data, ProfileRows) else ProfileDataFile
         xlabels = times[idxs]
         calib = calib_vals[idxs]
         use_flags = [calib_flags.get(scan_calib_ids[i]) for i in idxs]
         # One grid keeps the canonical name; extra grids are suffixed.
         name = "MSProfile.bin" if seg == 0 else f"MSProfile.bin.{seg + 1}"
-        profiles.append(ProfileDataFile(
+        profiles.append(profile_class(
             name, xlabels, tof, data, calib, use_flags, {},
             mz_decimals=mz_decimals))
     return profiles
@@ -468,14 +927,13 @@ def parse_icpmsdata(path, precision='auto'):
     # MSScan.bin: Read one scan record per retention time. ICP-MS MSProfile.bin
     # is uncompressed, so only the retention time, point count, and data offset
     # are needed (no byte counts or calibration ids).
-    scan_records = read_scan_records(
+    scan_table = read_scan_table(
         os.path.join(path, "MSScan.bin"), complextypes_dict, count_scans(path))
-    num_times = len(scan_records)
-    data_info = [
-        (rec['ScanTime'],
-         rec['SpectrumParamValues']['PointCount'],
-         rec['SpectrumParamValues']['SpectrumOffset'])
-        for rec in scan_records]
+    num_times = scan_table.size
+    blocks = scan_table['SpectrumParamValues']
+    data_info = list(zip(
+        scan_table['ScanTime'].tolist(), blocks['PointCount'].tolist(),
+        blocks['SpectrumOffset'].tolist()))
 
     # MSTS_XSpecific.xml: Extract the number of isotope channels (masses).
     root = etree.parse(os.path.join(path, "MSTS_XSpecific.xml")).getroot()
@@ -544,12 +1002,12 @@ def _read_icpms_mzs(path, num_masses):
     # described by MSScan_XSpecific.xsd, parsed the same way as MSScan.xsd.
     complextypes_dict = parse_scan_xsd(
         os.path.join(path, "MSScan_XSpecific.xsd"))
-    f = open(os.path.join(path, "MSScan_XSpecific.bin"), 'rb')
-    f.seek(0x48) # start offset
-    mzs = [read_complextype(f, complextypes_dict, "IonRecordType")['XValue']
-           for _ in range(num_masses)]
-    f.close()
-    return np.array(mzs, dtype=np.float64)
+    with open(os.path.join(path, "MSScan_XSpecific.bin"), 'rb') as f:
+        f.seek(0x48) # start offset
+        ion_dtype = scan_dtype(complextypes_dict, "IonRecordType")
+        raw = f.read(num_masses * ion_dtype.itemsize)
+    ion_records = np.ndarray(num_masses, ion_dtype, raw)
+    return ion_records['XValue'].astype(np.float64)
 
 
 # Cap on the dense (retention time x mz-bin) grid the fast binning path will
@@ -558,7 +1016,8 @@ def _read_icpms_mzs(path, num_masses):
 _MAX_DENSE_BINS = 50_000_000
 
 
-def bin_to_grid(mz_arr, intensities, rows, num_times, precision, bin_width=None):
+def bin_to_grid(mz_arr, intensities, rows, num_times, precision, bin_width=None,
+                sparse=False):
     """
     Bins per-point (mz, intensity) values into a (retention time x mz) grid.
 
@@ -584,10 +1043,13 @@ def bin_to_grid(mz_arr, intensities, rows, num_times, precision, bin_width=None)
         precision (int): Number of decimals to round the returned mz labels to.
         bin_width (float, optional): Width of each shared-grid bin in daltons.
             Defaults to ``10**-precision``.
+        sparse (bool, optional): Return the grid as ``(indptr, indices,
+            values)`` CSR arrays, without ever allocating it.
 
     Returns:
         Tuple ``(mz_ylabels, data)``: the sorted bin-center mz values that occur,
-        and the ``(num_times, mz_ylabels.size)`` uint64 intensity grid.
+        and the ``(num_times, mz_ylabels.size)`` uint64 intensity grid (or its
+        CSR arrays).
 
     """
     # Assign each point to integer bin round(mz / bin_width). The None default
@@ -601,6 +1063,16 @@ def bin_to_grid(mz_arr, intensities, rows, num_times, precision, bin_width=None)
     low = int(keys.min())
     span = int(keys.max()) - low + 1
 
+    if sparse:
+        # Only bins that some scan filled with nonzero intensity get a column,
+        # like the dense paths below (csr_from_pairs drops zero sums).
+        uniq, cols = np.unique(keys, return_inverse=True)
+        indptr, indices, values = csr_from_pairs(
+            rows, cols.ravel(), intensities, num_times, uniq.size, np.uint64)
+        present, indices = np.unique(indices, return_inverse=True)
+        return np.round(uniq[present] * width, precision), \
+            (indptr, indices.ravel().astype(np.int32), values)
+
     if span * num_times <= _MAX_DENSE_BINS:
         # Dense path: integer bin keys index straight into the grid.
         # np.bincount with weights is far faster than np.add.at for this
@@ -641,7 +1113,7 @@ def bin_to_grid(mz_arr, intensities, rows, num_times, precision, bin_width=None)
 _PEAK_DTYPES = {8: ('<f4', '<f4'), 12: ('<f8', '<f4'), 16: ('<f8', '<f8')}
 
 
-def parse_mspeakdata(path, precision='auto'):
+def parse_mspeakdata(path, precision='auto', sparse=False):
     """
     Parses Masshunter centroided MS data stored in MSPeak.bin.
 
@@ -663,20 +1135,22 @@ def parse_mspeakdata(path, precision='auto'):
         precision (int or str, optional): Number of decimals to round mz values
             to. ``'auto'`` (the default) resolves to 4 for TOF-calibrated
             centroids and 0 for unit-resolution (GC/quadrupole) centroids.
+        sparse (bool, optional): Return a
+            :class:`~rainbow.datafile.SparseDataFile`.
 
     Returns:
         DataFile containing Masshunter centroided MS data.
 
     """
     complextypes_dict = parse_scan_xsd(os.path.join(path, "MSScan.xsd"))
-    scan_records = read_scan_records(
+    scan_table = read_scan_table(
         os.path.join(path, "MSScan.bin"), complextypes_dict, count_scans(path))
-    num_times = len(scan_records)
+    num_times = scan_table.size
 
     # Mass calibration. GC-quadrupole MSPeak.bin already stores m/z (no
     # calibration files, so calib_vals is None), but a TOF/Q-TOF centroid axis
     # is raw time-of-flight and is calibrated exactly like the profile axis.
-    calibration_ids = [record.get('CalibrationID') for record in scan_records]
+    calibration_ids = _calibration_ids(scan_table)
     calib_vals, calib_flags = _load_calibration(path, calibration_ids)
 
     # 'auto' precision: TOF centroids (calibrated, high-resolution) round to 4
@@ -686,22 +1160,20 @@ def parse_mspeakdata(path, precision='auto'):
 
     peak_path = os.path.join(path, "MSPeak.bin")
     peak_size = os.path.getsize(peak_path)
-    times = np.empty(num_times)
+    times = scan_table['ScanTime'].astype(np.float64)
     num_peaks_per_time = np.zeros(num_times, dtype=np.int64)
     mz_arrs = []
     inten_arrs = []
+    blocks, has_peaks = _select_centroid_blocks(spectrum_blocks(scan_table))
+    peak_info = zip(
+        has_peaks.tolist(), blocks['PointCount'].tolist(),
+        blocks['SpectrumOffset'].tolist(), blocks['ByteCount'].tolist())
     with open(peak_path, 'rb') as f:
-        for i, record in enumerate(scan_records):
-            times[i] = record['ScanTime']
-            block = _select_centroid_block(record['SpectrumParamsBlocks'])
-            if block is None:
-                continue
-            num_peaks = block['PointCount']
-            offset = block['SpectrumOffset']
-            byte_count = block['ByteCount']
+        for i, (has_block, num_peaks, offset, byte_count) in \
+                enumerate(peak_info):
             # Skip scans with no peaks, or whose data was never (fully) written
             # (an interrupted acquisition - keep the complete scans).
-            if (num_peaks <= 0 or byte_count <= 0
+            if (not has_block or num_peaks <= 0 or byte_count <= 0
                     or offset + byte_count > peak_size):
                 continue
             f.seek(offset)
@@ -716,6 +1188,12 @@ def parse_mspeakdata(path, precision='auto'):
             num_peaks_per_time[i] = num_peaks
 
     if not mz_arrs:
+        if sparse:
+            return SparseDataFile(
+                "MSPeak.bin", 'MS', times, np.array([], dtype=np.float64),
+                np.zeros(num_times + 1, dtype=np.int64),
+                np.array([], dtype=np.int32), np.array([], dtype=np.uint64),
+                {})
         return DataFile(
             "MSPeak.bin", 'MS', times, np.array([], dtype=np.float64),
             np.zeros((num_times, 0), dtype=np.uint64), {})
@@ -723,7 +1201,11 @@ def parse_mspeakdata(path, precision='auto'):
     mz_arr = np.concatenate(mz_arrs)
     intensities = np.concatenate(inten_arrs).astype(np.uint64)
     rows = np.repeat(np.arange(num_times), num_peaks_per_time)
-    mz_ylabels, data = bin_to_grid(mz_arr, intensities, rows, num_times, precision)
+    mz_ylabels, data = bin_to_grid(
+        mz_arr, intensities, rows, num_times, precision, sparse=sparse)
+    if sparse:
+        return SparseDataFile(
+            "MSPeak.bin", 'MS', times, mz_ylabels, *data, {})
     return DataFile("MSPeak.bin", 'MS', times, mz_ylabels, data, {})
 
 
@@ -746,6 +1228,29 @@ def _select_centroid_block(blocks):
     return None
 
 
+def _select_centroid_blocks(blocks):
+    """
+    Vectorized :obj:`_select_centroid_block` over the blocks of every scan.
+
+    Args:
+        blocks (np.ndarray): Output of :obj:`spectrum_blocks`.
+
+    Returns:
+        Tuple of the chosen block of each scan (the first block where a scan
+        has no centroid block) and a boolean array that is True for the scans
+        that have one.
+    """
+    num_peaks = blocks['PointCount'].astype(np.int64)
+    byte_count = blocks['ByteCount'].astype(np.int64)
+    has_points = num_peaks > 0
+    bytes_per_peak = byte_count // np.where(has_points, num_peaks, 1)
+    is_peak = has_points \
+        & (bytes_per_peak * num_peaks == byte_count) \
+        & np.isin(bytes_per_peak, list(_PEAK_DTYPES))
+    first = is_peak.argmax(axis=1)
+    return blocks[np.arange(len(blocks)), first], is_peak.any(axis=1)
+
+
 def _decode_peak_block(raw, num_peaks, bytes_per_peak):
     """
     Decodes one MSPeak.bin centroid segment into (mz, intensity) float arrays.
@@ -908,21 +1413,63 @@ def calibrate_mz(tof, calib_row, use_flags):
         A numpy array of calibrated mz values.
 
     """
-    coeff, base, left, right = calib_row[:4]
-    mzs = (coeff * (tof - base)) ** 2
-    if not use_flags:
-        return mzs
+    return calibrate_mz_batch(tof, calib_row, [use_flags])[0]
+
+
+def calibrate_mz_batch(tof, calib_rows, use_flags):
+    """
+    Converts a raw time-of-flight axis to calibrated mz values for many \
+        scans at once.
+
+    Gives the same values as :obj:`calibrate_mz` for each scan, but \
+        evaluates the ``(num_scans, num_points)`` array in vectorized blocks \
+        of rows. Scans with the same ``use_flags`` share the polynomial \
+        orders, so each such group is corrected with one Horner evaluation \
+        per block.
 
-    # Map the six coefficients onto the polynomial orders flagged for use.
-    coefficients = calib_row[4:10]
-    orders = [k for k in range(use_flags.bit_length()) if use_flags >> k & 1]
-    poly = np.zeros(max(orders) + 1) if orders else np.zeros(1)
-    for order, coefficient in zip(orders, coefficients):
-        poly[order] = coefficient
-    # np.polyval wants coefficients highest-order first; Horner's method keeps
-    # the high-order terms stable for the large time-of-flight magnitudes.
-    correction = np.polyval(poly[::-1], np.clip(tof, left, right))
-    return mzs - correction
+    Args:
+        tof (np.ndarray): Raw time-of-flight values shared by the scans.
+        calib_rows (np.ndarray): ``(num_scans, 10)`` MSMassCal.bin rows.
+        use_flags (list): The polynomial ValueUseFlags of each scan, or
+            None/0 to apply only the traditional formula.
+
+    Returns:
+        A ``(num_scans, num_points)`` numpy array of calibrated mz values.
+
+    """
+    tof = np.asarray(tof, dtype=np.float64)
+    calib_rows = np.asarray(calib_rows, dtype=np.float64).reshape(-1, 10)
+    flags = np.array([flag or 0 for flag in use_flags], dtype=np.int64)
+    mzs = np.empty((len(calib_rows), tof.size), dtype=np.float64)
+    # Blocks of rows that fit in the CPU cache are faster than one pass over
+    # the whole array, which is limited by memory bandwidth.
+    step = max(1, _CALIBRATION_BATCH // max(tof.size, 1))
+    for first in range(0, len(calib_rows), step):
+        block = slice(first, first + step)
+        _calibrate_block(tof, calib_rows[block], flags[block], mzs[block])
+    return mzs
+
+
+def _calibrate_block(tof, calib_rows, flags, out):
+    """ Calibrates a block of rows into :obj:`out` (see
+    :obj:`calibrate_mz_batch`). """
+    coeff, base, left, right = (calib_rows[:, k, None] for k in range(4))
+    np.square(coeff * (tof - base), out=out)
+
+    for flag in np.unique(flags[flags != 0]).tolist():
+        rows = np.flatnonzero(flags == flag)
+        # Map the six coefficients onto the polynomial orders flagged for use.
+        orders = [k for k in range(flag.bit_length()) if flag >> k & 1]
+        poly = np.zeros((len(rows), max(orders) + 1))
+        poly[:, orders[:6]] = calib_rows[rows, 4:4 + len(orders[:6])]
+        # Horner's method (as in np.polyval) keeps the high-order terms
+        # stable for the large time-of-flight magnitudes.
+        x = np.clip(tof, left[rows], right[rows])
+        correction = np.zeros_like(x)
+        for k in range(poly.shape[1] - 1, -1, -1):
+            correction *= x
+            correction += poly[:, k, None]
+        out[rows] -= correction
 
 
 def segment_is_rle(comp_bytes, num_mz):
@@ -1063,25 +1610,49 @@ def parse_scan_xsd(xsd_path):
     return complextypes_dict
 
 
-# Byte sizes of the MSScan.xsd "simple" types (mirrors the readers in
-# read_type). Used to compute a record's on-disk size without reading it.
-_SIMPLE_TYPE_SIZES = {
-    'xs:byte': 1, 'xs:short': 2, 'xs:int': 4,
-    'xs:long': 8, 'xs:float': 4, 'xs:double': 8,
+# NumPy dtypes of the MSScan.xsd "simple" types (mirrors the readers in
+# read_type). xs:byte is kept as a raw byte, like read_type returns it.
+_SIMPLE_TYPE_DTYPES = {
+    'xs:byte': 'V1', 'xs:short': '<u2', 'xs:int': '<u4',
+    'xs:long': '<u8', 'xs:float': '<f4', 'xs:double': '<f8',
 }
 
 # A scan may store more than one SpectrumParamValues block; this bounds how many
-# we will consider when inferring the record stride (see read_scan_records).
+# we will consider when inferring the record stride (see read_scan_table).
 _MAX_SPECTRUM_BLOCKS = 8
 
 
+def scan_dtype(complextypes_dict, name):
+    """
+    Compiles an MSScan.xsd type into a packed NumPy dtype.
+
+    A "complex" type becomes a structured dtype with one field per member, in
+    file order, so a run of records can be viewed as one structured array.
+    Mirrors :obj:`read_complextype`/:obj:`read_type`.
+
+    Args:
+        complextypes_dict (dict): Output of :obj:`parse_scan_xsd`.
+        name (str): A simple ("xs:int", ...) or complex type name.
+
+    Returns:
+        NumPy dtype of the type.
+
+    """
+    if name in _SIMPLE_TYPE_DTYPES:
+        return np.dtype(_SIMPLE_TYPE_DTYPES[name])
+    # Complex type references may carry a namespace prefix (see read_type).
+    return np.dtype([
+        (subname, scan_dtype(complextypes_dict, subtype))
+        for subname, subtype in complextypes_dict[name.split(':')[-1]]])
+
+
 def type_size(complextypes_dict, name):
     """
     Returns the on-disk byte size of one MSScan.bin record of the given type.
 
     Mirrors :obj:`read_complextype`/:obj:`read_type`: each member is counted
     once, so for ScanRecordType this is the size of a record with a single
-    SpectrumParamValues block. Lets read_scan_records reason about the record
+    SpectrumParamValues block. Lets read_scan_table reason about the record
     stride without reading the file.
 
     Args:
@@ -1092,32 +1663,31 @@ def type_size(complextypes_dict, name):
         Size in bytes (int).
 
     """
-    if name in _SIMPLE_TYPE_SIZES:
-        return _SIMPLE_TYPE_SIZES[name]
-    return sum(type_size(complextypes_dict, subtype)
-               for _, subtype in complextypes_dict[name.split(':')[-1]])
+    return scan_dtype(complextypes_dict, name).itemsize
 
 
-def read_scan_records(msscan_path, complextypes_dict, num_records=None):
+def read_scan_table(msscan_path, complextypes_dict, num_records=None):
     """
-    Reads the scan records (ScanRecordType) from MSScan.bin, one per retention
-    time.
+    Reads the scan records (ScanRecordType) from MSScan.bin as a structured
+    array, one row per retention time.
 
     Each record holds the scalar scan fields followed by one or more
     ``SpectrumParamValues`` blocks - the schema element is
     ``maxOccurs="unbounded"``. A profile-only acquisition writes a single block,
     but an acquisition that also stores centroids (MSPeak.bin) writes a profile
     block *and* a centroid block, making the record larger.
-    :obj:`read_complextype` reads only the first block, so reading records
-    back-to-back would mis-parse the trailing block(s) as the next record.
 
-    To stay aligned we read each record at the true record stride and skip to
-    the next. The stride is ``scalar + n * block`` for some block count ``n``;
-    it is taken from the MSTS.xml scan count when that is consistent, otherwise
-    inferred as the value of ``n`` that tiles the record region exactly. The
-    first block of each record is the profile spectrum, which is what
-    :obj:`parse_msdata` consumes. Only when no stride tiles the region (a record
-    truncated mid-write) do we fall back to reading single-block records to EOF.
+    The record stride is ``scalar + n * block`` for some block count ``n``; it
+    is taken from the MSTS.xml scan count when that is consistent, otherwise
+    inferred as the value of ``n`` that tiles the record region exactly. Only
+    when no stride tiles the region (a record truncated mid-write) are
+    single-block records read up to the last complete one.
+
+    The record layout is compiled into a dtype (see :obj:`scan_dtype`) whose
+    itemsize is the stride, so every record comes from one view of the file.
+    The first block is the ``SpectrumParamValues`` field, which holds the
+    profile spectrum that :obj:`parse_msdata` consumes. Any further blocks are
+    the ``ExtraSpectrumParams`` field (see :obj:`spectrum_blocks`).
 
     Args:
         msscan_path (str): Path to MSScan.bin.
@@ -1128,64 +1698,110 @@ def read_scan_records(msscan_path, complextypes_dict, num_records=None):
             the file geometry either way.
 
     Returns:
-        List of dictionaries, one per retention time, each mapping the
-        ScanRecordType member names to their parsed values.
+        Structured NumPy array with one row per retention time.
 
     """
-    file_size = os.path.getsize(msscan_path)
-    block = type_size(complextypes_dict, "SpectrumParamsType")
-    scalar = type_size(complextypes_dict, "ScanRecordType") - block
-    records = []
+    record_dtype = scan_dtype(complextypes_dict, "ScanRecordType")
+    block_dtype = scan_dtype(complextypes_dict, "SpectrumParamsType")
+    block = block_dtype.itemsize
+    scalar = record_dtype.itemsize - block
     with open(msscan_path, 'rb') as f:
         f.seek(0x58)  # offset to the uint32 pointer at the start of records
         rec_start = struct.unpack('<I', f.read(4))[0]
-        body = file_size - rec_start
-
-        candidates = [scalar + n * block
-                      for n in range(1, _MAX_SPECTRUM_BLOCKS + 1)]
-        stride = None
-        # Trust the MSTS scan count when it implies a structurally valid stride.
-        if num_records and num_records > 0 and body % num_records == 0:
-            hinted = body // num_records
-            if hinted in candidates:
-                stride = hinted
-        # Otherwise infer it: the record size must tile the region exactly. If
-        # several block counts do, prefer the scan count nearest MSTS (a stale
-        # MSTS is still in the right range), else the fewest blocks.
-        if stride is None:
-            divisors = [s for s in candidates if body % s == 0]
-            if divisors:
-                stride = min(divisors, key=lambda s: (
-                    abs(body // s - num_records) if num_records else s))
-
-        if stride is not None:
-            # Number of SpectrumParamValues blocks per record (e.g. a profile
-            # block plus a centroid block). read_complextype consumes the scalar
-            # fields and the first block; read any remaining blocks explicitly so
-            # callers that need the centroid block (parse_mspeakdata) can see it.
-            num_blocks = (stride - scalar) // block
-            for i in range(body // stride):
-                f.seek(rec_start + i * stride)
-                record = read_complextype(
-                    f, complextypes_dict, "ScanRecordType")
-                blocks = [record['SpectrumParamValues']]
-                for _ in range(num_blocks - 1):
-                    blocks.append(read_complextype(
-                        f, complextypes_dict, "SpectrumParamsType"))
-                record['SpectrumParamsBlocks'] = blocks
-                records.append(record)
-        else:
-            # No stride tiles the region (e.g. truncated mid-record): best-effort
-            # single-block read to EOF.
-            f.seek(rec_start)
-            while f.tell() < file_size:
-                record = read_complextype(
-                    f, complextypes_dict, "ScanRecordType")
-                record['SpectrumParamsBlocks'] = [record['SpectrumParamValues']]
-                records.append(record)
+        f.seek(rec_start)
+        buf = f.read()
+    body = len(buf)
+
+    candidates = [scalar + n * block
+                  for n in range(1, _MAX_SPECTRUM_BLOCKS + 1)]
+    stride = None
+    # Trust the MSTS scan count when it implies a structurally valid stride.
+    if num_records and num_records > 0 and body % num_records == 0:
+        hinted = body // num_records
+        if hinted in candidates:
+            stride = hinted
+    # Otherwise infer it: the record size must tile the region exactly. If
+    # several block counts do, prefer the scan count nearest MSTS (a stale
+    # MSTS is still in the right range), else the fewest blocks.
+    if stride is None:
+        divisors = [s for s in candidates if body % s == 0]
+        if divisors:
+            stride = min(divisors, key=lambda s: (
+                abs(body // s - num_records) if num_records else s))
+    # No stride tiles the region (e.g. truncated mid-record): best-effort
+    # single-block records up to the last complete one.
+    if stride is None:
+        stride = record_dtype.itemsize
+
+    # Number of SpectrumParamValues blocks per record (e.g. a profile block
+    # plus a centroid block). The blocks after the first follow the scalar
+    # fields and the first block.
+    num_blocks = (stride - scalar) // block
+    names = list(record_dtype.names)
+    formats = [record_dtype.fields[name][0] for name in names]
+    offsets = [record_dtype.fields[name][1] for name in names]
+    if num_blocks > 1:
+        names.append('ExtraSpectrumParams')
+        formats.append((block_dtype, (num_blocks - 1,)))
+        offsets.append(record_dtype.itemsize)
+    table_dtype = np.dtype({'names': names, 'formats': formats,
+                            'offsets': offsets, 'itemsize': stride})
+    return np.ndarray(body // stride, table_dtype, buf)
+
+
+def spectrum_blocks(scan_table):
+    """
+    Returns every SpectrumParamValues block of each scan record.
+
+    Args:
+        scan_table (np.ndarray): Output of :obj:`read_scan_table`.
+
+    Returns:
+        Structured NumPy array with a row of blocks per retention time.
+
+    """
+    first = scan_table['SpectrumParamValues'][:, np.newaxis]
+    if 'ExtraSpectrumParams' not in scan_table.dtype.names:
+        return first
+    return np.concatenate([first, scan_table['ExtraSpectrumParams']], axis=1)
+
+
+def read_scan_records(msscan_path, complextypes_dict, num_records=None):
+    """
+    Reads the scan records (ScanRecordType) from MSScan.bin, one per retention
+    time, as dictionaries. See :obj:`read_scan_table`.
+
+    Args:
+        msscan_path (str): Path to MSScan.bin.
+        complextypes_dict (dict): Output of :obj:`parse_scan_xsd`.
+        num_records (int, optional): Scan count from MSTS.xml (:obj:`count_scans`),
+            used as a hint.
+
+    Returns:
+        List of dictionaries, one per retention time, each mapping the
+        ScanRecordType member names to their parsed values. The
+        ``SpectrumParamsBlocks`` key lists every SpectrumParamValues block.
+
+    """
+    scan_table = read_scan_table(msscan_path, complextypes_dict, num_records)
+    blocks = spectrum_blocks(scan_table)
+    records = []
+    for i in range(scan_table.size):
+        record = _record_dict(scan_table[i])
+        record.pop('ExtraSpectrumParams', None)
+        record['SpectrumParamsBlocks'] = [
+            _record_dict(block) for block in blocks[i]]
+        records.append(record)
     return records
 
 
+def _record_dict(record):
+    """Converts a structured record into nested dictionaries of values."""
+    return {name: _record_dict(record[name]) if record[name].dtype.names
+            else record[name].item()
+            for name in record.dtype.names}
+
+
 def count_scans(acqdata_path):
     """
     Returns the total scan count from MSTS.xml, or None if MSTS.xml is absent.
@@ -1264,4 +1880,109 @@ def read_type(f, complextype_dict, name):
     # references with the schema's target-namespace prefix (e.g.
     # "mstns:ScanRecordType"), while the complexType is defined under its bare
     # local name. Strip any such prefix before looking it up.
-    return read_complextype(f, complextype_dict, name.split(':')[-1])
\ No newline at end of file
+    return read_complextype(f, complextype_dict, name.split(':')[-1])
+
+
+def _decompress_inten_list_numpy(comp_view, num_mz):
+    """
+    Decompresses a run-length-encoded MSProfile.bin intensity stream with \
+        NumPy. See :obj:`decompress_inten_list`, whose output this matches.
+
+    Literals far outnumber control tokens, so instead of unpacking one \
+        value at a time, the stream is viewed as integers of each width at \
+        every byte offset. Each run of literals between two control tokens \
+        is then copied with one slice, and only the control tokens are \
+        visited one at a time.
+
+    Args:
+        comp_view (memoryview): Segment bytes after the 16-byte header.
+        num_mz (int): The number of mz-intensity pairs (output length).
+
+    Returns:
+        A numpy array of ``num_mz`` uint32 intensities.
+
+    Raises:
+        ValueError: If the stream is malformed (bad width flag, runs past the
+            point count, or is truncated).
+
+    """
+    buf = bytes(comp_view)
+    end = len(buf)
+    if end < 8:
+        raise ValueError("Malformed MSProfile.bin RLE segment.")
+    cur_idx = -struct.unpack('<i', buf[4:8])[0]
+    if cur_idx < 0:
+        raise ValueError(
+            "Malformed MSProfile.bin RLE segment: negative initial index.")
+
+    dtypes = {1: '<i1', 2: '<i2', 3: '<i4', 4: '<i8'}
+    sizes = {1: 1, 2: 2, 3: 4, 4: 8}
+    # The integer of each width starting at every byte offset.
+    views = {}
+    # Sorted offsets and values of the negative (control) tokens, per width
+    # and phase. Consecutive tokens of one width share a phase, so the next
+    # control token is simply the next entry until the width changes.
+    controls = {}
+    # Literal runs per width as (output index, byte offset, count), which are
+    # copied in one gather per width at the end.
+    runs = {flag: ([], [], []) for flag in sizes}
+
+    offset = 8
+    width_flag = 3
+    while offset < end:
+        size = sizes[width_flag]
+        if width_flag not in views:
+            views[width_flag] = np.ndarray(
+                max(end - size + 1, 0), dtypes[width_flag], buf, 0, (1,))
+        phase = offset % size
+        if (width_flag, phase) not in controls:
+            view = views[width_flag]
+            positions = np.flatnonzero(view[phase::size] < 0) * size + phase
+            controls[width_flag, phase] = (
+                positions.tolist(), view[positions].tolist())
+        positions, values = controls[width_flag, phase]
+        run_idx, run_offsets, run_counts = runs[width_flag]
+        i = bisect_left(positions, offset)
+        while True:
+            stop = positions[i] if i < len(positions) else end
+            num_literals = -(-(stop - offset) // size)
+            if num_literals:
+                run_idx.append(cur_idx)
+                run_offsets.append(offset)
+                run_counts.append(num_literals)
+                cur_idx += num_literals
+            if stop == end:
+                if (end - offset) % size:
+                    raise ValueError(
+                        "Malformed MSProfile.bin RLE segment: truncated "
+                        "token.")
+                break
+            num_zeros, next_flag = divmod(-values[i], 4)
+            cur_idx += num_zeros
+            offset = stop + size
+            if next_flag != width_flag:
+                break
+            i += 1
+        if stop == end:
+            break
+        if next_flag not in sizes:
+            raise ValueError(
+                "Malformed MSProfile.bin RLE segment: bad width flag.")
+        width_flag = next_flag
+
+    inten = np.zeros(num_mz, dtype=np.uint32)
+    for flag, (run_idx, run_offsets, run_counts) in runs.items():
+        if not run_counts:
+            continue
+        counts = np.array(run_counts)
+        if run_idx[-1] + run_counts[-1] > num_mz:
+            raise ValueError(
+                "Malformed MSProfile.bin RLE segment: runs past the point "
+                "count.")
+        # Position of each literal within its run.
+        within = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts)
+        dest = np.repeat(run_idx, counts) + within
+        src = np.repeat(run_offsets, counts) + within * sizes[flag]
+        inten[dest] = views[flag][src]
+    return inten
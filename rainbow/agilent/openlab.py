@@ -114,6 +114,46 @@ def read_metadata(path):
     return {'datafiles': datafiles, 'metadata': dir_metadata}
 
 
+def inspect(path):
+    """
+    Reads the shape of each payload in an Agilent OpenLab CDS .dx archive.
+
+    The names and detectors come from the manifest. The shapes are read from \
+        the payload headers (see :obj:`chemstation.inspect_header`), which \
+        only decompresses the start of each payload and its segment headers.
+
+    Args:
+        path (str): Path of the .dx file.
+
+    Returns:
+        List with a dictionary describing each payload, including telemetry.
+
+    """
+    infos = []
+    used_names = set()
+    with zipfile.ZipFile(path) as archive:
+        _, signals = _parse_manifest(archive)
+        for member in archive.infolist():
+            base = os.path.basename(member.filename)
+            guid, ext = os.path.splitext(base)
+            if ext.lower() not in _DATA_EXTS:
+                continue
+            signal = signals.get(guid.lower(), {})
+            name = _name_for(signal, guid, ext, used_names)
+
+            # .ch and .it share the single-channel "179" container.
+            if ext.lower() == '.uv':
+                header_ext, detector = '.uv', 'UV'
+            else:
+                header_ext, detector = '.ch', _classify(signal)
+            with archive.open(member) as f:
+                shape = chemstation.inspect_header(
+                    f, header_ext, member.file_size)
+            if shape is not None:
+                infos.append({'name': name, 'detector': detector, **shape})
+    return infos
+
+
 def _parse_member(tmppath, name, ext, signal):
     """
     Decodes one extracted .dx payload into a DataFile.
@@ -118,7 +118,8 @@ class DataDirectory:
         """
         return self.get_file(filename).extract_traces(labels)
 
-    def export_csv(self, in_filename, out_filename, labels=None, delim=','):
+    def export_csv(self, in_filename, out_filename, labels=None, delim=',',
+                   fmt=None):
         """
         Outputs a CSV with data for the specified DataFile and :code:`labels`.
 
@@ -127,10 +128,27 @@ class DataDirectory:
             out_filename (str): Filename for the output CSV. 
             labels (int/float/list, optional): Ylabel(s) to export.
             delim (str, optional): Delimiter used in the output CSV. 
+            fmt (str, optional): %-style format for the data values.
 
         """
-        self.get_file(in_filename).export_csv(out_filename, labels, delim)
+        self.get_file(in_filename).export_csv(
+            out_filename, labels, delim, fmt)
     
+    def save(self, path):
+        """
+        Saves the DataDirectory to an archive directory.
+
+        The archive holds a JSON manifest and one .npy file per array, and \
+            is reopened with :obj:`rainbow.load`, which memory-maps the \
+            arrays instead of decoding the raw files again.
+
+        Args:
+            path (str): Path of the archive directory.
+
+        """
+        from rainbow import _archive
+        _archive.save(self, path)
+
     def plot(self, filename, label, **kwargs):
         """
         Shows a basic matplotlib plot for the specified DataFile and :code:`label`.
@@ -1,7 +1,11 @@
+import io
 import os
 import warnings
 import numpy as np
 
+# Number of values formatted at a time when writing a CSV.
+_CSV_BLOCK_SIZE = 1 << 16
+
 
 class DataFile:
     """
@@ -70,7 +74,8 @@ class DataFile:
         Raises an exception if any :code:`labels` are invalid. 
 
         Args:
-            labels (int/float/list, optional): Ylabel(s) to extract. 
+            labels (int/float/list/numpy.ndarray, optional): Ylabel(s) to 
+                extract. 
         
         Returns:
             2D numpy array containing data for the specified ylabel(s). 
@@ -82,64 +87,156 @@ class DataFile:
         if labels is None:
             return self.data.T
 
-        if isinstance(labels, int) or \
-           isinstance(labels, float) or \
-           labels == '':
-            labels = [labels]
-
-        if not isinstance(labels, list):
-            raise Exception("Invalid type for labels.")
-
-        for label in np.array(labels):
-            if label not in self.ylabels:
-                raise Exception(f"Label {label} not in {self.name}.")
-        
-        indices = np.searchsorted(self.ylabels, labels)   
+        indices = self._label_indices(np.asarray(_wrap_labels(labels)))
         traces = self.data[:,indices].T
 
         return traces
 
-    def export_csv(self, filename, labels=None, delim=','):
+    def tic(self):
+        """
+        Returns the total ion current (the sum of each row of data).
+
+        Returns:
+            1D numpy array with the sum at each retention time.
+
+        """
+        return self.data.sum(axis=1)
+
+    def _label_indices(self, labels):
+        """
+        Returns the column index of each label in :code:`labels`.
+
+        The ylabels are sorted once into an index that is reused by later \
+            calls, so looking up many labels is a single vectorized \
+            :code:`np.searchsorted`. The index is rebuilt whenever the \
+            ylabels array is replaced.
+
+        Args:
+            labels (numpy.ndarray): 1D array of ylabels to look up.
+
+        Returns:
+            1D numpy array of column indices.
+
+        """
+        ylabels = self.ylabels
+        index = getattr(self, '_label_index', None)
+        if index is None or index[0] is not ylabels:
+            order = np.argsort(ylabels, kind='stable')
+            index = (ylabels, order, ylabels[order])
+            self._label_index = index
+        _, order, sorted_labels = index
+
+        if labels.size == 0:
+            return np.zeros(0, dtype=np.intp)
+
+        # Text labels never match numeric ylabels, and vice versa.
+        if (labels.dtype.kind in 'US') != (sorted_labels.dtype.kind in 'US') \
+           or sorted_labels.size == 0:
+            raise Exception(f"Label {labels[0]} not in {self.name}.")
+
+        positions = np.searchsorted(sorted_labels, labels)
+        clipped = np.minimum(positions, sorted_labels.size - 1)
+        found = (positions < sorted_labels.size) & \
+                (sorted_labels[clipped] == labels)
+        if not found.all():
+            raise Exception(f"Label {labels[~found][0]} not in {self.name}.")
+
+        return order[positions]
+
+    def export_csv(self, filename, labels=None, delim=',', fmt=None):
         """
         Outputs a CSV containing data for the specified :code:`labels`.
 
+        The CSV is streamed to the file in blocks of rows (see \
+            :meth:`write_csv`), so large DataFiles export in constant \
+            extra memory.
+
         Args:
             filename (str): Filename for the output CSV.
-            labels (int/float/list, optional):   Ylabel(s) to export. 
+            labels (int/float/list/numpy.ndarray, optional): Ylabel(s) to 
+                export. 
             delim (str, optional): Delimiter used in the output CSV. 
+            fmt (str, optional): %-style format for the data values 
+                (e.g. '%.6g'). 
 
         """
-        f = open(filename, 'w+')
-        f.write(self.to_csvstr(labels, delim))
-        f.close()
+        with open(filename, 'w+') as f:
+            self.write_csv(f, labels, delim, fmt)
     
-    def to_csvstr(self, labels=None, delim=','):
+    def to_csvstr(self, labels=None, delim=',', fmt=None):
         """
         Returns a string representation of a CSV containing data \
             for the specified :code:`labels`.
         
         Args:
-            labels (int/float/list, optional): Ylabel(s) to return.
+            labels (int/float/list/numpy.ndarray, optional): Ylabel(s) to 
+                return.
             delim (str, optional): Delimiter used in the CSV representation.
+            fmt (str, optional): %-style format for the data values 
+                (e.g. '%.6g'). 
 
         """
-        str_traces_tp = self.extract_traces(labels).T.astype(str)
+        f = io.StringIO()
+        self.write_csv(f, labels, delim, fmt)
+        return f.getvalue()
 
-        if isinstance(labels, int) or \
-           isinstance(labels, float) or \
-           labels == '':
-            labels = [labels]
+    def write_csv(self, f, labels=None, delim=',', fmt=None):
+        """
+        Writes a CSV containing data for the specified :code:`labels` \
+            to a text file object.
+
+        Rows are formatted and written in blocks of about \
+            :code:`_CSV_BLOCK_SIZE` values, so the full data matrix is never \
+            converted to strings at once. 
+
+        By default, retention times and data values are written like \
+            :code:`str` does. With :code:`fmt`, data values are formatted \
+            like :code:`np.savetxt` does instead. Retention times are always \
+            written in full. 
+
+        Args:
+            f (file): Text file object to write to.
+            labels (int/float/list/numpy.ndarray, optional): Ylabel(s) to 
+                write.
+            delim (str, optional): Delimiter used in the CSV.
+            fmt (str, optional): %-style format for the data values 
+                (e.g. '%.6g'). 
 
+        """
         if labels is None:
+            indices = None
             labels = self.ylabels
+        else:
+            labels = _wrap_labels(labels)
+            indices = self._label_indices(np.asarray(labels))
 
         str_labels = [str(label) for label in labels]
+        f.write(f"RT (min){delim}{f'{delim}'.join(str_labels)}\n")
+
+        num_cols = len(str_labels)
+        if fmt is not None:
+            row_fmt = delim.join([fmt] * num_cols)
 
-        csvstr = f"RT (min){delim}{f'{delim}'.join(str_labels)}\n"
-        for i in range(self.xlabels.size):
-            csvstr += f"{self.xlabels[i]}{delim}" \
-                      f"{f'{delim}'.join(str_traces_tp[i])}\n"
-        return csvstr
+        step = max(1, _CSV_BLOCK_SIZE // max(1, num_cols))
+        for start in range(0, self.xlabels.size, step):
+            stop = start + step
+            block = self._row_block(start, stop)
+            if indices is not None:
+                block = block[:, indices]
+            str_times = [f"{time}" for time in self.xlabels[start:stop]]
+            if fmt is None:
+                str_rows = [delim.join(row) for row in block.astype(str)]
+            else:
+                str_rows = [row_fmt % tuple(row) for row in block]
+            f.write(''.join(f"{time}{delim}{row}\n"
+                            for time, row in zip(str_times, str_rows)))
+
+    def _row_block(self, start, stop):
+        """
+        Returns the dense data of rows :code:`start` to :code:`stop`.
+
+        """
+        return self.data[start:stop]
 
     def plot(self, label, **kwargs):
         """
@@ -152,4 +249,278 @@ class DataFile:
         """
         import matplotlib.pyplot as plt
         plt.plot(self.xlabels, self.extract_traces(label).T, **kwargs)
-        plt.show()
\ No newline at end of file
+        plt.show()
+
+class LazyDataFile(DataFile):
+    """
+    Class representing a chromatogram data file that is decoded on demand.
+
+    The name, detector, and metadata are known up front (usually from the \
+        file header). The retention times, ylabels, and data values are \
+        decoded by :obj:`loader` the first time any of them is accessed, \
+        and kept afterwards. Any other attribute of the decoded DataFile \
+        (e.g. :code:`scan` or :code:`indptr` of a SparseDataFile) is \
+        forwarded to it as well.
+
+    Args:
+        path (str): Path of the file.
+        detector (str): Detector for the file.
+        loader (callable): Function with no arguments that decodes the file \
+            and returns a DataFile.
+        metadata (dict): Metadata for the file.
+
+    Attributes:
+        name (str): Name of the file.
+        detector (str): Name of the detector. Options: UV, MS, FID, CAD, ELSD.
+        metadata (dict): Depends on the vendor and file format.
+        loaded (bool): Whether the file has been decoded.
+
+    """
+    def __init__(self, path, detector, loader, metadata):
+
+        if not isinstance(path, str) or \
+           not detector in {'UV', 'MS', 'FID', 'CAD', 'ELSD', None} or \
+           not callable(loader) or \
+           not isinstance(metadata, dict):
+            raise Exception("Wrong argument parameters for LazyDataFile.")
+
+        self.name = os.path.basename(path)
+        self.detector = detector
+        self.metadata = metadata
+        self._loader = loader
+        self._datafile = None
+        warnings.filterwarnings("ignore", category=FutureWarning)
+
+    @property
+    def loaded(self):
+        return self._datafile is not None
+
+    def load(self):
+        """
+        Decodes the file, if it has not been decoded yet.
+
+        Raises an exception if the file cannot be parsed.
+
+        Returns:
+            The decoded DataFile.
+
+        """
+        if self._datafile is None:
+            datafile = self._loader()
+            if datafile is None:
+                raise Exception(f"{self.name} cannot be parsed.")
+            self._datafile = datafile
+            self._loader = None
+        return self._datafile
+
+    @property
+    def xlabels(self):
+        return self.load().xlabels
+
+    @property
+    def ylabels(self):
+        return self.load().ylabels
+
+    @property
+    def data(self):
+        return self.load().data
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the stub itself. Private
+        # names are not forwarded, which also keeps copying and unpickling
+        # from decoding the file.
+        if name.startswith('_'):
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'")
+        return getattr(self.load(), name)
+
+    def get_info(self):
+        return self.load().get_info()
+
+    def extract_traces(self, labels=None):
+        return self.load().extract_traces(labels)
+
+    def tic(self):
+        return self.load().tic()
+
+    def _row_block(self, start, stop):
+        return self.load()._row_block(start, stop)
+
+
+class SparseDataFile(DataFile):
+    """
+    Class representing a chromatogram data file stored in sparse form.
+
+    Centroided and high-precision MS data is mostly zeros, so only the \
+        nonzero values are kept, in compressed sparse row (CSR) form: \
+        row :code:`i` has the values :code:`values[indptr[i]:indptr[i+1]]` \
+        at the ylabel indices :code:`indices[indptr[i]:indptr[i+1]]`.
+
+    :meth:`extract_traces`, :meth:`tic`, :meth:`scan`, and the CSV export \
+        work on the sparse arrays. Reading :code:`data` builds the dense \
+        matrix on every access.
+
+    Args:
+        path (str): Path of the file.
+        detector (str): Detector for the file.
+        xlabels (numpy.ndarray): 1D array with retention times (in minutes).
+        ylabels (numpy.ndarray): 1D array with y-axis labels
+            (e.g. mz, wavelength).
+        indptr (numpy.ndarray): 1D array with the start of each row in
+            :code:`indices` and :code:`values`, plus the end of the last row.
+        indices (numpy.ndarray): 1D array with the ylabel index of each value.
+        values (numpy.ndarray): 1D array with the nonzero data values.
+        metadata (dict): Metadata for the file.
+
+    Attributes:
+        name (str): Name of the file.
+        detector (str): Name of the detector. Options: UV, MS, FID, CAD, ELSD.
+        xlabels (numpy.ndarray): 1D array with retention times (in minutes).
+        ylabels (numpy.ndarray): 1D array with y-axis labels
+            (e.g. mz, wavelength).
+        indptr (numpy.ndarray): 1D array with the start of each row.
+        indices (numpy.ndarray): 1D array with the ylabel index of each value.
+        values (numpy.ndarray): 1D array with the nonzero data values.
+        metadata (dict): Depends on the vendor and file format.
+
+    """
+    def __init__(self, path, detector, xlabels, ylabels, indptr, indices,
+                 values, metadata):
+
+        if not isinstance(path, str) or \
+           not detector in {'UV', 'MS', 'FID', 'CAD', 'ELSD', None} or \
+           not isinstance(xlabels, np.ndarray) or xlabels.ndim != 1 or \
+           not isinstance(ylabels, np.ndarray) or ylabels.ndim != 1 or \
+           not isinstance(indptr, np.ndarray) or \
+           indptr.shape != (xlabels.size + 1,) or \
+           not isinstance(indices, np.ndarray) or indices.ndim != 1 or \
+           not isinstance(values, np.ndarray) or \
+           values.shape != indices.shape or \
+           not isinstance(metadata, dict):
+            raise Exception("Wrong argument parameters for SparseDataFile.")
+
+        self.name = os.path.basename(path)
+        self.detector = detector
+        self.xlabels = xlabels
+        self.ylabels = ylabels
+        self.indptr = indptr
+        self.indices = indices
+        self.values = values
+        self.metadata = metadata
+        warnings.filterwarnings("ignore", category=FutureWarning)
+
+    @property
+    def shape(self):
+        return (self.xlabels.size, self.ylabels.size)
+
+    @property
+    def data(self):
+        return self._row_block(0, self.xlabels.size)
+
+    def get_info(self):
+        """
+        Returns a string summary of the SparseDataFile.
+
+        """
+        return f"\n{'-' * len(self.name)}\n" \
+               f"{self.name}\n" \
+               f"{'-' * len(self.name)}\n" \
+               f"Detector: {self.detector}\n" \
+               f"Xlabels: {self.xlabels}\n" \
+               f"Ylabels: {self.ylabels}\n" \
+               f"Data: {self.values.size} nonzero values in a " \
+               f"{self.shape[0]} x {self.shape[1]} matrix\n" \
+               f"Metadata: {self.metadata}\n"
+
+    def extract_traces(self, labels=None):
+        """
+        Extracts data corresponding to the specified :code:`labels`.
+
+        Only the requested traces are made dense.
+
+        Raises an exception if any :code:`labels` are invalid.
+
+        Args:
+            labels (int/float/list/numpy.ndarray, optional): Ylabel(s) to
+                extract.
+
+        Returns:
+            2D numpy array containing data for the specified ylabel(s).
+            The rows correspond to the ylabels and the columns corrrespond \
+                to the retention times.
+
+        """
+        if labels is None:
+            return self.data.T
+
+        columns = self._label_indices(np.asarray(_wrap_labels(labels)))
+        unique, inverse = np.unique(columns, return_inverse=True)
+
+        # Map each ylabel index to its output row, or -1 if not requested.
+        slots = np.full(self.ylabels.size, -1, dtype=np.intp)
+        slots[unique] = np.arange(unique.size)
+        value_slots = slots[self.indices]
+        hits = np.flatnonzero(value_slots >= 0)
+        rows = np.searchsorted(self.indptr, hits, side='right') - 1
+
+        traces = np.zeros((unique.size, self.xlabels.size),
+                          dtype=self.values.dtype)
+        traces[value_slots[hits], rows] = self.values[hits]
+        return traces[inverse.ravel()]
+
+    def tic(self):
+        """
+        Returns the total ion current (the sum of each row of data).
+
+        Returns:
+            1D numpy array with the sum at each retention time.
+
+        """
+        sums = np.cumsum(self.values)
+        sums = np.concatenate((np.zeros(1, dtype=sums.dtype), sums))
+        return np.diff(sums[self.indptr])
+
+    def scan(self, i):
+        """
+        Returns the nonzero data of the row at index :code:`i`.
+
+        Args:
+            i (int): Index of the retention time.
+
+        Returns:
+            1D numpy array with ylabels. 1D numpy array with the data values.
+
+        """
+        start, stop = self.indptr[i], self.indptr[i + 1]
+        return self.ylabels[self.indices[start:stop]], self.values[start:stop]
+
+    def _row_block(self, start, stop):
+        stop = min(stop, self.xlabels.size)
+        lo, hi = self.indptr[start], self.indptr[stop]
+        block = np.zeros((stop - start, self.ylabels.size),
+                         dtype=self.values.dtype)
+        rows = np.repeat(np.arange(stop - start),
+                         np.diff(self.indptr[start:stop + 1]))
+        block[rows, self.indices[lo:hi]] = self.values[lo:hi]
+        return block
+
+
+def _wrap_labels(labels):
+    """
+    Wraps a single ylabel in a list and validates the type of :code:`labels`.
+
+    Args:
+        labels (int/float/list/numpy.ndarray): Ylabel(s).
+
+    Returns:
+        List or 1D numpy array of ylabels.
+
+    """
+    if isinstance(labels, (int, float, np.number)) or \
+       (isinstance(labels, str) and labels == ''):
+        labels = [labels]
+
+    if not isinstance(labels, (list, np.ndarray)) or np.ndim(labels) != 1:
+        raise Exception("Invalid type for labels.")
+
+    return labels
@@ -5,7 +5,8 @@ from rainbow.waters import masslynx
 from rainbow.datadirectory import DataDirectory
 
 
-def read(path, precision='auto', requested_files=None):
+def read(path, precision='auto', requested_files=None, lazy=False,
+         workers=None, sparse=False):
     """
     Reads a Waters .raw directory.
 
@@ -16,6 +17,11 @@ def read(path, precision='auto', requested_files=None):
             function (no per-scan drift is modelled), so Waters MS is treated as
             unit-resolution here.
         requested_files (list, optional): List of filenames to parse.
+        lazy (bool, optional): Flag for deferring decoding until the data is
+            first accessed.
+        workers (int, optional): Number of threads to decode files with.
+        sparse (bool, optional): Flag for storing MS spectra as
+            :class:`~rainbow.datafile.SparseDataFile` objects.
 
     Returns:
         DataDirectory representing the Waters .raw directory.
@@ -24,18 +30,56 @@ def read(path, precision='auto', requested_files=None):
     if precision == 'auto':
         precision = 0
     datafiles = []
-    datafiles.extend(masslynx.parse_spectrum(path, precision, requested_files))
-    datafiles.extend(masslynx.parse_analog(path, requested_files))
+    datafiles.extend(masslynx.parse_spectrum(
+        path, precision, requested_files, lazy=lazy, workers=workers,
+        sparse=sparse))
+    datafiles.extend(masslynx.parse_analog(
+        path, requested_files, lazy=lazy, workers=workers))
 
     metadata = masslynx.parse_metadata(path)
 
     return DataDirectory(path, datafiles, metadata)
 
 
+def inspect(path):
+    """
+    Reads the shape of each file in a Waters .raw directory without \
+        decoding any data.
+
+    Spectra are described from their _FUNC .IDX files and analog data from \
+        the size of each _CHRO .DAT file.
+
+    Args:
+        path (str): Path of the directory.
+
+    Returns:
+        List with a dictionary describing each file.
+
+    """
+    infos = [masslynx.inspect_function(funcdat_path, polarity)
+             for funcdat_path, polarity, _ in masslynx.find_functions(path)]
+
+    chroms_inf = masslynx._find_file_path(path, '_CHROMS.INF')
+    if chroms_inf is not None:
+        analog_info = masslynx.parse_chroinf(chroms_inf)
+        for i in range(len(analog_info)):
+            fn = masslynx._find_file(path, f"_CHRO{i + 1:0>3}.DAT")
+            if fn is None:
+                continue
+            info = masslynx.inspect_chrodat(
+                os.path.join(path, fn), *analog_info[i])
+            if info is not None:
+                infos.append(info)
+    return infos
+
+
 def read_metadata(path):
     """
     Reads metdata from a Waters .raw directory.
 
+    If _HEADER.TXT holds no metadata, the data files are listed as \
+        :class:`~rainbow.datafile.LazyDataFile` stubs. No data is decoded.
+
     Args:
         path (str): Path of the directory.
 
@@ -45,7 +89,7 @@ def read_metadata(path):
     datafiles = []
     metadata = masslynx.parse_metadata(path)
     if len(metadata) == 1:
-        datadir = read(path)
+        datadir = read(path, lazy=True)
         if datadir:
             return {'datafiles': datadir.datafiles + datadir.analog, 'metadata': metadata}
         return None
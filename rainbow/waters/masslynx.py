@@ -6,10 +6,11 @@ Patched to support case-insensitive filenames (e.g. Perkin-Elmer GC-MS).
 """
 import os
 import re
+from functools import partial
 import numpy as np
-from rainbow.datafile import DataFile
-from rainbow._binning import bin_datapairs
-import pandas as pd
+from rainbow.datafile import DataFile, LazyDataFile, SparseDataFile
+from rainbow._binning import bin_datapairs, csr_from_dense
+from rainbow._parallel import map_ordered
 
 
 # Lookup tables for the per-pair exponents in the 6-byte _FUNC.DAT format.
@@ -18,6 +19,9 @@ import pandas as pd
 _FUNC6_KEY_POW2 = 2.0 ** (np.arange(32) - 23)  # 2 ** (((raw & 0x1F0) >> 4) - 23)
 _FUNC6_VAL_POW4 = (4 ** np.arange(16)).astype(np.int64)  # 4 ** (raw & 0xF)
 
+# Offset of the first (time, value) record in a _CHRO .DAT file.
+_CHRODAT_START = 0x80
+
 
 def _find_file(directory, target_name):
     """
@@ -62,7 +66,8 @@ SPECTRUM PARSING METHODS
 """
 
 
-def parse_spectrum(path, precision=0, requested_files=None):
+def parse_spectrum(path, precision=0, requested_files=None, lazy=False,
+                   workers=None, sparse=False):
     """
     Finds and parses Waters UV and MS spectra from a .raw directory.
 
@@ -70,17 +75,51 @@ def parse_spectrum(path, precision=0, requested_files=None):
         It can be differentiated from low resolution MS data using the \
         _extern.inf or _FUNC .IDX files. 
 
+    With :obj:`lazy` set, each spectrum becomes a \
+        :class:`~rainbow.datafile.LazyDataFile` that is decoded the first \
+        time its data is accessed.
+
     Args:
         path (str): Path to the .raw directory. 
         precision (int, optional): Number of decimals to round ylabels.
         requested_files (list, optional): List of filenames to parse.
+        lazy (bool, optional): Flag for deferring decoding until first access.
+        workers (int, optional): Number of threads to decode spectra with. \
+            None decodes them one after another.
+        sparse (bool, optional): Flag for storing MS spectra as \
+            :class:`~rainbow.datafile.SparseDataFile` objects.
     
     Returns:
         List with a DataFile for each parsed spectrum.  
 
     """
-    datafiles = []
+    # Only MS spectra (those with a polarity) are stored sparsely.
+    functions = [
+        (funcdat_path, precision, polarity, calib, sparse and bool(polarity))
+        for funcdat_path, polarity, calib in find_functions(
+            path, requested_files)]
+
+    if lazy:
+        return [parse_function_lazy(*args) for args in functions]
+    return map_ordered(lambda args: parse_function(*args), functions, workers)
+
+
+def find_functions(path, requested_files=None):
+    """
+    Finds the Waters functions of a .raw directory.
 
+    The polarity of each MS function is read from _extern.inf and its \
+        calibration values from _HEADER.txt.
+
+    Args:
+        path (str): Path to the .raw directory.
+        requested_files (list, optional): List of filenames to include.
+
+    Returns:
+        List with a tuple of the _FUNC .DAT path, polarity, and calibration \
+            values of each function. The polarity is None for UV functions.
+
+    """
     # There is MS spectrum data if and only if there is an _extern.inf file.
     # The file stores information about each MS spectrum, like polarity.
     # Future work may find useful metadata there. 
@@ -134,6 +173,7 @@ def parse_spectrum(path, precision=0, requested_files=None):
     functns_inf = _find_file_path(path, '_FUNCTNS.INF')
     if functns_inf is not None:
         assert (os.path.getsize(functns_inf) == 32 * 13 * len(funcdat_files))
+    functions = []
     for funcdat_index, funcdat_file in enumerate(funcdat_files):
         if requested_files and funcdat_file.lower() not in requested_files:
             continue
@@ -145,12 +185,12 @@ def parse_spectrum(path, precision=0, requested_files=None):
             polarity = polarities[funcdat_index]
             if funcdat_index < len(calib_nums):
                 calib = calib_nums[funcdat_index]
-        datafile = parse_function(os.path.join(path, funcdat_file), precision, polarity, calib)
-        datafiles.append(datafile)
-    return datafiles
+        functions.append((os.path.join(path, funcdat_file), polarity, calib))
+    return functions
 
 
-def parse_function(path, precision=0, polarity=None, calib=None):
+def parse_function(path, precision=0, polarity=None, calib=None,
+                   sparse=False):
     """
     Parses data for a Waters function. 
 
@@ -166,6 +206,8 @@ def parse_function(path, precision=0, polarity=None, calib=None):
         precision (int, optional): Number of decimals to round ylabels.
         polarity (str, optional): Polarity of the spectrum.
         calib (list, optional): Float calibration values of the spectrum.
+        sparse (bool, optional): Flag for returning a \
+            :class:`~rainbow.datafile.SparseDataFile`.
     
     Returns:
         DataFile with MS or UV spectrum data. 
@@ -192,15 +234,78 @@ def parse_function(path, precision=0, polarity=None, calib=None):
         parse_funcdat = parse_funcdat8
     elif bytes_per_pair == 4:
         parse_funcdat = parse_funcdat4
-    ylabels, data = parse_funcdat(path, pair_counts, precision, calib)
+    ylabels, data = parse_funcdat(path, pair_counts, precision, calib, sparse)
 
     # Spectra without an assigned polarity always contain UV data.
     detector = 'MS' if polarity else 'UV'
     metadata = {'polarity': polarity} if polarity else {}
 
+    if sparse:
+        return SparseDataFile(
+            path, detector, times, ylabels, *data, metadata)
     return DataFile(path, detector, times, ylabels, data, metadata)
 
 
+def parse_function_lazy(path, precision=0, polarity=None, calib=None,
+                        sparse=False):
+    """
+    Defers parsing a Waters function until its data is accessed.
+
+    Args:
+        path (str): Path to the _FUNC .DAT file.
+        precision (int, optional): Number of decimals to round ylabels.
+        polarity (str, optional): Polarity of the spectrum.
+        calib (list, optional): Float calibration values of the spectrum.
+        sparse (bool, optional): Flag for decoding into a \
+            :class:`~rainbow.datafile.SparseDataFile`.
+
+    Returns:
+        LazyDataFile with MS or UV spectrum data.
+
+    """
+    # The detector and metadata only depend on the polarity.
+    detector = 'MS' if polarity else 'UV'
+    metadata = {'polarity': polarity} if polarity else {}
+    return LazyDataFile(
+        path, detector,
+        partial(parse_function, path, precision, polarity, calib, sparse),
+        metadata)
+
+
+def inspect_function(path, polarity=None):
+    """
+    Reads the shape of a Waters function from its _FUNC .IDX file, \
+        without reading the _FUNC .DAT file.
+
+    The .IDX file stores the number of data pairs at each time but not \
+        their ylabels, so the ylabel range is not known. The largest pair \
+        count is used as an estimate of the number of ylabels.
+
+    Args:
+        path (str): Path to the _FUNC .DAT file.
+        polarity (str, optional): Polarity of the spectrum.
+
+    Returns:
+        Dictionary describing the function.
+
+    """
+    root, _ = os.path.splitext(os.path.basename(path))
+    idx_path = _find_file_path(os.path.dirname(path), root + '.IDX')
+    if idx_path is None:
+        idx_path = path[:-3] + 'IDX'
+    times, pair_counts, _ = parse_funcidx(idx_path)
+    num_ylabels = int(pair_counts.max()) if pair_counts.size else 0
+    return {
+        'name': os.path.basename(path),
+        'detector': 'MS' if polarity else 'UV',
+        'num_times': times.size,
+        'rt_range': (float(times[0]), float(times[-1])) if times.size else None,
+        'ylabel_range': None,
+        'num_ylabels': num_ylabels,
+        'decoded_bytes': times.size * num_ylabels * 8
+    }
+
+
 def parse_funcidx(path):
     """ 
     Parses a Waters _FUNC .IDX file. 
@@ -240,7 +345,8 @@ def parse_funcidx(path):
     return times, pair_counts, bytes_per_pair
 
 
-def parse_funcdat2(path, pair_counts, precision=0, calib=None):
+def parse_funcdat2(path, pair_counts, precision=0, calib=None,
+                   sparse=False):
     """
     Parses a Waters _FUNC .DAT file with the 2-bytes format. 
 
@@ -254,6 +360,8 @@ def parse_funcdat2(path, pair_counts, precision=0, calib=None):
             1D array with the number of data pairs at each retention time.
         precision (int, optional): Number of decimals to round ylabels. 
         calib (list, optional): Float calibration values of the spectrum.
+        sparse (bool, optional): Flag for returning the data as \
+            (indptr, indices, values) CSR arrays.
     
     Returns: 
         1D numpy array with ylabels. 2D numpy array with \
@@ -284,10 +392,13 @@ def parse_funcdat2(path, pair_counts, precision=0, calib=None):
     # This may need to be reshaped differently in the future. 
     data = values.reshape((pair_counts.size, ylabels.size))
 
+    if sparse:
+        return ylabels, csr_from_dense(data)
     return ylabels, data
 
 
-def parse_funcdat4(path, pair_counts, precision=0, calib=None):
+def parse_funcdat4(path, pair_counts, precision=0, calib=None,
+                   sparse=False):
     """
     Parses a Waters _FUNC .DAT file with the 4-bytes format.
 
@@ -301,6 +412,8 @@ def parse_funcdat4(path, pair_counts, precision=0, calib=None):
             1D array with the number of data pairs at each retention time.
         precision (int, optional): Number of decimals to round ylabels.
         calib (list, optional): Float calibration values of the spectrum.
+        sparse (bool, optional): Flag for returning the data as \
+            (indptr, indices, values) CSR arrays.
 
     Returns:
         1D numpy array with ylabels. 2D numpy array with data values \
@@ -344,6 +457,8 @@ def parse_funcdat4(path, pair_counts, precision=0, calib=None):
 
     del val_bases, val_powers, raw_values, raw_bytes
 
+    if sparse:
+        return ylabels, csr_from_dense(data)
     return ylabels, data
 
 
@@ -369,7 +484,8 @@ def parse_funcinf(path):
     return mzs
 
 
-def parse_funcdat6(path, pair_counts, precision=0, calib=None):
+def parse_funcdat6(path, pair_counts, precision=0, calib=None,
+                   sparse=False):
     """
     Parses a Waters _FUNC .DAT file with the 6-bytes format. 
 
@@ -383,6 +499,8 @@ def parse_funcdat6(path, pair_counts, precision=0, calib=None):
             1D array with the number of data pairs at each retention time.
         precision (int, optional): Number of decimals to round ylabels. 
         calib (list, optional): Float calibration values of the spectrum.
+        sparse (bool, optional): Flag for returning the data as \
+            (indptr, indices, values) CSR arrays.
     
     Returns: 
         1D numpy array with ylabels. 2D numpy array with data values \
@@ -416,10 +534,11 @@ def parse_funcdat6(path, pair_counts, precision=0, calib=None):
     values = val_bases * _FUNC6_VAL_POW4[raw_values & 0xF]
     del val_bases, raw_values, raw_bytes
 
-    return bin_datapairs(keys, values, pair_counts, precision)
+    return bin_datapairs(keys, values, pair_counts, precision, sparse=sparse)
 
 
-def parse_funcdat8(path, pair_counts, precision=0, calib=None):
+def parse_funcdat8(path, pair_counts, precision=0, calib=None,
+                   sparse=False):
     """
     Parses a Waters _FUNC .DAT file with the 8-bytes format. 
 
@@ -433,6 +552,8 @@ def parse_funcdat8(path, pair_counts, precision=0, calib=None):
             1D array with the number of data pairs at each retention time.
         precision (int, optional): Number of decimals to round ylabels. 
         calib (list, optional): Float calibration values of the spectrum.
+        sparse (bool, optional): Flag for returning the data as \
+            (indptr, indices, values) CSR arrays.
     
     Returns: 
         1D numpy array with ylabels. 2D numpy array with \
@@ -495,7 +616,7 @@ def parse_funcdat8(path, pair_counts, precision=0, calib=None):
     values = valints + valfracs
     del valints, valfracs
 
-    return bin_datapairs(keys, values, pair_counts, precision)
+    return bin_datapairs(keys, values, pair_counts, precision, sparse=sparse)
 
 
 def calibrate(mzs, calib_nums):
@@ -556,25 +677,27 @@ ANALOG PARSING METHODS
 """
 
 
-def parse_analog(path, requested_files=None):
+def parse_analog(path, requested_files=None, lazy=False, workers=None):
     """
     Finds and parses analog data from a Waters .raw directory.
 
     Args:
         path (str): Path to the .raw directory.
         requested_files (list, optional): List of filenames to parse.
+        lazy (bool, optional): Flag for deferring decoding until first access.
+        workers (int, optional): Number of threads to decode files with. \
+            None decodes them one after another.
     
     Returns:
         List of DataFiles that contain analog data. 
 
     """
-    datafiles = []
-
     chroms_inf = _find_file_path(path, '_CHROMS.INF')
     if chroms_inf is None:
-        return datafiles
+        return []
 
     analog_info = parse_chroinf(chroms_inf)
+    chrodats = []
     for i in range(len(analog_info)):
         fn = f"_CHRO{i + 1:0>3}.DAT"
         actual_fn = _find_file(path, fn)
@@ -582,10 +705,11 @@ def parse_analog(path, requested_files=None):
             continue
         if requested_files and fn.lower() not in requested_files:
             continue
-        datafile = parse_chrodat(os.path.join(path, actual_fn), *analog_info[i])
-        if datafile:
-            datafiles.append(datafile)
-    return datafiles
+        chrodats.append((os.path.join(path, actual_fn), *analog_info[i]))
+
+    parse = parse_chrodat_lazy if lazy else parse_chrodat
+    datafiles = map_ordered(lambda args: parse(*args), chrodats, workers)
+    return [datafile for datafile in datafiles if datafile]
 
 
 def parse_chroinf(path):
@@ -639,16 +763,15 @@ def parse_chrodat(path, name, units=None):
         DataFile with analog data, if the file can be parsed. Otherwise, None.
 
     """
-    data_start = 0x80
-
-    num_times = (os.path.getsize(path) - data_start) // 8
+    num_times = (os.path.getsize(path) - _CHRODAT_START) // 8
     if num_times == 0:
         return None
 
     with open(path, 'rb') as f:
         raw_bytes = f.read()
-    times_immut = np.ndarray(num_times, '<f', raw_bytes, data_start, 8)
-    vals_immut = np.ndarray(num_times, '<f', raw_bytes, data_start + 4, 8)
+    times_immut = np.ndarray(num_times, '<f', raw_bytes, _CHRODAT_START, 8)
+    vals_immut = np.ndarray(
+        num_times, '<f', raw_bytes, _CHRODAT_START + 4, 8)
 
     # The arrays are copied so that they are mutable. 
     # This is just for user convenience. 
@@ -656,6 +779,80 @@ def parse_chrodat(path, name, units=None):
     vals = vals_immut.copy().reshape(-1, 1)
     del times_immut, vals_immut, raw_bytes
 
+    detector, metadata = chrodat_info(name, units)
+    ylabels = np.array([''])
+
+    return DataFile(path, detector, times, ylabels, vals, metadata)
+
+
+def parse_chrodat_lazy(path, name, units=None):
+    """
+    Defers parsing a Waters _CHRO .DAT file until its data is accessed.
+
+    Args:
+        path (str): Path to the _CHRO .DAT file.
+        name (str): Name of the analog data.
+        units (str, optional): Units of the analog data.
+
+    Returns:
+        LazyDataFile with analog data, if the file is not empty. \
+            Otherwise, None.
+
+    """
+    if (os.path.getsize(path) - _CHRODAT_START) // 8 == 0:
+        return None
+    detector, metadata = chrodat_info(name, units)
+    return LazyDataFile(
+        path, detector, partial(parse_chrodat, path, name, units), metadata)
+
+
+def inspect_chrodat(path, name, units=None):
+    """
+    Reads the shape of a Waters _CHRO .DAT file from its size and its \
+        first and last records.
+
+    Args:
+        path (str): Path to the _CHRO .DAT file.
+        name (str): Name of the analog data.
+        units (str, optional): Units of the analog data.
+
+    Returns:
+        Dictionary describing the file, if it is not empty. Otherwise, None.
+
+    """
+    num_times = (os.path.getsize(path) - _CHRODAT_START) // 8
+    if num_times == 0:
+        return None
+    with open(path, 'rb') as f:
+        f.seek(_CHRODAT_START)
+        start_time = np.frombuffer(f.read(4), '<f')[0]
+        f.seek(_CHRODAT_START + (num_times - 1) * 8)
+        end_time = np.frombuffer(f.read(4), '<f')[0]
+    detector, _ = chrodat_info(name, units)
+    return {
+        'name': os.path.basename(path),
+        'detector': detector,
+        'num_times': num_times,
+        'rt_range': (float(start_time), float(end_time)),
+        'ylabel_range': None,
+        'num_ylabels': 1,
+        'decoded_bytes': num_times * 4
+    }
+
+
+def chrodat_info(name, units=None):
+    """
+    Determines the detector and metadata of a Waters _CHRO .DAT file.
+
+    Args:
+        name (str): Name of the analog data.
+        units (str, optional): Units of the analog data.
+
+    Returns:
+        Tuple of the detector (None for miscellaneous analog data) and \
+            a metadata dictionary.
+
+    """
     # A `detector` value of None corresponds to miscellaneous analog data.
     detector = None
     if "CAD" in name:
@@ -665,12 +862,10 @@ def parse_chrodat(path, name, units=None):
     elif "nm@" in name:
         detector = 'UV'
 
-    ylabels = np.array([''])
     metadata = {'signal': name}
     if units:
         metadata['unit'] = units
-
-    return DataFile(path, detector, times, ylabels, vals, metadata)
+    return detector, metadata
 
 
 """ 
@@ -720,6 +915,8 @@ def parse_metadata(path):
 
 
 def parse_compound_names(path):
+    # pandas is slow to import and only needed here.
+    import pandas as pd
     cmp_file = _find_file_path(path, '_FUNC001.CMP')
     if cmp_file is None:
         cmp_file = os.path.join(path, "_FUNC001.CMP")
@@ -3,7 +3,8 @@ Build hook for the optional compiled accelerators.
 
 Project metadata lives in ``pyproject.toml``; this file exists only to compile
 the optional Cython extensions that speed up Agilent decoding (the ``.uv`` and
-``.ch`` delta loops and the MassHunter ``MSProfile.bin`` run-length decode).
+``.ch`` delta loops, the FID ``.ch`` double-delta loop, and the MassHunter
+``MSProfile.bin`` run-length decode).
 Each extension is marked ``optional`` so that a missing compiler (or missing
 Cython) never breaks installation -- the package falls back to pure Python.
 """
@@ -16,6 +17,7 @@ _EXTENSIONS = {
     "rainbow.agilent._uvdelta": "rainbow/agilent/_uvdelta.pyx",
     "rainbow.agilent._msprofile": "rainbow/agilent/_msprofile.pyx",
     "rainbow.agilent._chdelta": "rainbow/agilent/_chdelta.pyx",
+    "rainbow.agilent._chdoubledelta": "rainbow/agilent/_chdoubledelta.pyx",
 }
 
 ext_modules = []
@@ -15,6 +15,17 @@ method_to_time = None
 
 memory_benchmark = False
 
+# Times `import rainbow` in fresh interpreters. The vendor parsers, lxml and
+# pandas should not be imported until a file that needs them is read.
+import_benchmark = False
+import_runs = 10
+
+# Times the compiled decoders on a thread pool. They release the GIL, so the
+# throughput should scale with the number of threads up to the core count.
+thread_benchmark = False
+thread_file = "tests/inputs/red.D/DAD1.UV"
+thread_repeats = 200
+
 DATASET = "MY_DATASET"
 dirpaths = [os.path.join(DATASET, name) for name in os.listdir(DATASET)
             if name != ".DS_Store"]
@@ -51,6 +62,58 @@ def display_top(snapshot, key_type='lineno', limit=3):
     total = sum(stat.size for stat in top_stats)
     print(f"Total allocated size: {total / (1024 * 1024) :.3f} MiB")
 
+def time_import(runs):
+    """
+    Times `import rainbow` in fresh interpreters and lists heavy modules \
+        that it imported.
+
+    """
+    import subprocess
+    import sys
+    code = ("import sys, time; t = time.perf_counter(); import rainbow; "
+            "print(time.perf_counter() - t); "
+            "print(' '.join(m for m in ('rainbow.agilent', 'rainbow.waters', "
+            "'lxml', 'pandas') if m in sys.modules))")
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], check=True,
+                             capture_output=True, text=True).stdout.split('\n')
+        times.append(float(out[0]))
+    times.sort()
+    print(f"import rainbow: {times[len(times) // 2] * 1000 :.1f} ms (median)")
+    print(f"Eagerly imported: {out[1] or 'none'}")
+
+def time_threads(path, repeats):
+    """
+    Times the compiled .uv decoder on thread pools of increasing size.
+
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from rainbow.agilent import chemstation
+    if chemstation._uvdelta_fast is None:
+        print("The compiled .uv decoder is not built.")
+        return
+    with open(path, 'rb') as f:
+        buf = f.read()
+    num_times, num_wavelengths = chemstation.parse_uv(path).data.shape
+
+    def decode(_):
+        chemstation._uvdelta_fast.decode_uv_delta(
+            buf, 0x1000, num_times, num_wavelengths)
+
+    base = None
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        with ThreadPoolExecutor(workers) as pool:
+            start = time.perf_counter()
+            list(pool.map(decode, range(repeats)))
+            elapsed = time.perf_counter() - start
+        base = base or elapsed
+        print(f"{workers} threads: {elapsed * 1000 :.1f} ms "
+              f"({base / elapsed :.2f}x)")
+        workers *= 2
+
 def main():
     """
     Run tests in here. 
@@ -72,6 +135,12 @@ def main():
 
 if __name__ == '__main__':
 
+    if import_benchmark:
+        time_import(import_runs)
+
+    if thread_benchmark:
+        time_threads(thread_file, thread_repeats)
+
     if time_benchmark:
         if time_by_line: 
             from line_profiler import LineProfiler
@@ -3,11 +3,17 @@ Tests for the optional compiled accelerators.
 
 These verify the contract that matters for the optional extensions: when a
 compiled accelerator (:mod:`rainbow.agilent._uvdelta` for .uv decoding,
+:mod:`rainbow.agilent._chdoubledelta` for FID .ch decoding,
 :mod:`rainbow.agilent._msprofile` for MassHunter MSProfile.bin) is present, it
 produces output bit-identical to the pure-Python fallback, and it fails safely
 on malformed input rather than reading out of bounds. The tests skip themselves
 when an extension was not built.
+
+The NumPy decoders used when an extension was not built are checked the same
+way against the one-value-at-a-time reference loops.
 """
+import io
+import struct
 from pathlib import Path
 
 import numpy as np
@@ -103,7 +109,6 @@ def test_ch_fast_matches_pure_python(color):
     cs._chdelta_fast is None, reason="compiled accelerator not built")
 def test_ch_decode_delta_matches_reference():
     """The decode matches a hand-rolled reference, incl. the sentinel."""
-    import struct
     # Two segments; the second sample uses the -0x8000 absolute sentinel.
     body = (struct.pack('>BB', 0x10, 3)
             + struct.pack('>h', 5) + struct.pack('>h', 10)
@@ -120,13 +125,70 @@ def test_ch_decode_delta_matches_reference():
     cs._chdelta_fast is None, reason="compiled accelerator not built")
 def test_ch_truncated_input_is_safe():
     """A stream that ends mid-record stops instead of reading OOB."""
-    import struct
     # Header promises 4 samples but only one delta follows.
     truncated = struct.pack('>BB', 0x10, 4) + struct.pack('>h', 7)
     out = cs._chdelta_fast.decode_delta(truncated, 0)
     np.testing.assert_array_equal(out, [7])
 
 
+def _double_delta_stream(seed, num_values):
+    """Build a random FID double-delta stream, including absolute values."""
+    rng = np.random.default_rng(seed)
+    body = bytearray()
+    for _ in range(num_values):
+        if rng.random() < 0.05:
+            high, low = rng.integers(-2 ** 15, 2 ** 15), \
+                rng.integers(-2 ** 31, 2 ** 31)
+            body += struct.pack('>hhi', 0x7fff, high, low)
+        else:
+            body += struct.pack('>h', rng.integers(-2 ** 15, 0x7fff))
+    return bytes(body)
+
+
+def _decode_double_delta_pure_python(buf, offset):
+    """Decode with the accelerator temporarily disabled."""
+    saved = cs._chdoubledelta_fast
+    cs._chdoubledelta_fast = None
+    try:
+        return cs.decode_double_delta(io.BytesIO(buf), offset)
+    finally:
+        cs._chdoubledelta_fast = saved
+
+
+def test_ch_decode_double_delta_reference():
+    """The pure-Python decode matches a hand-rolled reference."""
+    # Second differences 3, 1; an absolute value (1 << 32 | -2); then 5.
+    body = (b'\x00' * 4 + struct.pack('>hh', 3, 1)
+            + struct.pack('>hhi', 0x7fff, 1, -2) + struct.pack('>h', 5))
+    expected = [3, 7, 1 << 32 | -2, (1 << 32 | -2) + 5]
+    assert list(_decode_double_delta_pure_python(body, 4)) == expected
+    np.testing.assert_array_equal(
+        cs.decode_double_delta(io.BytesIO(body), 4), expected)
+
+
+@pytest.mark.skipif(
+    cs._chdoubledelta_fast is None, reason="compiled accelerator not built")
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_ch_double_delta_fast_matches_pure_python(seed):
+    """Compiled output is bit-identical to the pure-Python reference."""
+    body = b'\x00' * 0x1800 + _double_delta_stream(seed, 20000)
+    fast = cs._chdoubledelta_fast.decode_double_delta(body, 0x1800)
+    slow = _decode_double_delta_pure_python(body, 0x1800)
+    assert fast.dtype == np.int64
+    np.testing.assert_array_equal(fast, slow)
+    np.testing.assert_array_equal(
+        fast.astype(np.float64), np.array(slow, dtype=np.float64))
+
+
+@pytest.mark.skipif(
+    cs._chdoubledelta_fast is None, reason="compiled accelerator not built")
+def test_ch_double_delta_truncated_input_is_safe():
+    """A stream that ends mid-record stops instead of reading OOB."""
+    truncated = struct.pack('>hh', 2, 0x7fff) + b'\x00\x01'
+    out = cs._chdoubledelta_fast.decode_double_delta(truncated, 0)
+    np.testing.assert_array_equal(out, [2])
+
+
 # MassHunter Q-TOF profile fixtures whose run-length-encoded MSProfile.bin
 # exercises the _msprofile accelerator.
 MSPROFILE_FIXTURES = ["magenta.D", "cyan.D"]
@@ -160,7 +222,6 @@ def test_msprofile_fast_matches_pure_python(fixture):
     mh._msprofile_fast is None, reason="compiled accelerator not built")
 def test_msprofile_malformed_input_raises():
     """A bad width flag raises ValueError, like the pure-Python path."""
-    import struct
     # Point-count word, negated leading-zero count, then a token stream that
     # opens at 4-byte width. A control with remainder 0 (-4 -> width flag 0) is
     # an invalid zero-width switch.
@@ -168,3 +229,212 @@ def test_msprofile_malformed_input_raises():
            + struct.pack('<i', 0) + struct.pack('<i', -4))
     with pytest.raises(ValueError):
         mh._msprofile_fast.decompress_inten_list(memoryview(bad), 5)
+
+
+@pytest.mark.skipif(
+    mh._msprofile_fast is None, reason="compiled accelerator not built")
+def test_msprofile_fast_decodes_into_out():
+    """Decoding into a preallocated row overwrites it like a fresh array."""
+    body, num_mz = next(_msprofile_segments("magenta.D"))
+    expected = mh._msprofile_fast.decompress_inten_list(body, num_mz)
+    rows = np.full((2, num_mz), 7, dtype=np.uint32)
+    row = rows[1]
+    assert mh._msprofile_fast.decompress_inten_list(body, num_mz, row) is row
+    np.testing.assert_array_equal(rows[1], expected)
+    np.testing.assert_array_equal(rows[0], 7)
+    with pytest.raises(ValueError):
+        mh._msprofile_fast.decompress_inten_list(
+            body, num_mz, np.empty(num_mz - 1, dtype=np.uint32))
+
+
+@pytest.mark.skipif(
+    cs._uvdelta_fast is None or cs._chdelta_fast is None
+    or mh._msprofile_fast is None, reason="compiled accelerator not built")
+def test_fast_decoders_in_threads():
+    """Decoding on a thread pool, without the GIL, matches serial output."""
+    from concurrent.futures import ThreadPoolExecutor
+    with open("tests/inputs/red.D/DAD1.UV", 'rb') as f:
+        uv = f.read()
+    with open("tests/inputs/red.D/ADC1A.CH", 'rb') as f:
+        ch = f.read()
+    segments = list(_msprofile_segments("magenta.D"))
+    jobs = [
+        lambda: cs._uvdelta_fast.decode_uv_delta(uv, 0x1000, 2100, 106)[1],
+        lambda: cs._chdelta_fast.decode_delta(ch, 0x1800),
+    ] + [
+        lambda body=body, num_mz=num_mz:
+            mh._msprofile_fast.decompress_inten_list(body, num_mz)
+        for body, num_mz in segments
+    ]
+    serial = [job() for job in jobs]
+    with ThreadPoolExecutor(4) as pool:
+        threaded = list(pool.map(lambda job: job(), jobs * 4))
+    for i, result in enumerate(threaded):
+        np.testing.assert_array_equal(result, serial[i % len(jobs)])
+    with ThreadPoolExecutor(2) as pool:
+        with pytest.raises(ValueError):
+            pool.submit(cs._uvdelta_fast.decode_uv_delta,
+                        b"\x00" * 64, 0, 100, 106).result()
+
+
+def _parse_with(monkeypatch, parse, path, name, decoder):
+    """Parse with every accelerator disabled and one decoder swapped in."""
+    with monkeypatch.context() as m:
+        m.setattr(cs, "_uvdelta_fast", None)
+        m.setattr(cs, "_chdelta_fast", None)
+        m.setattr(cs, name, decoder)
+        return parse(path)
+
+
+@pytest.mark.parametrize("color", ["brown", "red"])
+def test_uv_numpy_matches_loop(monkeypatch, color):
+    """The NumPy .uv decoder is bit-identical to the reference loop."""
+    path = _uv_path(color)
+    fast = _parse_with(
+        monkeypatch, cs.parse_uv, path, "decode_uv_delta", cs.decode_uv_delta)
+    slow = _parse_with(monkeypatch, cs.parse_uv, path, "decode_uv_delta",
+                       cs._decode_uv_delta_loop)
+    np.testing.assert_array_equal(fast.data, slow.data)
+    np.testing.assert_array_equal(fast.xlabels, slow.xlabels)
+
+
+@pytest.mark.parametrize("columns", [[0], [3, 50, 105], []])
+def test_uv_column_selection_matches_full_decode(columns):
+    """Every decoder stores exactly the selected columns of the full decode."""
+    path = _uv_path("red")
+    with open(path, 'rb') as f:
+        buf = f.read()
+        _, full = cs._decode_uv_delta_loop(f, {'data_start': 0x1000}, 2100, 106)
+    columns = np.array(columns, dtype=np.int64)
+    decoders = [cs._decode_uv_delta_numpy]
+    if cs._uvdelta_fast is not None:
+        decoders.append(cs._uvdelta_fast.decode_uv_delta)
+    for decode in decoders:
+        _, data = decode(buf, 0x1000, 2100, 106, columns)
+        np.testing.assert_array_equal(data, full[:, columns])
+    if cs._uvdelta_fast is not None:
+        _, data = cs._uvdelta_fast.decode_uv_delta_stream(
+            buf, 0x1000, 106, columns)
+        np.testing.assert_array_equal(data[:2100], full[:, columns])
+
+
+def test_uv_numpy_blocks_match_loop(monkeypatch):
+    """Decoding in blocks of rows gives the same output."""
+    path = _uv_path("brown")
+    fast = cs.parse_uv(path)
+    monkeypatch.setattr(cs, "_uvdelta_fast", None)
+    monkeypatch.setattr(cs, "_UV_BLOCK_VALUES", 1000)
+    np.testing.assert_array_equal(cs.parse_uv(path).data, fast.data)
+
+
+def test_uv_numpy_truncated_input_raises():
+    """A stream that ends mid-record raises, like the accelerator."""
+    with pytest.raises(ValueError):
+        cs._decode_uv_delta_numpy(b"\x00" * 64, 0, 100, 106)
+
+
+@pytest.mark.parametrize("color", CH_FIXTURES)
+def test_ch_numpy_matches_loop(monkeypatch, color):
+    """The NumPy .ch decoder is bit-identical to the reference loop."""
+    for path in _ch_paths(color):
+        fast = _parse_with(
+            monkeypatch, cs.parse_ch, path, "decode_delta", cs.decode_delta)
+        if fast is None or fast.detector == 'FID':
+            continue
+        slow = _parse_with(monkeypatch, cs.parse_ch, path, "decode_delta",
+                           cs._decode_delta_loop)
+        np.testing.assert_array_equal(fast.data, slow.data)
+
+
+def _delta_stream(seed, num_segments):
+    """Random .ch delta segments, including escaped absolute values whose
+    words equal the -0x8000 escape."""
+    rng = np.random.default_rng(seed)
+    body = b''
+    for _ in range(num_segments):
+        count = int(rng.integers(1, 256))
+        body += struct.pack('>BB', 0x10, count)
+        for _ in range(count):
+            if rng.random() < 0.1:
+                value = int(rng.choice([-0x80000000, -0x7FFF8000,
+                                        int(rng.integers(-2**31, 2**31))]))
+                body += struct.pack('>hi', -0x8000, value)
+            else:
+                body += struct.pack('>h', int(rng.integers(-0x7FFF, 0x8000)))
+    return body + b'\x00\x00'
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_ch_numpy_matches_loop_random(seed):
+    """The NumPy .ch decoder matches the loop on random streams."""
+    body = _delta_stream(seed, 50)
+    fast = cs._decode_delta_numpy(body, 0)
+    slow = cs._decode_delta_loop(io.BytesIO(body), 0)
+    np.testing.assert_array_equal(fast, slow)
+
+
+def test_ch_numpy_truncated_input_is_safe():
+    """A stream that ends mid-record keeps the complete samples."""
+    truncated = struct.pack('>BB', 0x10, 4) + struct.pack('>h', 7)
+    np.testing.assert_array_equal(cs._decode_delta_numpy(truncated, 0), [7])
+    truncated += struct.pack('>h', -0x8000) + b'\x00\x01'
+    np.testing.assert_array_equal(cs._decode_delta_numpy(truncated, 0), [7])
+
+
+@pytest.mark.parametrize("fixture", MSPROFILE_FIXTURES)
+def test_msprofile_numpy_matches_loop(fixture):
+    """The NumPy RLE decoder is bit-identical to the reference loop."""
+    for body, num_mz in _msprofile_segments(fixture):
+        fast = mh._decompress_inten_list_numpy(body, num_mz)
+        slow = mh.decompress_inten_list(body, num_mz)
+        np.testing.assert_array_equal(fast, slow)
+        assert fast.dtype == slow.dtype
+
+
+def _rle_stream(seed, num_tokens):
+    """A random RLE intensity stream and its point count."""
+    rng = np.random.default_rng(seed)
+    formats = {1: '<b', 2: '<h', 3: '<i'}
+    body = b''
+    num_mz = int(rng.integers(0, 5))
+    width_flag = 3
+    for _ in range(num_tokens):
+        fmt = formats[width_flag]
+        if rng.random() < 0.3:
+            num_zeros = int(rng.integers(0, 20))
+            width_flag = int(rng.integers(1, 4))
+            body += struct.pack(fmt, -(num_zeros * 4 + width_flag))
+            num_mz += num_zeros
+        else:
+            high = 2 ** (8 * struct.calcsize(fmt) - 1)
+            body += struct.pack(fmt, int(rng.integers(0, high)))
+            num_mz += 1
+    header = struct.pack('<I', num_mz | 0x90 << 24) + struct.pack('<i', -3)
+    return header + body, num_mz + 3 + int(rng.integers(0, 5))
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2, 3])
+def test_msprofile_numpy_matches_loop_random(seed):
+    """The NumPy RLE decoder matches the loop on random streams."""
+    stream, num_mz = _rle_stream(seed, 2000)
+    fast = mh._decompress_inten_list_numpy(memoryview(stream), num_mz)
+    slow = mh.decompress_inten_list(memoryview(stream), num_mz)
+    np.testing.assert_array_equal(fast, slow)
+
+
+@pytest.mark.parametrize("stream, num_mz", [
+    # A control with width flag 0.
+    (struct.pack('<Ii', 5 | 0x90 << 24, 0) + struct.pack('<i', -4), 5),
+    # More literals than points.
+    (struct.pack('<Ii', 1 | 0x90 << 24, 0) + struct.pack('<ii', 1, 2), 1),
+    # A token cut off by the end of the segment.
+    (struct.pack('<Ii', 5 | 0x90 << 24, 0) + struct.pack('<ih', 1, 2), 5),
+    # A positive leading-zero count.
+    (struct.pack('<Ii', 5 | 0x90 << 24, 2), 5),
+])
+def test_msprofile_numpy_malformed_input_raises(stream, num_mz):
+    """Malformed streams raise ValueError, like the reference loop."""
+    with pytest.raises(ValueError):
+        mh.decompress_inten_list(memoryview(stream), num_mz)
+    with pytest.raises(ValueError):
+        mh._decompress_inten_list_numpy(memoryview(stream), num_mz)
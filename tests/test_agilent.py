@@ -2,9 +2,15 @@
 Unit tests for parsing Agilent .D directories.
 
 """
+import io
+import os
+import struct
+
+import numpy as np
 import pytest
 
 import rainbow as rb
+from rainbow.agilent import chemstation
 from tests.datatester import assert_data_directory
 
 
@@ -61,3 +67,235 @@ def test_teal_telemetry_off():
     # is off.
     datadir = rb.read(path, requested_files=["PMP1B.IT"])
     assert sorted(df.name for df in datadir.analog) == sorted(["PMP1B.IT"])
+
+
+def test_ms_records_index():
+    """
+    Tests that the .ms scan records and their pairs are found from the
+    record headers, and that a truncated last record is dropped.
+
+    """
+    scans = [(6000, [(2000, 5), (1000, 0x4001)]), (6120, []),
+             (6240, [(3000, 7)])]
+    buf = b'\x00' * 6
+    for time, pairs in scans:
+        buf += struct.pack('>HI6xH4x', 14 + 2 * len(pairs), time, len(pairs))
+        for pair in pairs:
+            buf += struct.pack('>HH', *pair)
+        buf += b'\x00' * 10
+
+    times, pair_counts = chemstation.index_ms(buf, 6)
+    np.testing.assert_array_equal(times, [6000, 6120, 6240])
+    np.testing.assert_array_equal(pair_counts, [2, 0, 1])
+    mzs, int_encs = chemstation.ms_pairs(buf, 6, pair_counts)
+    np.testing.assert_array_equal(mzs, [2000, 1000, 3000])
+    np.testing.assert_array_equal(int_encs, [5, 0x4001, 7])
+    assert mzs.dtype == int_encs.dtype == np.uint16
+    assert mzs.base is int_encs.base
+
+    # A record is kept if its pairs are complete, even without its trailer.
+    times, pair_counts = chemstation.index_ms(buf[:-10], 6)
+    np.testing.assert_array_equal(pair_counts, [2, 0, 1])
+    times, pair_counts = chemstation.index_ms(buf[:-11], 6)
+    np.testing.assert_array_equal(pair_counts, [2, 0])
+    times, pair_counts = chemstation.index_ms(buf, 6, num_times=1)
+    np.testing.assert_array_equal(times, [6000])
+
+
+def _truncate(source, dest, size, null_offset, null_size):
+    """
+    Writes the start of a file with one header field zeroed, which is how
+    an interrupted acquisition leaves it.
+
+    """
+    with open(source, 'rb') as f:
+        raw = bytearray(f.read(size))
+    raw[null_offset:null_offset + null_size] = bytes(null_size)
+    with open(dest, 'wb') as f:
+        f.write(raw)
+    return str(dest)
+
+
+@pytest.mark.parametrize("accelerated", [True, False])
+def test_uv_partial_matches_complete(tmp_path, monkeypatch, accelerated):
+    """
+    Tests that a partial .uv file decodes the complete scans before the
+    truncation point.
+
+    """
+    source = "tests/inputs/red.D/DAD1.UV"
+    if not accelerated:
+        monkeypatch.setattr(chemstation, "_uvdelta_fast", None)
+    complete = chemstation.parse_uv(source)
+    with open(source, 'rb') as f:
+        offsets, _ = chemstation.index_uv(f, 0x1000, 0, 1 << 30)
+    # Cut the file in the middle of scan 1000 and clear the scan count.
+    path = _truncate(source, tmp_path / "DAD1.UV", int(offsets[1000]) + 100,
+                     0x116, 4)
+    partial = chemstation.parse_uv(path)
+    np.testing.assert_array_equal(partial.xlabels, complete.xlabels[:1000])
+    np.testing.assert_array_equal(partial.ylabels, complete.ylabels)
+    np.testing.assert_array_equal(partial.data, complete.data[:1000])
+    assert partial.metadata == complete.metadata
+
+
+def test_ms_partial_matches_complete(tmp_path):
+    """
+    Tests that a partial .ms file decodes the complete scans before the
+    truncation point.
+
+    """
+    source = "tests/inputs/orange.D/MSD1.MS"
+    complete = chemstation.parse_ms(source)
+    # Cut the file in the middle of the pairs of a scan and clear the data
+    # start offset and the magic number.
+    path = _truncate(source, tmp_path / "MSD1.MS", 600000, 0x10A, 2)
+    with open(path, 'r+b') as f:
+        f.write(bytes(4))
+    partial = chemstation.parse_ms(path)
+    num_times = partial.xlabels.size
+    assert 0 < num_times < complete.xlabels.size
+    np.testing.assert_array_equal(
+        partial.xlabels, complete.xlabels[:num_times])
+    columns = np.searchsorted(complete.ylabels, partial.ylabels)
+    np.testing.assert_array_equal(
+        partial.data, complete.data[:num_times, columns])
+
+
+def _grow(source, dest, data_start, step):
+    """
+    Yields after each chunk of a file is appended to a copy, like a file
+    that is being acquired.
+
+    """
+    with open(source, 'rb') as f:
+        raw = f.read()
+    with open(dest, 'wb') as f:
+        f.write(raw[:data_start])
+    yield raw[:data_start]
+    for end in range(data_start + step, len(raw) + step, step):
+        with open(dest, 'wb') as f:
+            f.write(raw[:end])
+        yield raw[:end]
+
+
+@pytest.mark.parametrize("step", [22, 997, 3001])
+def test_follow_uv(tmp_path, step):
+    """
+    Tests that following a growing .uv file yields the same scans as
+    parsing the complete file.
+
+    """
+    source = "tests/inputs/red.D/DAD1.UV"
+    complete = chemstation.parse_uv(source)
+    path = str(tmp_path / "DAD1.UV")
+    chunks = _grow(source, path, 0x1000, step)
+    next(chunks)
+    follower = chemstation.Follower(path)
+    times, values = zip(*(follower.poll() for _ in chunks))
+    np.testing.assert_array_equal(np.concatenate(times), complete.xlabels)
+    np.testing.assert_array_equal(np.vstack(values), complete.data)
+    np.testing.assert_array_equal(follower.ylabels, complete.ylabels)
+    assert follower.num_times == complete.xlabels.size
+    assert follower.poll()[0].size == 0
+
+
+@pytest.mark.parametrize("step", [7, 997, 4096])
+def test_follow_ch(tmp_path, step):
+    """
+    Tests that following a growing .ch file yields the same values as
+    parsing the complete file, and that the polled sample indices convert
+    to the same times once the header holds the final time range.
+
+    """
+    source = "tests/inputs/red.D/ADC1A.CH"
+    complete = chemstation.parse_ch(source)
+    path = str(tmp_path / "ADC1A.CH")
+    follower = None
+    indices, values = [], []
+    for raw in _grow(source, path, 0x1800, step):
+        if follower is None:
+            follower = chemstation.Follower(path)
+            continue
+        if len(raw) < os.path.getsize(source):
+            # The end time is not written until the acquisition ends.
+            with open(path, 'r+b') as f:
+                f.seek(0x11E)
+                f.write(struct.pack('>i', 0))
+        chunk_indices, chunk_values = follower.poll()
+        indices.append(chunk_indices)
+        values.append(chunk_values)
+    indices = np.concatenate(indices)
+    assert follower.detector == complete.detector
+    np.testing.assert_array_equal(indices, np.arange(complete.xlabels.size))
+    np.testing.assert_allclose(
+        follower.retention_times(indices), complete.xlabels)
+    np.testing.assert_array_equal(np.vstack(values), complete.data)
+
+
+def test_follow_invalid_file_raises():
+    """
+    Tests that following a file that is not delta-encoded raises.
+
+    """
+    with pytest.raises(Exception):
+        chemstation.Follower("tests/inputs/orange.D/MSD1.MS")
+
+
+def test_uv_array_views_file(tmp_path):
+    """
+    Tests that the raw doubles of an OL .uv file are decoded as views of
+    the mapped file.
+
+    """
+    values = np.arange(12, dtype='<f8').reshape(3, 4)
+    raw = bytearray(0x100)
+    for i, row in enumerate(values):
+        raw += struct.pack('<4xI14x', 400 * i) + row.tobytes()
+    path = tmp_path / "DAD1.UV"
+    path.write_bytes(bytes(raw))
+    with open(path, 'rb') as f:
+        times, data = chemstation.decode_uv_array(
+            f, {'data_start': 0x100}, 3, 4)
+        columns = chemstation.decode_uv_array(
+            f, {'data_start': 0x100}, 3, 4, np.array([1, 3]))[1]
+    np.testing.assert_array_equal(times, [0, 400, 800])
+    np.testing.assert_array_equal(data, values)
+    np.testing.assert_array_equal(columns, values[:, [1, 3]])
+    assert data.flags.writeable
+
+
+def test_map_file_falls_back_to_read(tmp_path):
+    """
+    Tests that files that cannot be mapped are read instead.
+
+    """
+    path = tmp_path / "empty.ch"
+    path.write_bytes(b"")
+    with open(path, 'rb') as f, chemstation.map_file(f) as buf:
+        assert buf == b""
+    with chemstation.map_file(io.BytesIO(b"abc")) as buf:
+        assert buf == b"abc"
+
+
+@pytest.mark.parametrize("name", [
+    "red.D/DAD1.UV", "red.D/ADC1A.CH", "orange.D/MSD1.MS",
+    "yellow.D/data.ms", "brown.D/dad1.uv"])
+def test_parsers_close_mapped_files(name, monkeypatch):
+    """
+    Tests that every file mapped while parsing is closed once decoding is
+    done, rather than left for garbage collection.
+
+    """
+    maps = []
+    map_file = chemstation.map_file
+
+    def tracked(f):
+        buf = map_file(f)
+        maps.append(buf)
+        return buf
+
+    monkeypatch.setattr(chemstation, "map_file", tracked)
+    datafile = chemstation.parse_file(os.path.join("tests", "inputs", name))
+    assert datafile is not None and maps
+    assert all(buf.closed for buf in maps)
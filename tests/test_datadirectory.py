@@ -83,3 +83,38 @@ def test_extract_traces():
     np.testing.assert_array_equal(
         datadir.extract_traces("peer.ms", [301.1, 499.0]),
         np.array(np.arange(8).reshape(4, 2).T))
+
+
+def test_save_load(tmp_path):
+    """
+    Tests that `DataDirectory.save` and `rainbow.load` round-trip.
+
+    """
+    import rainbow as rb
+    datafiles = [
+        DataFile("DAD1.UV", 'UV', np.arange(3) / 10, np.array([220, 280]),
+                 np.arange(6, dtype=np.int64).reshape(3, 2), {'signal': 'A'}),
+        DataFile("ADC1A.CH", None, np.arange(2) / 10, np.array(['']),
+                 np.ones((2, 1)), {})]
+    datadir = DataDirectory("sky.D", datafiles, {'vendor': "Agilent"})
+    path = str(tmp_path / "sky.rainbow")
+    datadir.save(path)
+
+    for mmap in (True, False):
+        loaded = rb.load(path, mmap=mmap)
+        assert loaded.name == "sky.D"
+        assert loaded.metadata == datadir.metadata
+        assert [df.name for df in loaded.datafiles] == ["DAD1.UV"]
+        assert [df.name for df in loaded.analog] == ["ADC1A.CH"]
+        assert isinstance(loaded.get_file("DAD1.UV").data, np.memmap) == mmap
+        for datafile in datafiles:
+            copy = loaded.get_file(datafile.name)
+            assert copy.detector == datafile.detector
+            assert copy.metadata == datafile.metadata
+            np.testing.assert_array_equal(copy.xlabels, datafile.xlabels)
+            np.testing.assert_array_equal(copy.ylabels, datafile.ylabels)
+            np.testing.assert_array_equal(copy.data, datafile.data)
+            assert copy.data.dtype == datafile.data.dtype
+
+    with pytest.raises(Exception):
+        rb.load(str(tmp_path))
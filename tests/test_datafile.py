@@ -2,6 +2,7 @@ import os
 import numpy as np
 import pytest
 from rainbow import DataFile
+from rainbow.datafile import LazyDataFile, SparseDataFile
 
 
 def test_validation():
@@ -77,6 +78,42 @@ def test_extract_traces():
         np.array(np.arange(8).reshape(4, 2).T))
 
 
+def test_extract_traces_many_labels():
+    """
+    Tests `DataFile.extract_traces` with array labels and unsorted ylabels.
+
+    """
+    ylabels = np.array([499.9, 120.0, 301.0])
+    datafile = DataFile(
+        "sky.DAT", None, np.arange(4), ylabels,
+        np.arange(12).reshape(4, 3), {})
+    np.testing.assert_array_equal(
+        datafile.extract_traces(np.array([301.0, 499.9, 301.0])),
+        np.arange(12).reshape(4, 3).T[[2, 0, 2]])
+    np.testing.assert_array_equal(
+        datafile.extract_traces(np.float32(120.0)), np.array([[1, 4, 7, 10]]))
+    assert datafile.extract_traces([]).shape == (0, 4)
+    with pytest.raises(Exception):
+        datafile.extract_traces(np.array([120.0, 500.0]))
+    with pytest.raises(Exception):
+        datafile.extract_traces(np.array([[120.0]]))
+
+    # Replacing the ylabels rebuilds the index.
+    datafile.ylabels = np.array([1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(
+        datafile.extract_traces(2.0), np.array([[1, 4, 7, 10]]))
+    with pytest.raises(Exception):
+        datafile.extract_traces(301.0)
+
+    fid = DataFile(
+        "FID1A.ch", 'FID', np.arange(3), np.array(['']),
+        np.arange(3).reshape(3, 1), {})
+    np.testing.assert_array_equal(
+        fid.extract_traces(''), np.array([[0, 1, 2]]))
+    with pytest.raises(Exception):
+        fid.extract_traces(0)
+
+
 def test_to_csvstr():
     """
     Tests the `DataFile.to_csvstr` method.
@@ -109,3 +146,90 @@ def test_to_csvstr():
         "RT (min),280\n0,1.0\n1,3.0\n2,5.0\n"
     assert datafile.to_csvstr([220., 280.]) == \
         "RT (min),220.0,280.0\n0,0.0,1.0\n1,2.0,3.0\n2,4.0,5.0\n"
+    assert datafile.to_csvstr(np.array([280, 220]), ';', '%.2f') == \
+        "RT (min);280;220\n0;1.00;0.00\n1;3.00;2.00\n2;5.00;4.00\n"
+
+
+def test_write_csv_in_blocks(tmp_path, monkeypatch):
+    """
+    Tests that `DataFile.export_csv` streams the same CSV block by block.
+
+    """
+    datafile = DataFile(
+        "dino.UV", None, np.linspace(0, 1, 7), np.array([220, 250, 280]),
+        np.arange(21).astype(np.float32).reshape(7, 3), {})
+    expected = datafile.to_csvstr()
+    monkeypatch.setattr("rainbow.datafile._CSV_BLOCK_SIZE", 4)
+    path = str(tmp_path / "dino.csv")
+    datafile.export_csv(path)
+    with open(path) as f:
+        assert f.read() == expected
+    assert datafile.to_csvstr([280]) == "".join(
+        f"{line.split(',')[0]},{line.split(',')[-1]}\n"
+        for line in expected.splitlines())
+
+
+def test_lazy_datafile():
+    """
+    Tests that `LazyDataFile` decodes once, on first access.
+
+    """
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return DataFile(
+            "sky.DAT", 'UV', np.arange(4), np.array([301.0, 499.9]),
+            np.arange(8).reshape(4, 2), {})
+
+    with pytest.raises(Exception):
+        LazyDataFile("sky.DAT", 'UV', None, {})
+    datafile = LazyDataFile(os.path.join("a", "sky.DAT"), 'UV', loader, {})
+    assert datafile.name == "sky.DAT"
+    assert not datafile.loaded and not calls
+    np.testing.assert_array_equal(
+        datafile.extract_traces(499.9), np.array([[1, 3, 5, 7]]))
+    np.testing.assert_array_equal(datafile.xlabels, np.arange(4))
+    assert datafile.loaded and len(calls) == 1
+
+    datafile = LazyDataFile("bad.DAT", 'UV', lambda: None, {})
+    with pytest.raises(Exception):
+        datafile.data
+
+
+def test_sparse_datafile():
+    """
+    Tests that `SparseDataFile` matches the equivalent dense DataFile.
+
+    """
+    dense = np.array([[0, 5, 0], [0, 0, 0], [7, 0, 1], [0, 2, 0]],
+                     dtype=np.uint32)
+    ylabels = np.array([301.0, 499.9, 500.0])
+    datafile = DataFile("sky.ms", 'MS', np.arange(4), ylabels, dense, {})
+    indptr = np.array([0, 1, 1, 3, 4])
+    indices = np.array([1, 0, 2, 1], dtype=np.int32)
+    values = np.array([5, 7, 1, 2], dtype=np.uint32)
+    with pytest.raises(Exception):
+        SparseDataFile("sky.ms", 'MS', np.arange(4), ylabels, indptr[:-1],
+                       indices, values, {})
+    with pytest.raises(Exception):
+        SparseDataFile("sky.ms", 'MS', np.arange(4), ylabels, indptr,
+                       indices, values[:-1], {})
+    sparse = SparseDataFile(
+        "sky.ms", 'MS', np.arange(4), ylabels, indptr, indices, values, {})
+
+    assert sparse.shape == (4, 3)
+    np.testing.assert_array_equal(sparse.data, dense)
+    np.testing.assert_array_equal(sparse.tic(), datafile.tic())
+    for labels in (None, 499.9, [500.0, 301.0, 500.0], np.array([499.9])):
+        np.testing.assert_array_equal(
+            sparse.extract_traces(labels), datafile.extract_traces(labels))
+    with pytest.raises(Exception):
+        sparse.extract_traces(200.0)
+    assert sparse.to_csvstr() == datafile.to_csvstr()
+    assert sparse.to_csvstr([500.0]) == datafile.to_csvstr([500.0])
+
+    mzs, intensities = sparse.scan(2)
+    np.testing.assert_array_equal(mzs, [301.0, 500.0])
+    np.testing.assert_array_equal(intensities, [7, 1])
+    assert sparse.scan(1)[0].size == 0
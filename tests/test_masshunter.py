@@ -368,6 +368,26 @@ def test_per_scan_profile_is_faithful(directory):
             records[i]['SpectrumParamValues']['MaxY'])
 
 
+def test_profile_save_load_round_trip(tmp_path):
+    """ A saved per-scan profile reloads memory-mapped with the same per-scan
+    m/z axes, without decoding MSProfile.bin again. """
+    datadir = rb.read(MAGENTA_D, hrms=True)
+    path = str(tmp_path / "magenta.rainbow")
+    datadir.save(path)
+    loaded = rb.load(path)
+
+    prof = datadir.get_file("MSProfile.bin")
+    copy = loaded.get_file("MSProfile.bin")
+    assert isinstance(copy, masshunter.ProfileDataFile)
+    assert isinstance(copy.data, np.memmap)
+    assert copy.mz_decimals == prof.mz_decimals
+    np.testing.assert_array_equal(copy.xlabels, prof.xlabels)
+    np.testing.assert_array_equal(copy.tof, prof.tof)
+    np.testing.assert_array_equal(copy.data, prof.data)
+    for i in (0, prof.data.shape[0] - 1):
+        np.testing.assert_array_equal(copy.mass_labels(i), prof.mass_labels(i))
+
+
 def test_per_scan_profile_has_no_shared_ylabels():
     """ A profile has no single m/z axis, so ylabels raises with guidance
     rather than returning a silently-approximate array. """
@@ -432,6 +452,36 @@ def test_type_size_matches_reader():
     assert consumed == masshunter.type_size(ctd, "ScanRecordType")
 
 
+@pytest.mark.parametrize("directory", [GOLD_D, COPPER_D, AMBER_D])
+def test_scan_table_matches_reader(directory):
+    """ Every row of the structured scan table, including the extra centroid
+    blocks, holds the values read_complextype reads for that record. """
+    ctd = _complextypes(directory)
+    path = os.path.join(_acqdata(directory), "MSScan.bin")
+    table = masshunter.read_scan_table(path, ctd)
+    blocks = masshunter.spectrum_blocks(table)
+    with open(path, 'rb') as f:
+        f.seek(0x58)
+        start = struct.unpack('<I', f.read(4))[0]
+        for i in range(table.size):
+            f.seek(start + i * table.dtype.itemsize)
+            record = masshunter.read_complextype(f, ctd, "ScanRecordType")
+            assert record['ScanTime'] == table['ScanTime'][i]
+            assert record['SpectrumParamValues']['SpectrumOffset'] == \
+                blocks['SpectrumOffset'][i, 0]
+            for j in range(1, blocks.shape[1]):
+                block = masshunter.read_complextype(
+                    f, ctd, "SpectrumParamsType")
+                assert block['ByteCount'] == blocks['ByteCount'][i, j]
+
+    chosen, has_peaks = masshunter._select_centroid_blocks(blocks)
+    for i in range(table.size):
+        block = masshunter._select_centroid_block(blocks[i])
+        assert has_peaks[i] == (block is not None)
+        if block is not None:
+            assert chosen[i] == block
+
+
 def test_fixtures_lack_msmasscal():
     """ These fixtures intentionally have no per-scan MSMassCal.bin, so they
     exercise the DefaultMassCal.xml fallback. """
@@ -623,6 +673,119 @@ def test_bin_width_presence_toggles_binning():
     assert not isinstance(grid, masshunter.ProfileDataFile)
 
 
+@pytest.mark.parametrize("directory", [MAGENTA_D, AMBER_D])
+def test_workers_match_serial_decode(directory, monkeypatch):
+    """ Decoding the profile scans on a thread pool, with or without the
+    compiled accelerator, gives the same per-scan and shared-grid data. """
+    acqdata = os.path.join(directory, "AcqData")
+    serial = masshunter.parse_msdata(acqdata)
+    serial_grid = masshunter.parse_msdata(acqdata, bin_width=0.01)
+    for accelerator in (masshunter._msprofile_fast, None):
+        monkeypatch.setattr(masshunter, "_msprofile_fast", accelerator)
+        threaded = masshunter.parse_msdata(acqdata, workers=3)
+        assert len(threaded) == len(serial)
+        for a, b in zip(serial, threaded):
+            assert np.array_equal(a.xlabels, b.xlabels)
+            assert np.array_equal(a.tof, b.tof)
+            assert np.array_equal(a.data, b.data)
+        grid = masshunter.parse_msdata(acqdata, bin_width=0.01, workers=3)
+        assert np.array_equal(serial_grid.data, grid.data)
+
+
+@pytest.mark.parametrize("directory", [MAGENTA_D, AMBER_D])
+def test_lazy_profile_matches_dense(directory):
+    """ A lazy read decodes the same scans as the dense read, whether they are
+    read one at a time, as a block, or all at once. """
+    dense = rb.read(directory, hrms=True).get_file("MSProfile.bin")
+    lazy = rb.read(directory, hrms=True, lazy=True).get_file("MSProfile.bin")
+    assert isinstance(lazy, masshunter.LazyProfileDataFile)
+    assert lazy.data.shape == dense.data.shape
+    for i in (0, -1):
+        for a, b in zip(dense.scan(i), lazy.scan(i)):
+            assert np.array_equal(a, b)
+    assert np.array_equal(dense.data[1:3], lazy.data[1:3])
+    assert np.array_equal(dense.data[[2, 0], 5:9], lazy.data[[2, 0], 5:9])
+    assert np.array_equal(dense.data, np.asarray(lazy.data))
+    assert np.array_equal(dense.data, lazy.load().data)
+
+
+def test_lazy_profile_caches_recent_scans(monkeypatch):
+    """ Single scans are decoded once and kept in a bounded LRU cache; blocks
+    reuse cached scans and decode only the rest. """
+    profile = rb.read(AMBER_D, hrms=True, lazy=True).get_file("MSProfile.bin")
+    profile.cache_size = 2
+    decoded = []
+    decode_segment = masshunter._decode_segment
+    monkeypatch.setattr(
+        masshunter, "_decode_segment",
+        lambda *args: decoded.append(args) or decode_segment(*args))
+
+    first = profile.data[0]
+    assert profile.data[0] is first and len(decoded) == 1
+    assert not first.flags.writeable
+    profile.data[1]
+    profile.data[2]
+    assert list(profile.data._cache) == [1, 2]
+    profile.data[0:4]
+    assert len(decoded) == 3 + 2
+    with pytest.raises(IndexError):
+        profile.data[len(profile.data)]
+
+
+@pytest.mark.parametrize("name", ["magenta.D", pytest.param(
+    "gold.D", marks=pytest.mark.skipif(not HAVE_LZF, reason="needs lzf"))])
+def test_in_memory_profile_keeps_compressed_segments(name, tmp_path):
+    """ An in-memory profile decodes from its own copy of the compressed
+    segments, so it no longer depends on MSProfile.bin. """
+    directory = str(tmp_path / name)
+    shutil.copytree(os.path.join("tests", "inputs", name), directory)
+    dense = rb.read(directory, hrms=True).get_file("MSProfile.bin")
+    lazy = rb.read(directory, hrms=True, lazy=True).get_file("MSProfile.bin")
+    resident = lazy.in_memory()
+    assert isinstance(resident, masshunter.LazyProfileDataFile)
+    assert len(resident.data._source) < dense.data.nbytes
+
+    profile_path = os.path.join(directory, "AcqData", "MSProfile.bin")
+    with open(profile_path, 'r+b') as f:
+        f.write(bytes(os.path.getsize(profile_path)))
+    assert np.array_equal(dense.data[1], resident.data[1])
+    assert np.array_equal(dense.data, np.asarray(resident.data))
+
+
+@pytest.mark.skipif(not HAVE_LZF, reason="needs lzf")
+def test_lazy_profile_reads_lzf_grid_without_decompressing(monkeypatch):
+    """ A lazy read takes the grid of LZF segments from the first 16
+    decompressed bytes and leaves the intensities compressed until access. """
+    dense = rb.read(GOLD_D, hrms=True).get_file("MSProfile.bin")
+    decompressed = []
+    decompress = _lzf.decompress
+    monkeypatch.setattr(
+        _lzf, "decompress",
+        lambda *args: decompressed.append(args) or decompress(*args))
+    lazy = rb.read(GOLD_D, hrms=True, lazy=True).get_file("MSProfile.bin")
+    assert not decompressed
+    for i in range(len(dense.xlabels)):
+        assert np.array_equal(dense.tof[i], lazy.tof[i])
+    assert np.array_equal(dense.data[0], lazy.data[0])
+    assert len(decompressed) == 1
+
+
+@pytest.mark.skipif(not HAVE_LZF, reason="needs lzf")
+def test_lzf_head_matches_full_decompression():
+    """ The partial LZF decoder returns the start of the full output, for
+    literal runs, short and long back-references, and overlapping copies. """
+    rng = np.random.default_rng(0)
+    data = b''.join([
+        struct.pack('<dd', 0.5, 1e-3), bytes(300), b'ab' * 40,
+        rng.integers(0, 4, 2000, dtype=np.uint8).tobytes(),
+        rng.integers(0, 256, 200, dtype=np.uint8).tobytes()])
+    compressed = _lzf.compress(data)
+    for size in (1, 16, 17, 400, len(data)):
+        assert masshunter._lzf_head(compressed, size) == data[:size]
+    with pytest.raises(ValueError):
+        masshunter._lzf_head(compressed[:10], len(data))
+
+
 def test_precision_does_not_affect_the_grid():
     """ At a fixed bin_width, precision changes only the label rounding, never
     which scans share a column: the data and (here) the labels are identical. """
@@ -674,6 +837,7 @@ def test_profile_shared_axis_ops_raise_with_pointer():
            lambda: prof.extract_traces(),
            lambda: prof.to_csvstr(),
            lambda: prof.export_csv("unused.csv"),
+           lambda: prof.write_csv(None),
            lambda: prof.plot(100.0)]
     for op in ops:
         with pytest.raises(AttributeError, match="readthedocs"):
@@ -709,6 +873,43 @@ def test_mass_labels_are_per_scan_and_drift():
     assert first != last                          # the column drifts across scans
 
 
+def test_calibrate_mz_batch_matches_calibrate_mz(monkeypatch):
+    """ The batched calibrator gives exactly the per-scan values, for mixed
+    polynomial flags and across block boundaries. """
+    profile = rb.read(AMBER_D, hrms=True).get_file("MSProfile.bin")
+    calib = profile._calib[:7]
+    use_flags = [profile._use_flags[0], None, 0, 0b1011, 3095,
+                 profile._use_flags[5], 0b1]
+    monkeypatch.setattr(masshunter, "_CALIBRATION_BATCH", 3 * profile.tof.size)
+    mzs = masshunter.calibrate_mz_batch(profile.tof, calib, use_flags)
+    assert mzs.shape == (7, profile.tof.size)
+    for row, flags, mz in zip(calib, use_flags, mzs):
+        np.testing.assert_array_equal(
+            mz, masshunter.calibrate_mz(profile.tof, row, flags))
+
+
+def test_mass_labels_are_shared_for_equal_calibrations():
+    """ Scans with the same calibration row and flags share one read-only m/z
+    array internally; a different rounding is computed afresh. Callers get
+    their own writable copy. """
+    profile = rb.read(AMBER_D, hrms=True).get_file("MSProfile.bin")
+    calib = np.repeat(profile._calib[:2], [3, 1], axis=0)
+    copy = masshunter.ProfileDataFile(
+        "MSProfile.bin", profile.xlabels[:4], profile.tof, profile.data[:4],
+        calib, profile._use_flags[:4], {})
+    assert copy._mass_labels(0) is copy._mass_labels(2)
+    assert copy._mass_labels(0) is not copy._mass_labels(3)
+    np.testing.assert_array_equal(copy.mass_labels(2), profile.mass_labels(0))
+    assert not copy._mass_labels(0).flags.writeable
+
+    labels, _ = copy.scan(0)
+    labels += 1
+    np.testing.assert_array_equal(copy.mass_labels(0), labels - 1)
+    assert copy.mass_labels(0) is not copy.mass_labels(0)
+    copy.mz_decimals = None
+    assert not np.array_equal(copy.mass_labels(0), profile.mass_labels(0))
+
+
 def test_tof_axis_is_shared_and_monotonic():
     """ tof is the one flight-time axis shared by every scan: it indexes the
     columns and is strictly increasing. """
@@ -773,3 +974,20 @@ def test_waters_auto_precision_is_whole_numbers(path):
         ylabels = datafile.ylabels
         assert ylabels.size > 0
         np.testing.assert_array_equal(ylabels, np.round(ylabels))
+
+
+def test_sparse_grids_match_dense():
+    """ The sparse centroid and shared-grid profile DataFiles hold exactly the
+    dense grids, without ever building them. """
+    dense = masshunter.parse_mspeakdata(YELLOW_ACQDATA)
+    sparse = masshunter.parse_mspeakdata(YELLOW_ACQDATA, sparse=True)
+    assert isinstance(sparse, rb.datafile.SparseDataFile)
+    np.testing.assert_array_equal(sparse.ylabels, dense.ylabels)
+    np.testing.assert_array_equal(sparse.data, dense.data)
+
+    acqdata = os.path.join(MAGENTA_D, "AcqData")
+    dense = masshunter.parse_msdata(acqdata, bin_width=0.01)
+    sparse = masshunter.parse_msdata(acqdata, bin_width=0.01, sparse=True)
+    np.testing.assert_array_equal(sparse.ylabels, dense.ylabels)
+    np.testing.assert_array_equal(sparse.data, dense.data)
+    assert sparse.values.size < dense.data.size
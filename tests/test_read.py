@@ -2,9 +2,14 @@
 Unit tests for rb.read's vendor dispatch: extension first, content sniffing for
 unsuffixed directories, and the explicit ``format`` override.
 """
+import io
 import os
 import shutil
+import struct
+import subprocess
+import sys
 
+import numpy as np
 import pytest
 
 import rainbow as rb
@@ -79,3 +84,430 @@ def test_read_metadata_format_override(tmp_path):
 def test_read_metadata_invalid_format_raises():
     with pytest.raises(Exception):
         rb.read_metadata(WATERS_FIXTURE, format="thermo")
+
+
+@pytest.mark.parametrize(
+    "fixture", ["red.D", "orange.D", "yellow.D", "blue.raw", "indigo.raw"])
+def test_lazy_matches_eager(fixture):
+    # A lazy read defers decoding but must produce the same directory.
+    path = os.path.join("tests", "inputs", fixture)
+    eager = rb.read(path)
+    lazy = rb.read(path, lazy=True)
+    assert lazy.metadata == eager.metadata
+    assert sorted(lazy.by_name) == sorted(eager.by_name)
+    assert sorted(lazy.by_detector) == sorted(eager.by_detector)
+    for name, datafile in eager.by_name.items():
+        stub = lazy.by_name[name]
+        assert not stub.loaded
+        assert stub.detector == datafile.detector
+        assert stub.metadata == datafile.metadata
+        np.testing.assert_array_equal(stub.data, datafile.data)
+        np.testing.assert_array_equal(stub.xlabels, datafile.xlabels)
+        np.testing.assert_array_equal(stub.ylabels, datafile.ylabels)
+        assert stub.loaded
+
+
+@pytest.mark.parametrize("source,size", [
+    ("brown.D/dad1A.ch", 1024),          # header only
+    ("red.D/DAD1B.ch", 0x1800 + 3),      # segment header, no whole sample
+    ("brown.D/dad1.uv", 0x200 + 40),     # first segment cut off
+    ("orange.D/MSD1.MS", 0x2F2 + 16),    # first record cut off
+])
+def test_lazy_skips_files_without_data(source, size, tmp_path):
+    # A truncated file with no complete record is skipped by both reads.
+    run = str(tmp_path / "X.D")
+    os.mkdir(run)
+    name = "X" + os.path.splitext(source)[1]
+    with open(os.path.join("tests", "inputs", source), 'rb') as f:
+        head = f.read(size)
+    with open(os.path.join(run, name), 'wb') as f:
+        f.write(head)
+    assert rb.read(run).datafiles == []
+    assert rb.read(run, lazy=True).datafiles == []
+
+
+def test_lazy_decodes_only_touched_files():
+    datadir = rb.read(AGILENT_FIXTURE.replace("brown", "red"), lazy=True)
+    datadir.get_file("DAD1B.ch").data
+    assert [df.name for df in datadir.by_name.values() if df.loaded] == \
+        ["DAD1B.ch"]
+
+
+def test_read_metadata_decodes_no_data(tmp_path):
+    # Without directory-level metadata, the data file headers are read
+    # instead of decoding the files.
+    waters = str(tmp_path / "blue.raw")
+    shutil.copytree(os.path.join("tests", "inputs", "blue.raw"), waters)
+    for name in os.listdir(waters):
+        if name.upper() == "_HEADER.TXT":
+            os.remove(os.path.join(waters, name))
+    for path in [AGILENT_FIXTURE, waters]:
+        result = rb.read_metadata(path)
+        datadir = rb.read(path)
+        assert result["metadata"] == datadir.metadata
+        assert [df.name for df in result["datafiles"]] == \
+            [df.name for df in datadir.datafiles + datadir.analog]
+        assert not any(df.loaded for df in result["datafiles"])
+
+
+def test_invalid_lazy_raises():
+    with pytest.raises(Exception):
+        rb.read(WATERS_FIXTURE, lazy="yes")
+
+
+@pytest.mark.parametrize(
+    "fixture", ["red.D", "orange.D", "yellow.D", "blue.raw", "white.raw"])
+def test_workers_match_serial(fixture):
+    # Parallel decoding must give the same files, in the same order.
+    path = os.path.join("tests", "inputs", fixture)
+    serial = rb.read(path)
+    parallel = rb.read(path, workers=4)
+    assert parallel.metadata == serial.metadata
+    assert list(parallel.by_name) == list(serial.by_name)
+    for name, datafile in serial.by_name.items():
+        np.testing.assert_array_equal(
+            parallel.by_name[name].data, datafile.data)
+        np.testing.assert_array_equal(
+            parallel.by_name[name].xlabels, datafile.xlabels)
+
+
+@pytest.mark.parametrize("workers", [0, -2, 1.5, True, "4"])
+def test_invalid_workers_raises(workers):
+    with pytest.raises(Exception):
+        rb.read(WATERS_FIXTURE, workers=workers)
+
+
+def test_read_many():
+    paths = [os.path.join("tests", "inputs", name)
+             for name in ("orange.D", "not_a_run.D", "blue.raw", "yellow.D")]
+    results = list(rb.read_many(paths, workers=2, max_in_flight=2))
+    assert [path for path, _ in results] == paths
+    assert isinstance(results[1][1], Exception)
+    for path, result in results[::2]:
+        assert isinstance(result, rb.DataDirectory)
+        assert result.name == os.path.basename(path)
+
+    # Unordered results cover the same runs.
+    unordered = dict(rb.read_many(iter(paths), workers=2, ordered=False))
+    assert sorted(unordered) == sorted(paths)
+    assert unordered[paths[3]].metadata == results[3][1].metadata
+
+
+class _CrashingPath(str):
+    """ A path that makes the worker process receiving it exit at once. """
+
+    def __reduce__(self):
+        return os._exit, (1,)
+
+
+def test_read_many_survives_crashed_worker():
+    from concurrent.futures.process import BrokenProcessPool
+    crash = _CrashingPath("crash.D")
+    paths = [os.path.join("tests", "inputs", name)
+             for name in ("orange.D", "blue.raw", "yellow.D", "red.D")]
+    paths.insert(1, crash)
+    results = list(rb.read_many(paths, workers=2))
+    assert [path for path, _ in results] == paths
+    assert isinstance(results[1][1], BrokenProcessPool)
+    for path, result in results[:1] + results[2:]:
+        assert isinstance(result, rb.DataDirectory)
+        assert result.name == os.path.basename(path)
+
+
+def test_read_many_lazy_hrms():
+    from rainbow.agilent import masshunter
+    path = os.path.join("tests", "inputs", "magenta.D")
+    (_, datadir), = rb.read_many([path], workers=1, hrms=True, lazy=True)
+    assert isinstance(datadir, rb.DataDirectory)
+    profile = datadir.get_file("MSProfile.bin")
+    assert isinstance(profile, masshunter.LazyProfileDataFile)
+    dense = rb.read(path, hrms=True).get_file("MSProfile.bin")
+    assert np.array_equal(dense.data[1], profile.data[1])
+    assert [df.name for df in datadir.datafiles] == \
+        [df.name for df in rb.read(path, hrms=True).datafiles]
+
+
+def test_read_many_passes_read_kwargs():
+    path = os.path.join("tests", "inputs", "red.D")
+    (_, datadir), = rb.read_many(
+        [path], workers=1, requested_files=["DAD1B.ch"])
+    assert list(datadir.by_name) == ["DAD1B.CH"]
+
+
+def test_cache_round_trip(tmp_path):
+    run = _copy_without_suffix(AGILENT_FIXTURE, tmp_path, "brown.D")
+    cache_dir = str(tmp_path / "cache")
+    cold = rb.read(run, cache_dir=cache_dir)
+    warm = rb.read(run, cache_dir=cache_dir)
+    assert warm.metadata == cold.metadata
+    assert [df.name for df in warm.datafiles] == \
+        [df.name for df in cold.datafiles]
+    for df in cold.datafiles:
+        cached = warm.get_file(df.name)
+        assert isinstance(cached.data, np.memmap)
+        assert cached.detector == df.detector
+        assert cached.metadata == df.metadata
+        assert np.array_equal(cached.xlabels, df.xlabels)
+        assert np.array_equal(cached.ylabels, df.ylabels)
+        assert np.array_equal(cached.data, df.data)
+
+    # Different read arguments are cached separately.
+    subset = rb.read(run, requested_files=["dad1.uv"], cache_dir=cache_dir)
+    assert [df.name.lower() for df in subset.datafiles] == ["dad1.uv"]
+
+
+def test_cache_invalidated_by_modified_file(tmp_path):
+    run = _copy_without_suffix(AGILENT_FIXTURE, tmp_path, "brown.D")
+    cache_dir = str(tmp_path / "cache")
+    rb.read(run, cache_dir=cache_dir)
+    name = next(n for n in os.listdir(run) if n.lower() == "dad1.uv")
+    stat = os.stat(os.path.join(run, name))
+    os.utime(os.path.join(run, name),
+             ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert not isinstance(
+        rb.read(run, cache_dir=cache_dir).datafiles[0].data, np.memmap)
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_lazy_read_with_cache_decodes_on_access(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    datadir = rb.read(AGILENT_FIXTURE, lazy=True, cache_dir=cache_dir)
+    assert not any(df.loaded for df in datadir.datafiles)
+    assert not os.path.exists(cache_dir) or not os.listdir(cache_dir)
+    datafile = datadir.datafiles[0]
+    datafile.data
+    assert datafile.loaded
+
+    # A run cached by an eager read is still used by a lazy one.
+    rb.read(AGILENT_FIXTURE, cache_dir=cache_dir)
+    assert isinstance(
+        rb.read(AGILENT_FIXTURE, lazy=True, cache_dir=cache_dir)
+        .datafiles[0].data, np.memmap)
+
+
+def _cache_size(cache_dir):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(cache_dir) for name in names)
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    rb.read(WATERS_FIXTURE, cache_dir=str(tmp_path / "sizing"))
+    entry_size = _cache_size(str(tmp_path / "sizing"))
+
+    cache_dir = str(tmp_path / "cache")
+    rb.read(AGILENT_FIXTURE, cache_dir=cache_dir)
+    rb.read(WATERS_FIXTURE, cache_dir=cache_dir, cache_size=entry_size)
+    # The older brown.D entry no longer fits alongside blue.raw.
+    assert len(os.listdir(cache_dir)) == 1
+    assert isinstance(
+        rb.read(WATERS_FIXTURE, cache_dir=cache_dir).datafiles[0].data,
+        np.memmap)
+
+
+def test_invalid_cache_size_raises(tmp_path):
+    with pytest.raises(Exception):
+        rb.read(AGILENT_FIXTURE, cache_dir=str(tmp_path), cache_size=-1)
+
+
+@pytest.mark.parametrize("run", ["orange.D", "yellow.D", "blue.raw"])
+def test_sparse_matches_dense(run):
+    path = os.path.join("tests", "inputs", run)
+    dense = rb.read(path)
+    sparse = rb.read(path, sparse=True)
+    assert any(isinstance(df, rb.datafile.SparseDataFile)
+               for df in sparse.datafiles)
+    for df in dense.datafiles:
+        copy = sparse.get_file(df.name)
+        assert copy.detector == df.detector
+        np.testing.assert_array_equal(copy.ylabels, df.ylabels)
+        np.testing.assert_array_equal(copy.data, df.data)
+        np.testing.assert_array_equal(copy.tic(), df.tic())
+        labels = df.ylabels[::5]
+        np.testing.assert_array_equal(
+            copy.extract_traces(labels), df.extract_traces(labels))
+
+
+@pytest.mark.parametrize("run", ["orange.D", "blue.raw"])
+def test_lazy_sparse_forwards_sparse_attributes(run, monkeypatch):
+    path = os.path.join("tests", "inputs", run)
+    eager = rb.read(path, sparse=True)
+    lazy = rb.read(path, sparse=True, lazy=True)
+    monkeypatch.setattr(
+        rb.datafile.SparseDataFile, "_row_block",
+        lambda *args: pytest.fail("sparse data was made dense"))
+    for df in eager.datafiles:
+        if not isinstance(df, rb.datafile.SparseDataFile):
+            continue
+        copy = lazy.get_file(df.name)
+        assert isinstance(copy, rb.datafile.LazyDataFile)
+        assert copy.get_info() == df.get_info()
+        assert copy.shape == df.shape
+        np.testing.assert_array_equal(copy.indptr, df.indptr)
+        np.testing.assert_array_equal(copy.indices, df.indices)
+        for a, b in zip(copy.scan(1), df.scan(1)):
+            np.testing.assert_array_equal(a, b)
+    with pytest.raises(AttributeError):
+        lazy.datafiles[0]._missing
+
+
+def test_invalid_sparse_raises():
+    with pytest.raises(Exception):
+        rb.read(AGILENT_FIXTURE, sparse=1)
+
+
+@pytest.mark.parametrize("fixture", ["red.D", "brown.D"])
+@pytest.mark.parametrize("rt_range", [(1, 3), (0, 100), (50, 60)])
+@pytest.mark.parametrize("lazy", [False, True])
+def test_rt_range_matches_full_read(fixture, rt_range, lazy):
+    # Only the .uv scans inside the window are decoded; other files are whole.
+    path = os.path.join("tests", "inputs", fixture)
+    full = rb.read(path)
+    window = rb.read(path, rt_range=rt_range, lazy=lazy)
+    for name, datafile in full.by_name.items():
+        windowed = window.by_name[name]
+        if name.lower().endswith(".uv"):
+            keep = (datafile.xlabels >= rt_range[0]) & \
+                (datafile.xlabels <= rt_range[1])
+            np.testing.assert_array_equal(
+                windowed.xlabels, datafile.xlabels[keep])
+            np.testing.assert_array_equal(windowed.data, datafile.data[keep])
+            np.testing.assert_array_equal(windowed.ylabels, datafile.ylabels)
+        else:
+            np.testing.assert_array_equal(windowed.data, datafile.data)
+
+
+@pytest.mark.parametrize(
+    "rt_range", [(3, 1), (1,), "1-3", (1, None), (True, 2)])
+def test_invalid_rt_range_raises(rt_range):
+    with pytest.raises(Exception):
+        rb.read(AGILENT_FIXTURE, rt_range=rt_range)
+
+
+@pytest.mark.parametrize("wavelengths", [[254, 280], [280, 254, 280]])
+def test_wavelengths_match_full_read(wavelengths):
+    path = os.path.join("tests", "inputs", "red.D")
+    full = rb.read(path)
+    subset = rb.read(path, wavelengths=wavelengths, rt_range=(1, 3))
+    uv = full.get_file("DAD1.UV")
+    rows = (uv.xlabels >= 1) & (uv.xlabels <= 3)
+    # The columns follow the requested order, without repeats.
+    columns = [list(uv.ylabels).index(w) for w in dict.fromkeys(wavelengths)]
+    windowed = subset.get_file("DAD1.UV")
+    np.testing.assert_array_equal(windowed.ylabels, uv.ylabels[columns])
+    np.testing.assert_array_equal(windowed.data, uv.data[rows][:, columns])
+    np.testing.assert_array_equal(
+        subset.get_file("ADC1A.CH").data, full.get_file("ADC1A.CH").data)
+
+
+def test_missing_wavelengths_warn():
+    path = os.path.join("tests", "inputs", "red.D")
+    full = rb.read(path).get_file("DAD1.UV")
+    with pytest.warns(UserWarning, match="999"):
+        uv = rb.read(path, wavelengths=[280, 999, 254]).get_file("DAD1.UV")
+    np.testing.assert_array_equal(uv.ylabels, [280, 254])
+    np.testing.assert_array_equal(
+        uv.data, full.data[:, [list(full.ylabels).index(w) for w in (280, 254)]])
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_unmatched_wavelengths_raise(lazy):
+    path = os.path.join("tests", "inputs", "red.D")
+    with pytest.raises(ValueError, match="None of the wavelengths"):
+        rb.read(path, wavelengths=[999, 1000], lazy=lazy) \
+            .get_file("DAD1.UV").data
+
+
+@pytest.mark.parametrize("wavelengths", [254, "254", [True], [None], []])
+def test_invalid_wavelengths_raises(wavelengths):
+    with pytest.raises(Exception):
+        rb.read(AGILENT_FIXTURE, wavelengths=wavelengths)
+
+
+@pytest.mark.parametrize(
+    "run", ["red.D", "brown.D", "orange.D", "yellow.D", "blue.raw",
+            "white.raw", "teal.dx"])
+def test_inspect_matches_read(run):
+    path = os.path.join("tests", "inputs", run)
+    # inspect describes every file, including the opt-in ones.
+    datadir = rb.read(path, telemetry=True, centroid=True)
+    infos = rb.inspect(path)
+    assert len(infos) == len(datadir.datafiles) + len(datadir.analog)
+    for info in infos:
+        df = datadir.get_file(info["name"])
+        assert info["detector"] == df.detector
+        assert info["num_times"] == df.xlabels.size
+        np.testing.assert_allclose(
+            info["rt_range"], df.xlabels[[0, -1]], atol=1e-5)
+        if info["ylabel_range"] is not None and df.detector == 'UV':
+            assert tuple(info["ylabel_range"]) == tuple(df.ylabels[[0, -1]])
+            assert info["num_ylabels"] == df.ylabels.size
+        if df.detector != 'MS':
+            assert info["decoded_bytes"] >= df.data.nbytes
+
+
+def test_inspect_masshunter():
+    path = os.path.join("tests", "inputs", "copper.D")
+    datadir = rb.read(path, centroid=True, hrms=True)
+    infos = {info["name"]: info for info in rb.inspect(path)}
+    for name in ("MSProfile.bin", "MSPeak.bin"):
+        df = datadir.get_file(name)
+        assert infos[name]["num_times"] == df.xlabels.size
+    profile = datadir.get_file("MSProfile.bin")
+    assert infos["MSProfile.bin"]["num_ylabels"] == profile.data.shape[1]
+
+
+def test_inspect_counts_ch_values_without_decoding(tmp_path, monkeypatch):
+    # A large .ch delta stream, with an escape to an absolute value in every
+    # segment, is counted from its segment headers and escapes alone.
+    from rainbow.agilent import chemstation
+    with open(os.path.join("tests", "inputs", "red.D", "DAD1B.ch"), 'rb') as f:
+        header = f.read(0x1800)
+    segment = bytes([0x10, 0xFF]) + struct.pack('>hi', -0x8000, 7) + \
+        struct.pack('>h', 1) * 254
+    run = str(tmp_path / "big.D")
+    os.mkdir(run)
+    with open(os.path.join(run, "DAD1A.ch"), 'wb') as f:
+        f.write(header + segment * 4000 + segment[:100])
+
+    expected = len(chemstation.decode_delta(
+        open(os.path.join(run, "DAD1A.ch"), 'rb'), 0x1800))
+    assert expected == 255 * 4000 + 47
+
+    def no_decoding(*args, **kwargs):
+        raise AssertionError("inspect decoded the signal")
+    for name in ("decode_delta", "decode_double_delta", "_accumulate_deltas",
+                 "_decode_delta_segments"):
+        monkeypatch.setattr(chemstation, name, no_decoding)
+    info, = rb.inspect(run)
+    assert info["num_times"] == expected
+
+
+def test_count_double_delta_matches_decoder():
+    from rainbow.agilent import chemstation
+    stream = struct.pack('>hh', 5, -2) + struct.pack('>hhi', 0x7FFF, 0, 0x7FFF) \
+        + struct.pack('>h', 0x7FFF) + struct.pack('>h', 3) * 3
+    for cut in range(len(stream) + 1):
+        f = io.BytesIO(stream[:cut])
+        try:
+            expected = len(chemstation.decode_double_delta(f, 0))
+        except struct.error:
+            # The pure-Python decoder rejects a cut-off absolute value.
+            continue
+        assert chemstation.count_double_delta(f, 0) == expected
+    assert chemstation.count_double_delta(io.BytesIO(stream), 0) == 4
+
+
+def test_inspect_invalid_path_raises():
+    with pytest.raises(Exception):
+        rb.inspect(os.path.join("tests", "inputs", "missing.D"))
+
+
+def test_import_is_lazy():
+    # Vendor parsers and their heavy dependencies load on first use only.
+    code = ("import sys, rainbow; print(' '.join(m for m in ('rainbow.agilent', "
+            "'rainbow.waters', 'lxml', 'pandas') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], check=True,
+                         capture_output=True, text=True).stdout
+    assert out.strip() == ""
+    assert rb.agilent.chemstation is not None
+    assert rb.waters.masslynx is not None